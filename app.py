@@ -7,12 +7,34 @@ import json
 import requests
 import time
 import urllib.parse
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, namedtuple
+from operator import itemgetter
 from datetime import datetime
 from typing import Optional, Dict
 import os
-from supabase import create_client, Client
+try:
+    from supabase import create_client, Client
+except ImportError:
+    # Instalações só com o backend SQLite não precisam do supabase-py
+    create_client = Client = None
 from dotenv import load_dotenv
 from gallery_module import add_gallery_methods_to_database, gallery_view
+from visitor_import_module import visitor_import_view, phone_digits
+from dedup_module import add_dedup_methods_to_database, duplicates_view
+from visits_module import add_visits_methods_to_database, retention_view
+from attendance_module import add_attendance_methods_to_database, checkin_view, attendance_summary_view
+from schedule_module import add_schedule_methods_to_database, schedule_view, ROTA_DEPARTMENTS
+from geo_module import add_geo_methods_to_database, format_distance
+from export_module import export_control
+from ui_updates import request_update, flush_updates, batched
+from timestamps import format_datetime
+from passwords import hash_password, verify_password
+from sqlite_backend import SQLiteClient
+from metrics_module import METRICS_ENABLED, instrument_database, metrics_view, record_db_error
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -28,63 +50,77 @@ THEME_COLOR = "#1976D2"  # Azul IEQ
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL e SUPABASE_KEY devem estar definidos no arquivo .env")
+# Backend de dados: "supabase" (padrão) ou "sqlite" (banco e fotos locais, sem internet)
+DB_BACKEND = os.getenv("IEQ_BACKEND", "supabase").strip().lower()
+SQLITE_PATH = os.getenv("IEQ_SQLITE_PATH", "ieq_local.db")
+LOCAL_STORAGE_DIR = os.getenv("IEQ_STORAGE_DIR", "storage")
+# Cidade usada no filtro por bairro quando nenhuma é informada
+DEFAULT_CITY = os.getenv("IEQ_DEFAULT_CITY", "").strip()
+
+_sqlite_clients = {}
+_sqlite_lock = threading.Lock()
+
+def connect_backend():
+    """Cria o cliente do backend configurado; retorna (cliente, chave do single-flight)"""
+    if DB_BACKEND == "sqlite":
+        key = os.path.abspath(SQLITE_PATH)
+        # Todas as sessões do processo usam a mesma conexão local
+        with _sqlite_lock:
+            client = _sqlite_clients.get(key)
+            if client is None:
+                client = _sqlite_clients[key] = SQLiteClient(SQLITE_PATH, LOCAL_STORAGE_DIR)
+                print(f"✓ Banco local SQLite: {key}")
+        return client, key
+    if DB_BACKEND != "supabase":
+        raise ValueError(f"IEQ_BACKEND inválido: {DB_BACKEND!r} (use 'supabase' ou 'sqlite')")
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("SUPABASE_URL e SUPABASE_KEY devem estar definidos no arquivo .env "
+                         "(ou use IEQ_BACKEND=sqlite para uma instalação local)")
+    if create_client is None:
+        raise ValueError("Pacote supabase não instalado (pip install supabase)")
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    print("✓ Conectado ao Supabase")
+    return client, SUPABASE_URL
 
 # ==============================================================================
 # FUNÇÕES DE FEEDBACK VISUAL
 # ==============================================================================
 
-def show_success(page, message):
-    """Exibe mensagem de sucesso"""
+_loading_lock = threading.Lock()
+_loading_state = {}
+
+# Operações mais rápidas que isso não chegam a mostrar o indicador de carregamento
+LOADING_DELAY = 0.4
+
+def _show_snack(page, icon, message, bgcolor):
     page.snack_bar = ft.SnackBar(
         content=ft.Row([
-            ft.Icon(ft.Icons.CHECK_CIRCLE, color="white"),
+            ft.Icon(icon, color="white"),
             ft.Text(message, color="white")
         ]),
-        bgcolor="green"
+        bgcolor=bgcolor
     )
     page.snack_bar.open = True
-    page.update()
+    request_update(page)
+
+def show_success(page, message):
+    """Exibe mensagem de sucesso"""
+    _show_snack(page, ft.Icons.CHECK_CIRCLE, message, "green")
 
 def show_error(page, message):
     """Exibe mensagem de erro"""
-    page.snack_bar = ft.SnackBar(
-        content=ft.Row([
-            ft.Icon(ft.Icons.ERROR, color="white"),
-            ft.Text(message, color="white")
-        ]),
-        bgcolor="red"
-    )
-    page.snack_bar.open = True
-    page.update()
+    _show_snack(page, ft.Icons.ERROR, message, "red")
 
 def show_warning(page, message):
     """Exibe mensagem de aviso"""
-    page.snack_bar = ft.SnackBar(
-        content=ft.Row([
-            ft.Icon(ft.Icons.WARNING, color="white"),
-            ft.Text(message, color="white")
-        ]),
-        bgcolor="orange"
-    )
-    page.snack_bar.open = True
-    page.update()
+    _show_snack(page, ft.Icons.WARNING, message, "orange")
 
 def show_info(page, message):
     """Exibe mensagem informativa"""
-    page.snack_bar = ft.SnackBar(
-        content=ft.Row([
-            ft.Icon(ft.Icons.INFO, color="white"),
-            ft.Text(message, color="white")
-        ]),
-        bgcolor="blue"
-    )
-    page.snack_bar.open = True
-    page.update()
+    _show_snack(page, ft.Icons.INFO, message, "blue")
 
-def show_loading(page, message="Processando..."):
-    """Mostra um indicador de carregamento"""
+def show_loading(page, message="Processando...", delay=LOADING_DELAY):
+    """Mostra um indicador de carregamento se a operação passar de `delay` segundos"""
     loading_container = ft.Container(
         content=ft.Column([
             ft.ProgressRing(),
@@ -96,15 +132,33 @@ def show_loading(page, message="Processando..."):
         bgcolor="black54",
         expand=True
     )
-    page.overlay.append(loading_container)
-    page.update()
+
+    def reveal():
+        with _loading_lock:
+            if _loading_state.pop(id(loading_container), None) is None:
+                return
+            page.overlay.append(loading_container)
+        # Roda fora do handler: precisa enviar imediatamente
+        page.update()
+
+    timer = threading.Timer(delay, reveal)
+    timer.daemon = True
+    with _loading_lock:
+        _loading_state[id(loading_container)] = timer
+    timer.start()
     return loading_container
 
 def hide_loading(page, loading_container):
-    """Remove o indicador de carregamento"""
-    if loading_container in page.overlay:
-        page.overlay.remove(loading_container)
-    page.update()
+    """Remove o indicador de carregamento (ou cancela antes de aparecer)"""
+    with _loading_lock:
+        timer = _loading_state.pop(id(loading_container), None)
+        if timer:
+            timer.cancel()
+        shown = loading_container in page.overlay
+        if shown:
+            page.overlay.remove(loading_container)
+    if shown:
+        request_update(page)
 
 class ViaCEPService:
     """Serviço para buscar endereços via CEP"""
@@ -142,11 +196,11 @@ def open_whatsapp(phone, name):
     if not phone:
         return ""
     
-    # Limpa o número (apenas dígitos)
-    clean_phone = ''.join(filter(str.isdigit, phone))
+    # DDD + número (mesma normalização da importação e dos duplicados)
+    clean_phone = phone_digits(phone)
     
-    # Adiciona código do país se não tiver (assumindo Brasil +55)
-    if len(clean_phone) <= 11 and not clean_phone.startswith("55"):
+    # Adiciona código do país (assumindo Brasil +55)
+    if len(clean_phone) <= 11:
         clean_phone = "55" + clean_phone
         
     message = f"Olá {name}, paz! Sou da IEQ."
@@ -154,29 +208,473 @@ def open_whatsapp(phone, name):
     url = f"https://wa.me/{clean_phone}?text={encoded_message}"
     return url
 
+# Colunas estruturadas de endereço (visitors, volunteers, cells)
+ADDRESS_FIELDS = ("cep", "logradouro", "numero", "bairro", "cidade", "uf")
+# Cidade e bairro em minúsculas, indexados para o filtro por bairro (ver address_key)
+ADDRESS_KEYS = ("cidade_key", "bairro_key")
+
+def empty_address():
+    return {field: "" for field in ADDRESS_FIELDS}
+
+def format_address(parts):
+    """Monta o texto legado da coluna address a partir das partes"""
+    if not parts or not any(parts.get(f) for f in ADDRESS_FIELDS):
+        return ""
+    return (f"{parts.get('logradouro') or ''}, {parts.get('numero') or ''} - "
+            f"{parts.get('bairro') or ''}, {parts.get('cidade') or ''}/{parts.get('uf') or ''} "
+            f"CEP: {parts.get('cep') or ''}")
+
+def parse_address(address_str):
+    """Separa o texto legado de endereço (formato de format_address) em partes"""
+    if not address_str:
+        return empty_address()
+    try:
+        parts = address_str.split(" CEP: ")
+        cep = parts[1] if len(parts) > 1 else ""
+        main_parts = parts[0].split(" - ")
+        bairro_cidade = main_parts[1].split(", ") if len(main_parts) > 1 else ["", ""]
+        logradouro_numero = main_parts[0].split(", ") if len(main_parts) > 0 else ["", ""]
+        logradouro = logradouro_numero[0] if len(logradouro_numero) > 0 else ""
+        numero = logradouro_numero[1] if len(logradouro_numero) > 1 else ""
+        bairro = bairro_cidade[0] if len(bairro_cidade) > 0 else ""
+        cidade_uf = bairro_cidade[1].split("/") if len(bairro_cidade) > 1 else ["", ""]
+        cidade = cidade_uf[0] if len(cidade_uf) > 0 else ""
+        uf = cidade_uf[1] if len(cidade_uf) > 1 else ""
+        return {"cep": cep, "logradouro": logradouro, "numero": numero, "bairro": bairro, "cidade": cidade, "uf": uf}
+    except Exception:
+        return empty_address()
+
+def parse_legacy_address(address_str):
+    """
+    Partes do texto legado só quando ele segue exatamente o formato de format_address;
+    texto livre ('Rua X 123') ou com partes extras ('100, apto 2') retorna None
+    """
+    text = (address_str or "").strip()
+    parts = parse_address(text)
+    if not text or format_address(parts) != text:
+        return None
+    return parts
+
+def address_from_row(row):
+    """Lê as colunas estruturadas; registros ainda não migrados caem no parse do texto"""
+    if any(row.get(f) for f in ADDRESS_FIELDS):
+        return {f: row.get(f) or "" for f in ADDRESS_FIELDS}
+    return parse_address(row.get('address'))
+
+def address_key(value):
+    """Cidade/bairro como chave de busca: sem diferença de maiúsculas ('Centro' = 'centro')"""
+    return (value or "").strip().lower() or None
+
+def address_columns(address):
+    """Converte o endereço (dict de partes ou texto legado) em colunas para gravação"""
+    if isinstance(address, dict):
+        parts = {f: (address.get(f) or "").strip() for f in ADDRESS_FIELDS}
+        if parts["cep"]:
+            parts["cep"] = ViaCEPService.format_cep(parts["cep"])
+        parts["uf"] = parts["uf"].upper()
+        data = {f: (v or None) for f, v in parts.items()}
+        data['address'] = format_address(parts) or None
+        # Colunas indexadas (cidade_key, bairro_key) usadas pelos filtros por bairro
+        data['cidade_key'] = address_key(parts["cidade"])
+        data['bairro_key'] = address_key(parts["bairro"])
+        return data
+    return {'address': address}
+
+def visitor_columns(name, phone, email, address, obs):
+    """Colunas gravadas de um visitante (mesmo formato na edição e na comparação)"""
+    data = {'name': name, 'phone': phone, 'email': email, 'observations': obs}
+    data.update(address_columns(address))
+    return data
+
+def visitor_row_values(row):
+    """visitor_columns de uma linha do banco, com vazios como no formulário"""
+    return visitor_columns(row.get('name') or "", row.get('phone') or "", row.get('email') or "",
+                           address_from_row(row), row.get('observations') or "")
+
+def changed_columns(before, after):
+    """Colunas de `after` com valor diferente de `before`"""
+    return {k: v for k, v in after.items() if before.get(k) != v}
+
 # ==============================================================================
 # CAMADA DE DADOS (SUPABASE)
 # ==============================================================================
 
-class Database:
+# Registros compactos das listas: só as colunas que cada view exibe
+VisitorListItem = namedtuple("VisitorListItem", "id name phone date_visit")
+VolunteerListItem = namedtuple("VolunteerListItem", "id name phone role department")
+CellListItem = namedtuple("CellListItem", "id name leader_name host_name address meeting_day meeting_time")
+# Resultado de update_visitor: linha gravada, ou a linha atual do banco quando conflict=True
+VisitorUpdate = namedtuple("VisitorUpdate", "row conflict")
+
+# Ids por requisição nas alterações em lote (in_ vai na URL)
+BULK_CHUNK = 200
+
+class PartialUpdateError(Exception):
+    """Um bloco de _update_ids falhou; applied = ids dos blocos anteriores, já gravados"""
+
+    def __init__(self, applied, error):
+        super().__init__(f"{len(applied)} id(s) gravados antes da falha: {error}")
+        self.applied = applied
+# Colunas alteráveis pela edição em lote
+VOLUNTEER_BULK_COLUMNS = ("role", "department")
+CELL_BULK_COLUMNS = ("leader_name", "meeting_day", "meeting_time")
+
+# Listas paginadas (visitantes, voluntários e células): itens por página e cursor da próxima.
+# value = coluna de ordenação da última linha; ties = linhas já entregues com esse mesmo valor
+LIST_PAGE_SIZE = 50
+ListCursor = namedtuple("ListCursor", "value id ties")
+
+def projection(record_type):
+    """Lista de colunas do select para um tipo de registro"""
+    return ", ".join(record_type._fields)
+
+def to_records(record_type, rows):
+    get = itemgetter(*record_type._fields)
+    make = record_type._make
+    return [make(get(r)) for r in rows]
+
+# Permissões compiladas: um bit por permissão, na ordem abaixo
+PERMISSION_NAMES = ("visitantes", "lista_visitantes", "celulas", "voluntários", "galeria", "usuarios", "readonly")
+_PERMISSION_BITS = {name: 1 << i for i, name in enumerate(PERMISSION_NAMES)}
+
+class Permissions(int):
+    """Conjunto imutável de permissões (bitset); get() mantém a interface de dict"""
+    __slots__ = ()
+
+    def get(self, name, default=False):
+        bit = _PERMISSION_BITS.get(name)
+        return default if bit is None else bool(self & bit)
+
+    def __repr__(self):
+        return f"Permissions({', '.join(n for n in PERMISSION_NAMES if self.get(n))})"
+
+ADMIN_PERMISSIONS = Permissions(sum(_PERMISSION_BITS.values()) & ~_PERMISSION_BITS["readonly"])
+
+@functools.lru_cache(maxsize=256)
+def _compile_permissions(perms_json):
+    perms = json.loads(perms_json or "{}")
+    # Regras padrão: quem cadastra visitantes também vê a lista; galeria liberada salvo se negada
+    if perms.get("visitantes"):
+        perms["lista_visitantes"] = True
+    perms.setdefault("galeria", True)
+    return Permissions(sum(bit for name, bit in _PERMISSION_BITS.items() if perms.get(name)))
+
+def compile_permissions(is_admin, perms):
+    """Converte a linha de users (is_admin + JSON de permissões) no bitset da sessão"""
+    if is_admin:
+        return ADMIN_PERMISSIONS
+    if not isinstance(perms, str):
+        perms = json.dumps(perms or {}, sort_keys=True)
+    return _compile_permissions(perms)
+
+# Usuário autenticado: o suficiente para montar o dashboard
+SessionUser = namedtuple("SessionUser", "id username permissions")
+SESSION_USER_COLUMNS = "id, username, is_admin, permissions"
+
+# Versão das permissões de cada usuário (por id), no processo inteiro:
+# alterações feitas por um admin invalidam as sessões abertas desse usuário
+_permission_epochs = {}
+_permission_lock = threading.Lock()
+
+class SingleFlight:
+    """
+    Compartilha leituras idênticas em andamento entre todas as sessões do processo.
+
+    Quem chega enquanto a mesma consulta já está no ar espera por ela em vez de
+    disparar outra. Escritas avançam a geração da tabela, então leituras feitas
+    depois de uma escrita nunca reaproveitam uma consulta iniciada antes dela.
+    """
+
     def __init__(self):
-        """Inicializa conexão com Supabase"""
-        self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        print("✓ Conectado ao Supabase")
-        # Adicionar funcionalidades de galeria
-        add_gallery_methods_to_database(Database)
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._generations = {}
+        self.executed = 0
+        self.shared = 0
+
+    def generation(self, table):
+        return self._generations.get(table, 0)
+
+    def invalidate(self, table):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+
+    def do(self, key, fn, cache=None, keep=False):
+        """
+        cache: pré-carregamentos da sessão {key: (instante, linhas)}, cada um usado
+        uma vez em até PREFETCH_TTL. keep=True (pré-carregamento) guarda o resultado
+        lá só se esta chamada disparou a leitura e ninguém esperou por ela.
+        """
+        with self._lock:
+            if cache is not None:
+                _evict_prefetched(cache)
+                entry = cache.pop(key, None)
+                if entry:
+                    return entry[1]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None, "waiters": 0}
+                self.executed += 1
+            else:
+                call["waiters"] += 1
+                self.shared += 1
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                # Guardado sob o mesmo lock: a view ou entrou nesta leitura ou acha o resultado
+                if keep and cache is not None and call["error"] is None and not call["waiters"]:
+                    _evict_prefetched(cache)
+                    cache[key] = (time.monotonic(), call["result"])
+            call["done"].set()
+
+def _evict_prefetched(cache):
+    now = time.monotonic()
+    for key in [k for k, (stored_at, _) in cache.items() if now - stored_at >= PREFETCH_TTL]:
+        del cache[key]
+
+# Único por processo: todas as sessões Flet web compartilham as leituras
+read_flights = SingleFlight()
+
+# Pré-carregamento das abas após o login (pool compartilhado entre as sessões)
+PREFETCH_TTL = 30
+_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+_prefetch_local = threading.local()
+
+def _hashable(value):
+    if isinstance(value, (list, set, tuple)):
+        return tuple(_hashable(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    return value
+
+class Database:
+    def __init__(self, client=None):
+        """
+        Conecta ao backend configurado (IEQ_BACKEND) ou usa o cliente informado
+        (ex.: fake_supabase). Todo cliente segue a API de consultas do supabase-py.
+        """
+        if client is None:
+            # Sessões do mesmo banco compartilham leituras em andamento
+            client, self.backend_key = connect_backend()
+        else:
+            self.backend_key = id(client)
+        self.supabase: Client = client
+        # Versão de cada tabela, incrementada a cada escrita desta sessão
+        self.table_versions = {}
+        # Resultados pré-carregados: chave do SELECT -> (instante, linhas)
+        self._prefetched = {}
+
+    def _select(self, table, columns='*', filters=(), order=(), limit=None):
+        """
+        Executa um SELECT via single-flight.
+
+        filters: sequência de (operador, coluna, valor), ex. ('eq', 'active', True)
+        order:   sequência de (coluna, desc)
+        """
+        key = (self.backend_key, table, read_flights.generation(table), columns,
+               _hashable(filters), _hashable(order), limit)
+
+        def run():
+            query = self.supabase.table(table).select(columns)
+            for op, column, value in filters:
+                query = getattr(query, op)(column, value)
+            for column, desc in order:
+                query = query.order(column, desc=desc)
+            if limit is not None:
+                query = query.limit(limit)
+            return query.execute().data or []
+
+        # Pré-carregado: usado uma vez; a geração na chave descarta o que ficou velho por escrita
+        rows = read_flights.do(key, run, cache=self._prefetched, keep=getattr(_prefetch_local, "active", False))
+        # Cópia da lista: cada chamador pode reordenar/filtrar sem afetar os demais
+        return list(rows)
+
+    def prefetch(self, loaders):
+        """
+        Executa os carregamentos em paralelo, em segundo plano.
+
+        Cada SELECT feito por eles fica em memória até a view pedir a mesma
+        consulta; se ela pedir antes de terminar, o single-flight junta as duas.
+        """
+        def run(loader):
+            _prefetch_local.active = True
+            try:
+                loader()
+            except Exception as e:
+                self._log_error("Erro no pré-carregamento", e)
+            finally:
+                _prefetch_local.active = False
+
+        return [_prefetch_pool.submit(run, loader) for loader in loaders]
+
+    def _log_error(self, message, error):
+        """Registra uma exceção tratada (console e, se ativas, métricas)"""
+        print(f"{message}: {error}")
+        record_db_error(error)
+
+    def _touch(self, table):
+        """Marca a tabela como alterada (views em cache se atualizam ao reaparecer)"""
+        self.table_versions[table] = self.table_versions.get(table, 0) + 1
+        read_flights.invalidate(table)
+
+    def table_version(self, table):
+        return self.table_versions.get(table, 0)
+
+    def _generation(self, table):
+        """Geração da tabela no processo (muda a cada escrita de qualquer sessão)"""
+        return read_flights.generation(table)
+
+    def count_rows(self, table, filters=()):
+        """Total de linhas (para barras de progresso); None se indisponível"""
+        try:
+            query = self.supabase.table(table).select('id', count='exact')
+            for op, column, value in filters:
+                query = getattr(query, op)(column, value)
+            return query.limit(1).execute().count
+        except Exception as e:
+            self._log_error("Erro ao contar registros", e)
+            return None
+
+    def upsert_rows(self, table, rows, on_conflict='id'):
+        """Grava um lote com um único upsert([...]) (migração/restauração)"""
+        try:
+            if rows:
+                self.supabase.table(table).upsert(rows, on_conflict=on_conflict).execute()
+                self._touch(table)
+            return True
+        except Exception as e:
+            self._log_error(f"Erro ao gravar lote em {table}", e)
+            return False
+
+    def iter_pages(self, table, columns='*', filters=(), page_size=1000):
+        """
+        Percorre a tabela em páginas ordenadas por id (keyset), sem carregar tudo.
+        Gera listas de linhas; columns precisa incluir id.
+        """
+        last_id = None
+        while True:
+            query = self.supabase.table(table).select(columns)
+            for op, column, value in filters:
+                query = getattr(query, op)(column, value)
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            rows = query.order('id').limit(page_size).execute().data or []
+            if not rows:
+                return
+            yield rows
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]['id']
+
+    def _update_ids(self, table, ids, data):
+        """
+        UPDATE com filtro in_ em blocos de BULK_CHUNK ids; retorna os ids gravados.
+        Se um bloco falha depois de outros, levanta PartialUpdateError com os já gravados.
+        """
+        ids = list(ids)
+        applied = []
+        try:
+            for start in range(0, len(ids), BULK_CHUNK):
+                chunk = ids[start:start + BULK_CHUNK]
+                self.supabase.table(table).update(data).in_('id', chunk).execute()
+                applied += chunk
+        except Exception as e:
+            if not applied:
+                raise
+            self._touch(table)
+            raise PartialUpdateError(applied, e) from e
+        self._touch(table)
+        return applied
+
+    def _keyset_page(self, table, record_type, filters, cursor, page_size, column='name', desc=False):
+        """
+        Uma página ordenada por (column, id) a partir do cursor (keyset, índice em column).
+
+        Só usa filtros simples: busca column >= cursor.value (<= em ordem decrescente) e
+        descarta as linhas com o mesmo valor já entregues. Retorna (registros, próximo cursor ou None).
+        """
+        filters = list(filters)
+        limit = page_size
+        if cursor:
+            filters.append(('lte' if desc else 'gte', column, cursor.value))
+            limit += cursor.ties
+        rows = self._select(table, projection(record_type), filters=filters,
+                            order=[(column, desc), ('id', desc)], limit=limit + 1)
+        if cursor:
+            rows = [r for r in rows
+                    if r[column] != cursor.value or (r['id'] < cursor.id if desc else r['id'] > cursor.id)]
+        items = to_records(record_type, rows[:page_size])
+        if len(rows) <= page_size:
+            return items, None
+        last = items[-1]
+        value = getattr(last, column)
+        ties = sum(1 for i in items if getattr(i, column) == value)
+        if cursor and value == cursor.value:
+            ties += cursor.ties
+        return items, ListCursor(value, last.id, ties)
 
     # --- Auth ---
-    def check_login(self, username, password):
-        """Verifica login do usuário"""
+    @staticmethod
+    def _session_user(rows):
+        if not rows:
+            return None
+        u = rows[0]
+        return SessionUser(u['id'], u['username'], compile_permissions(u.get('is_admin'), u.get('permissions')))
+
+    def authenticate(self, username, password):
+        """
+        Login em uma única consulta: usuário, permissões compiladas e hash da senha.
+        A senha é conferida no pool de hashing; senhas em texto puro ou com custo
+        antigo são regravadas com o hash atual (None se inválido).
+        """
         try:
-            response = self.supabase.table('users').select('*').eq('username', username).eq('password', password).execute()
-            if response.data and len(response.data) > 0:
-                return response.data[0]
+            response = (self.supabase.table('users').select(f"{SESSION_USER_COLUMNS}, password")
+                        .eq('username', username).execute())
+            rows = response.data or []
+            ok, rehash = verify_password(rows[0].get('password') if rows else None, password)
+            if not ok:
+                return None
+            if rehash:
+                self._rehash_password(rows[0]['id'], password)
+            return self._session_user(rows)
+        except Exception as e:
+            self._log_error("Erro no login", e)
             return None
+
+    def _rehash_password(self, user_id, password):
+        try:
+            self.supabase.table('users').update({'password': hash_password(password)}).eq('id', user_id).execute()
+        except Exception as e:
+            # O login segue valendo; a conversão é tentada de novo no próximo
+            self._log_error("Erro ao atualizar hash da senha", e)
+
+    def get_session_user(self, username):
+        """Usuário e permissões, sem senha (login Google e recarga após alteração)"""
+        try:
+            response = self.supabase.table('users').select(SESSION_USER_COLUMNS).eq('username', username).execute()
+            return self._session_user(response.data)
         except Exception as e:
-            print(f"Erro no login: {e}")
+            self._log_error("Erro ao carregar usuário", e)
             return None
+
+    def permission_epoch(self, user_id):
+        return _permission_epochs.get(user_id, 0)
+
+    def _invalidate_permissions(self, user_id):
+        with _permission_lock:
+            _permission_epochs[user_id] = _permission_epochs.get(user_id, 0) + 1
     
     def check_user_exists(self, username):
         """Verifica se usuário existe"""
@@ -184,40 +682,13 @@ class Database:
             response = self.supabase.table('users').select('*').eq('username', username).execute()
             return response.data and len(response.data) > 0
         except Exception as e:
-            print(f"Erro ao verificar usuário: {e}")
+            self._log_error("Erro ao verificar usuário", e)
             return False
 
     def get_user_permissions(self, username):
-        """Obtém permissões do usuário"""
-        try:
-            response = self.supabase.table('users').select('permissions, is_admin').eq('username', username).execute()
-            if response.data and len(response.data) > 0:
-                user = response.data[0]
-                is_admin = user.get('is_admin', False)
-                
-                if is_admin:
-                    return {
-                        "visitantes": True, "celulas": True, 
-                        "usuarios": True, "voluntários": True,
-                        "galeria": True, 
-                        "readonly": False, "lista_visitantes": True
-                    }
-                
-                perms = user.get('permissions', {})
-                if isinstance(perms, str):
-                    perms = json.loads(perms)
-                
-                if perms.get("visitantes"):
-                    perms["lista_visitantes"] = True
-                    
-                if 'galeria' not in perms:
-                    perms['galeria'] = True
-                
-                return perms
-            return {}
-        except Exception as e:
-            print(f"Erro ao obter permissões: {e}")
-            return {}
+        """Obtém permissões do usuário (bitset compilado; vazio se não existir)"""
+        user = self.get_session_user(username)
+        return user.permissions if user else Permissions(0)
 
     # --- Cadastro ---
     def add_user(self, username, password, is_admin, perms, phone=None, is_google=False):
@@ -225,96 +696,160 @@ class Database:
         try:
             data = {
                 'username': username,
-                'password': password,
+                'password': hash_password(password) if password else None,
                 'is_admin': is_admin,
                 'permissions': perms if isinstance(perms, dict) else json.loads(perms),
                 'phone': phone,
                 'is_google_auth': is_google
             }
             self.supabase.table('users').insert(data).execute()
+            self._touch('users')
             return True
         except Exception as e:
-            print(f"Erro ao criar usuário: {e}")
+            self._log_error("Erro ao criar usuário", e)
             return False
             
+    def update_user(self, user_id, is_admin, perms, password=None):
+        """Altera perfil/permissões (e a senha, se informada); sessões abertas do usuário são recarregadas"""
+        try:
+            data = {
+                'is_admin': is_admin,
+                'permissions': perms if isinstance(perms, dict) else json.loads(perms)
+            }
+            if password:
+                data['password'] = hash_password(password)
+            self.supabase.table('users').update(data).eq('id', user_id).execute()
+            self._touch('users')
+            self._invalidate_permissions(user_id)
+            return True
+        except Exception as e:
+            self._log_error("Erro ao atualizar usuário", e)
+            return False
+
     def delete_user(self, user_id):
         """Deleta usuário (exceto admin)"""
         if user_id == 1: 
             return False
         try:
             self.supabase.table('users').delete().eq('id', user_id).execute()
+            self._touch('users')
+            self._invalidate_permissions(user_id)
             return True
         except Exception as e:
-            print(f"Erro ao deletar usuário: {e}")
+            self._log_error("Erro ao deletar usuário", e)
             return False
         
     def get_all_users(self):
         """Lista todos os usuários"""
         try:
-            response = self.supabase.table('users').select('id, username, is_admin, permissions').order('username').execute()
+            rows = self._select('users', 'id, username, is_admin, permissions', order=[('username', False)])
             # Converter para tuplas para manter compatibilidade
-            return [(u['id'], u['username'], u['is_admin'], json.dumps(u['permissions'])) for u in response.data]
+            return [(u['id'], u['username'], u['is_admin'], json.dumps(u['permissions'])) for u in rows]
         except Exception as e:
-            print(f"Erro ao listar usuários: {e}")
+            self._log_error("Erro ao listar usuários", e)
             return []
 
     # --- Visitantes ---
-    def add_visitor(self, name, phone, email, address, obs):
-        """Adiciona novo visitante"""
+    def add_visitor(self, name, phone, email, address, obs, force=False):
+        """
+        Adiciona novo visitante.
+
+        Antes de inserir, consulta o índice de duplicados: se houver cadastros
+        parecidos (e force=False), não insere e retorna a lista de candidatos.
+        Retorna True se inseriu, False em caso de erro.
+        """
         try:
-            data = {
-                'name': name,
-                'phone': phone,
-                'email': email,
-                'address': address,
-                'observations': obs
-            }
-            self.supabase.table('visitors').insert(data).execute()
+            data = visitor_columns(name, phone, email, address, obs)
+            if not force:
+                candidates = self.find_visitor_duplicates(name, phone, email, data.get('cep'))
+                if candidates:
+                    return candidates
+            rows = self.supabase.table('visitors').insert(data).execute().data
+            self._touch('visitors')
+            self._index_visitors(rows=rows or ())
             return True
         except Exception as e:
-            print(f"Erro ao adicionar visitante: {e}")
+            self._log_error("Erro ao adicionar visitante", e)
             return False
 
-    def get_all_visitors(self):
-        """Lista todos os visitantes"""
+    def add_visitors_bulk(self, visitors):
+        """
+        Insere vários visitantes em um único insert([...]).
+        visitors: dicts com name, phone, email, address (dict de partes) e obs.
+        Retorna a quantidade inserida ou None em caso de erro.
+        """
         try:
-            response = self.supabase.table('visitors').select('*').order('date_visit', desc=True).execute()
-            # Converter para tuplas e formatar data
-            result = []
-            for v in response.data:
-                # Formatar data ISO para formato brasileiro
-                date_visit = v.get('date_visit', '')
-                if date_visit:
-                    try:
-                        dt = datetime.fromisoformat(date_visit.replace('Z', '+00:00'))
-                        date_visit = dt.strftime("%d/%m/%Y %H:%M")
-                    except:
-                        pass
-                
-                result.append((
-                    v['id'], v['name'], v.get('phone'), v.get('email'),
-                    v.get('address'), date_visit, v.get('observations')
-                ))
-            return result
+            rows = []
+            for v in visitors:
+                data = {
+                    'name': v['name'],
+                    'phone': v.get('phone') or None,
+                    'email': v.get('email') or None,
+                    'observations': v.get('obs') or None
+                }
+                # Todas as linhas com as mesmas chaves: o PostgREST exige no insert em lote
+                data.update(address_columns(v.get('address') or {}))
+                rows.append(data)
+            if not rows:
+                return 0
+            inserted = self.supabase.table('visitors').insert(rows).execute().data
+            self._touch('visitors')
+            self._index_visitors(rows=inserted or ())
+            return len(rows)
         except Exception as e:
-            print(f"Erro ao listar visitantes: {e}")
-            return []
+            self._log_error("Erro ao importar visitantes", e)
+            return None
 
-    def update_visitor(self, visitor_id, name, phone, email, address, obs):
-        """Atualiza visitante"""
+    def iter_visitor_phones(self, page_size=1000):
+        """Telefones já cadastrados, lidos página por página"""
+        for rows in self.iter_pages('visitors', 'id, phone', filters=[('neq', 'phone', '')], page_size=page_size):
+            for r in rows:
+                if r.get('phone'):
+                    yield r['phone']
+
+    def get_visitors_page(self, cursor=None, cidade=None, bairro=None, page_size=LIST_PAGE_SIZE):
+        """
+        Visitantes da visita mais recente para a mais antiga, uma página por vez
+        (opcionalmente de uma cidade/bairro); retorna (itens, próximo cursor)
+        """
         try:
-            data = {
-                'name': name,
-                'phone': phone,
-                'email': email,
-                'address': address,
-                'observations': obs
-            }
-            self.supabase.table('visitors').update(data).eq('id', visitor_id).execute()
-            return True
+            # date_visit fica em ISO: a formatação acontece só nas linhas exibidas
+            return self._keyset_page('visitors', VisitorListItem, self._address_filters(cidade, bairro),
+                                     cursor, page_size, column='date_visit', desc=True)
         except Exception as e:
-            print(f"Erro ao atualizar visitante: {e}")
-            return False
+            self._log_error("Erro ao listar visitantes", e)
+            return [], None
+
+    def count_visitors(self, cidade=None, bairro=None):
+        """Total de visitantes (do bairro, se informado); None se indisponível"""
+        try:
+            return self.count_rows('visitors', self._address_filters(cidade, bairro))
+        except ValueError as e:
+            self._log_error("Erro ao contar visitantes", e)
+            return None
+
+    def update_visitor(self, visitor_id, changes, updated_at=None):
+        """
+        Grava só as colunas alteradas (changes) e devolve a linha nova na mesma requisição.
+
+        Com updated_at (o valor que o editor carregou), a gravação só acontece se
+        ninguém salvou o visitante depois; senão retorna conflict=True com a linha
+        atual (row=None se foi removido). Retorna None em caso de erro.
+        """
+        try:
+            query = self.supabase.table('visitors').update(changes).eq('id', visitor_id)
+            if updated_at:
+                query = query.eq('updated_at', updated_at)
+            rows = query.execute().data or []
+            if rows:
+                self._touch('visitors')
+                self._index_visitors(rows=rows)
+                return VisitorUpdate(rows[0], False)
+            current = self.supabase.table('visitors').select('*').eq('id', visitor_id).execute().data or []
+            return VisitorUpdate(current[0] if current else None, True)
+        except Exception as e:
+            self._log_error("Erro ao atualizar visitante", e)
+            return None
 
     def get_visitor_by_id(self, visitor_id):
         """Busca visitante por ID"""
@@ -322,22 +857,16 @@ class Database:
             response = self.supabase.table('visitors').select('*').eq('id', visitor_id).execute()
             if response.data and len(response.data) > 0:
                 v = response.data[0]
-                # Formatar data
-                date_visit = v.get('date_visit', '')
-                if date_visit:
-                    try:
-                        dt = datetime.fromisoformat(date_visit.replace('Z', '+00:00'))
-                        date_visit = dt.strftime("%d/%m/%Y %H:%M")
-                    except:
-                        pass
+                date_visit = format_datetime(v.get('date_visit'))
                 
                 return (
                     v['id'], v['name'], v.get('phone'), v.get('email'),
-                    v.get('address'), date_visit, v.get('observations')
+                    v.get('address'), date_visit, v.get('observations'),
+                    address_from_row(v), v.get('updated_at'), v.get('cell_id')
                 )
             return None
         except Exception as e:
-            print(f"Erro ao buscar visitante: {e}")
+            self._log_error("Erro ao buscar visitante", e)
             return None
 
     # --- Voluntários ---
@@ -348,46 +877,68 @@ class Database:
                 'name': name,
                 'phone': phone,
                 'email': email,
-                'address': address,
                 'role': role,
                 'department': dept,
                 'hire_date': hire_date,
                 'observations': obs,
                 'active': True
             }
+            data.update(address_columns(address))
             self.supabase.table('volunteers').insert(data).execute()
+            self._touch('volunteers')
             return True
         except Exception as e:
-            print(f"Erro ao adicionar voluntário: {e}")
+            self._log_error("Erro ao adicionar voluntário", e)
             return False
 
     def get_all_volunteers(self):
-        """Lista todos os voluntários ativos"""
+        """Lista todos os voluntários ativos (somente as colunas da lista)"""
         try:
-            response = self.supabase.table('volunteers').select('*').eq('active', True).order('name').execute()
-            # Converter para tuplas
-            result = []
-            for v in response.data:
-                result.append((
-                    v['id'], v['name'], v.get('phone'), v.get('email'),
-                    v.get('address'), v.get('role'), v.get('department'),
-                    v.get('hire_date'), v.get('registration_date'), v.get('observations'),
-                    v.get('active', True)
-                ))
-            return result
+            rows = self._select('volunteers', projection(VolunteerListItem),
+                                filters=[('eq', 'active', True)], order=[('name', False)])
+            return to_records(VolunteerListItem, rows)
         except Exception as e:
-            print(f"Erro ao listar voluntários: {e}")
+            self._log_error("Erro ao listar voluntários", e)
             return []
 
+    def get_volunteers_page(self, cursor=None, department=None, page_size=LIST_PAGE_SIZE):
+        """Voluntários ativos por nome, uma página por vez; retorna (itens, próximo cursor)"""
+        try:
+            filters = [('eq', 'active', True)]
+            if department:
+                filters.append(('eq', 'department', department))
+            return self._keyset_page('volunteers', VolunteerListItem, filters, cursor, page_size)
+        except Exception as e:
+            self._log_error("Erro ao listar voluntários", e)
+            return [], None
+
     def deactivate_collaborator(self, id):
         """Desativa voluntário"""
         try:
             self.supabase.table('volunteers').update({'active': False}).eq('id', id).execute()
+            self._touch('volunteers')
             return True
         except Exception as e:
-            print(f"Erro ao desativar voluntário: {e}")
+            self._log_error("Erro ao desativar voluntário", e)
             return False
 
+    def deactivate_volunteers(self, ids):
+        """Desativa vários voluntários de uma vez; retorna os ids desativados (parcial se um bloco falhar)"""
+        try:
+            return self._update_ids('volunteers', ids, {'active': False})
+        except Exception as e:
+            self._log_error("Erro ao desativar voluntários", e)
+            return getattr(e, 'applied', [])
+
+    def update_volunteers(self, ids, data):
+        """Edição em lote (cargo/departamento) de vários voluntários; retorna os ids alterados"""
+        try:
+            data = {k: v for k, v in data.items() if k in VOLUNTEER_BULK_COLUMNS}
+            return self._update_ids('volunteers', ids, data) if data else list(ids)
+        except Exception as e:
+            self._log_error("Erro ao atualizar voluntários", e)
+            return getattr(e, 'applied', [])
+
     # --- Casa de Cornélio ---
     def add_cell(self, name, leader, host, address, day, time, obs):
         """Adiciona nova célula"""
@@ -396,44 +947,137 @@ class Database:
                 'name': name,
                 'leader_name': leader,
                 'host_name': host,
-                'address': address,
                 'meeting_day': day,
                 'meeting_time': time,
                 'observations': obs,
                 'active': True
             }
+            data.update(address_columns(address))
             self.supabase.table('cells').insert(data).execute()
+            self._touch('cells')
             return True
         except Exception as e:
-            print(f"Erro ao adicionar célula: {e}")
+            self._log_error("Erro ao adicionar célula", e)
             return False
 
     def get_all_cells(self):
-        """Lista todas as células ativas"""
+        """Lista todas as células ativas (somente as colunas da lista)"""
         try:
-            response = self.supabase.table('cells').select('*').eq('active', True).order('name').execute()
-            # Converter para tuplas
-            result = []
-            for c in response.data:
-                result.append((
-                    c['id'], c['name'], c['leader_name'], c.get('host_name'),
-                    c.get('address'), c.get('meeting_day'), c.get('meeting_time'),
-                    c.get('observations'), c.get('active', True)
-                ))
-            return result
+            rows = self._select('cells', projection(CellListItem),
+                                filters=[('eq', 'active', True)], order=[('name', False)])
+            return to_records(CellListItem, rows)
         except Exception as e:
-            print(f"Erro ao listar células: {e}")
+            self._log_error("Erro ao listar células", e)
             return []
 
+    def deactivate_cells(self, ids):
+        """Desativa várias células de uma vez; retorna os ids desativados (parcial se um bloco falhar)"""
+        try:
+            return self._update_ids('cells', ids, {'active': False})
+        except Exception as e:
+            self._log_error("Erro ao desativar células", e)
+            return getattr(e, 'applied', [])
+
+    def update_cells(self, ids, data):
+        """Edição em lote (líder/dia/horário) de várias células; retorna os ids alterados"""
+        try:
+            data = {k: v for k, v in data.items() if k in CELL_BULK_COLUMNS}
+            return self._update_ids('cells', ids, data) if data else list(ids)
+        except Exception as e:
+            self._log_error("Erro ao atualizar células", e)
+            return getattr(e, 'applied', [])
+
+    def get_cells_page(self, cursor=None, meeting_day=None, page_size=LIST_PAGE_SIZE):
+        """Células ativas por nome, uma página por vez; retorna (itens, próximo cursor)"""
+        try:
+            filters = [('eq', 'active', True)]
+            if meeting_day:
+                filters.append(('eq', 'meeting_day', meeting_day))
+            return self._keyset_page('cells', CellListItem, filters, cursor, page_size)
+        except Exception as e:
+            self._log_error("Erro ao listar células", e)
+            return [], None
+
     def deactivate_cell(self, id):
         """Desativa célula"""
         try:
             self.supabase.table('cells').update({'active': False}).eq('id', id).execute()
+            self._touch('cells')
             return True
         except Exception as e:
-            print(f"Erro ao desativar célula: {e}")
+            self._log_error("Erro ao desativar célula", e)
             return False
 
+    # --- Endereços ---
+    @staticmethod
+    def _address_filters(cidade=None, bairro=None, cep=None):
+        """Filtros de CEP/(cidade_key, bairro_key); bairro sem cidade usa IEQ_DEFAULT_CITY ou gera ValueError"""
+        filters = []
+        if cep:
+            filters.append(('eq', 'cep', ViaCEPService.format_cep(cep)))
+        cidade = address_key(cidade) or (address_key(DEFAULT_CITY) if address_key(bairro) else None)
+        if address_key(bairro) and not cidade:
+            raise ValueError("informe a cidade para filtrar por bairro")
+        if cidade:
+            filters.append(('eq', 'cidade_key', cidade))
+        if address_key(bairro):
+            filters.append(('eq', 'bairro_key', address_key(bairro)))
+        return filters
+
+    def get_by_address(self, table, cidade=None, bairro=None, cep=None, columns='*', order='name', desc=False):
+        """
+        Filtra registros por CEP ou (cidade, bairro) usando os índices de endereço.
+        Cidade e bairro não diferenciam maiúsculas; bairro sem cidade usa IEQ_DEFAULT_CITY
+        (o índice começa pela cidade) e, sem ela, não filtra nada.
+        """
+        try:
+            filters = self._address_filters(cidade, bairro, cep)
+            if table in ('volunteers', 'cells'):
+                filters.append(('eq', 'active', True))
+            return self._select(table, columns, filters=filters, order=[(order, desc)])
+        except Exception as e:
+            self._log_error("Erro ao filtrar por endereço", e)
+            return []
+
+    def get_volunteers_by_neighborhood(self, cidade, bairro):
+        """Lista voluntários ativos de um bairro"""
+        rows = self.get_by_address('volunteers', cidade=cidade, bairro=bairro, columns=projection(VolunteerListItem))
+        return to_records(VolunteerListItem, rows)
+
+    def get_cells_by_neighborhood(self, cidade, bairro):
+        """Lista células ativas de um bairro"""
+        rows = self.get_by_address('cells', cidade=cidade, bairro=bairro, columns=projection(CellListItem))
+        return to_records(CellListItem, rows)
+
+    def update_address(self, table, row_id, address, keep_text=False):
+        """Grava as colunas estruturadas de endereço de um registro (keep_text preserva o texto legado)"""
+        try:
+            data = address_columns(address)
+            if keep_text:
+                data.pop('address', None)
+            rows = self.supabase.table(table).update(data).eq('id', row_id).execute().data
+            self._touch(table)
+            if table == 'visitors':
+                # O CEP entra na pontuação de duplicados
+                self._index_visitors(rows=rows or ())
+            return True
+        except Exception as e:
+            self._log_error("Erro ao atualizar endereço", e)
+            return False
+
+
+# Adicionar funcionalidades de galeria, duplicados, retornos, presença e localização
+add_gallery_methods_to_database(Database)
+add_dedup_methods_to_database(Database)
+add_visits_methods_to_database(Database)
+add_attendance_methods_to_database(Database)
+add_schedule_methods_to_database(Database)
+add_geo_methods_to_database(Database)
+
+# Instrumentação opcional (IEQ_METRICS=1); desligada, os métodos ficam intactos
+if METRICS_ENABLED:
+    instrument_database(Database)
+
 
 # ==============================================================================
 # COMPONENTES UI REUTILIZÁVEIS
@@ -464,11 +1108,12 @@ def address_form_fields(page):
     uf = ft.TextField(label="UF", width=80)
     status = ft.Text("", size=12)
 
+    @batched
     def on_cep_change(e):
         if len(ViaCEPService.clean_cep(cep.value)) < 8: return
         status.value = "Buscando..."
         status.color = "blue"
-        page.update()
+        flush_updates(page)
         
         data = ViaCEPService.search_by_cep(cep.value)
         if data:
@@ -484,7 +1129,7 @@ def address_form_fields(page):
             status.value = "✗ CEP não encontrado."
             status.color = "red"
             show_warning(page, "CEP não encontrado. Verifique o número.")
-        page.update()
+        request_update(page)
 
     cep.on_change = on_cep_change
     
@@ -496,11 +1141,136 @@ def address_form_fields(page):
     
     return {
         "ui": fields_ui,
-        "get_full_address": lambda: f"{logradouro.value}, {numero.value} - {bairro.value}, {cidade.value}/{uf.value} CEP: {cep.value}",
+        "get_address": lambda: {"cep": cep.value, "logradouro": logradouro.value, "numero": numero.value,
+                                "bairro": bairro.value, "cidade": cidade.value, "uf": uf.value},
         "cep": cep, "logradouro": logradouro, "numero": numero,
         "bairro": bairro, "cidade": cidade, "uf": uf, "status": status
     }
 
+def count_controls(control):
+    """Conta os controles de uma árvore (estimativa do custo de manter a view)"""
+    total = 0
+    stack = [control]
+    while stack:
+        c = stack.pop()
+        if c is None:
+            continue
+        total += 1
+        children = getattr(c, "controls", None)
+        if isinstance(children, list):
+            stack.extend(children)
+        content = getattr(c, "content", None)
+        if content is not None and not isinstance(content, str):
+            stack.append(content)
+    return total
+
+class ViewManager:
+    """
+    Mantém as views do dashboard vivas entre trocas de aba (LRU por sessão).
+
+    A view pode expor ganchos em `control.data` (dict):
+      - "on_show": atualização incremental chamada ao reaparecer
+      - "tables": tabelas de que depende; escritas nelas forçam o on_show
+      - "scrollable": controle rolável cuja posição é preservada
+      - "patch": aplica uma alteração já conhecida (ex.: linha salva) sem recarregar;
+        retorna True se a view ficou em dia
+    """
+
+    def __init__(self, page, container, db, max_views=6, max_controls=20000, stale_after=60):
+        self.page = page
+        self.container = container
+        self.db = db
+        self.max_views = max_views
+        self.max_controls = max_controls
+        self.stale_after = stale_after
+        self.views = OrderedDict()
+
+    @staticmethod
+    def _hooks(control):
+        data = getattr(control, "data", None)
+        return data if isinstance(data, dict) else {}
+
+    def _versions(self, hooks):
+        return tuple(self.db.table_version(t) for t in hooks.get("tables", ()))
+
+    def show(self, key, factory):
+        """Exibe a view `key`, construindo-a com `factory` apenas se não estiver em cache"""
+        entry = self.views.get(key)
+        if entry is None:
+            control = factory()
+            hooks = self._hooks(control)
+            entry = {"control": control, "versions": self._versions(hooks),
+                     "refreshed_at": time.monotonic(), "scroll": None, "size": count_controls(control)}
+            self.views[key] = entry
+            self.container.content = control
+        else:
+            self.views.move_to_end(key)
+            self.container.content = entry["control"]
+            self._refresh_if_needed(entry)
+
+        self._track_scroll(entry)
+        flush_updates(self.page)
+        self._restore_scroll(entry)
+
+        self._evict(keep=key)
+        return entry["control"]
+
+    def patch(self, key, *args):
+        """Repassa uma alteração à view em cache; se ela aplicar, não há recarga ao reaparecer"""
+        entry = self.views.get(key)
+        if entry is None:
+            return
+        hooks = self._hooks(entry["control"])
+        patch = hooks.get("patch")
+        if patch and patch(*args):
+            entry["versions"] = self._versions(hooks)
+
+    def _refresh_if_needed(self, entry):
+        hooks = self._hooks(entry["control"])
+        on_show = hooks.get("on_show")
+        if not on_show:
+            return
+        versions = self._versions(hooks)
+        if versions != entry["versions"] or time.monotonic() - entry["refreshed_at"] > self.stale_after:
+            on_show()
+            entry["versions"] = versions
+            entry["refreshed_at"] = time.monotonic()
+            # Tamanho recontado só quando a view é reconstruída, não a cada troca de aba
+            entry["size"] = count_controls(entry["control"])
+
+    def _track_scroll(self, entry):
+        scrollable = self._hooks(entry["control"]).get("scrollable")
+        if scrollable is None or scrollable.on_scroll is not None:
+            return
+
+        def on_scroll(e):
+            entry["scroll"] = e.pixels
+
+        scrollable.scroll_interval = 250
+        scrollable.on_scroll = on_scroll
+
+    def _restore_scroll(self, entry):
+        scrollable = self._hooks(entry["control"]).get("scrollable")
+        if scrollable is None or not entry["scroll"]:
+            return
+        if asyncio.iscoroutinefunction(scrollable.scroll_to):
+            self.page.run_task(scrollable.scroll_to, offset=entry["scroll"], duration=0)
+        else:
+            scrollable.scroll_to(offset=entry["scroll"], duration=0)
+
+    def _evict(self, keep):
+        total = sum(e["size"] for e in self.views.values())
+        while len(self.views) > 1 and (len(self.views) > self.max_views or total > self.max_controls):
+            oldest = next(k for k in self.views if k != keep)
+            total -= self.views.pop(oldest)["size"]
+
+    def invalidate(self, key=None):
+        """Descarta uma view (ou todas) do cache"""
+        if key is None:
+            self.views.clear()
+        else:
+            self.views.pop(key, None)
+
 # ==============================================================================
 # VIEWS (TELAS) - MANTIDAS IGUAIS À VERSÃO ORIGINAL
 # ==============================================================================
@@ -532,6 +1302,7 @@ def login_view(page: ft.Page, db: Database, on_success):
     
     member_mode = ft.Ref[ft.Column]()
 
+    @batched
     def attempt_admin_login(e):
         if not admin_user.value or not admin_pass.value:
             show_warning(page, "Preencha todos os campos!")
@@ -539,17 +1310,16 @@ def login_view(page: ft.Page, db: Database, on_success):
             
         loading = show_loading(page, "Verificando credenciais...")
         
-        time.sleep(0.5)
-        
-        if db.check_login(admin_user.value, admin_pass.value):
+        user = db.authenticate(admin_user.value, admin_pass.value)
+        if user:
             hide_loading(page, loading)
-            show_success(page, f"Bem-vindo(a), {admin_user.value}!")
-            time.sleep(0.3)
-            on_success(admin_user.value)
+            show_success(page, f"Bem-vindo(a), {user.username}!")
+            on_success(user)
         else:
             hide_loading(page, loading)
             show_error(page, "Usuário ou senha incorretos!")
 
+    @batched
     def attempt_member_login(e):
         if not member_user.value or not member_pass.value:
             show_warning(page, "Preencha todos os campos!")
@@ -557,32 +1327,34 @@ def login_view(page: ft.Page, db: Database, on_success):
         
         loading = show_loading(page, "Verificando credenciais...")
         
-        time.sleep(0.5)
-        
-        if db.check_login(member_user.value, member_pass.value):
+        user = db.authenticate(member_user.value, member_pass.value)
+        if user:
             hide_loading(page, loading)
-            show_success(page, f"Bem-vindo(a), {member_user.value}!")
-            time.sleep(0.3)
-            on_success(member_user.value)
+            show_success(page, f"Bem-vindo(a), {user.username}!")
+            on_success(user)
         else:
             hide_loading(page, loading)
             show_error(page, "Usuário ou senha incorretos!")
 
+    @batched
     def google_login_simulation(e):
         loading = show_loading(page, "Conectando ao Google...")
         
-        time.sleep(1.5)
-        
         google_user = "Membro Google"
-        if not db.check_user_exists(google_user):
+        user = db.get_session_user(google_user)
+        if not user:
             perms = {"celulas": True, "voluntários": True, "readonly": True}
             db.add_user(google_user, None, False, perms, is_google=True)
+            user = db.get_session_user(google_user)
         
         hide_loading(page, loading)
+        if not user:
+            show_error(page, "Erro ao entrar com Google.")
+            return
         show_success(page, "Login com Google realizado com sucesso!")
-        time.sleep(0.3)
-        on_success(google_user)
+        on_success(user)
 
+    @batched
     def register_member(e):
         if not reg_name.value or not reg_pass.value:
             show_warning(page, "Preencha nome de usuário e senha!")
@@ -591,13 +1363,13 @@ def login_view(page: ft.Page, db: Database, on_success):
         if len(reg_pass.value) < 8:
             show_warning(page, "A senha deve ter no mínimo 8 caracteres!")
             reg_pass.error_text = "Senha deve ter no mínimo 8 dígitos"
-            page.update()
+            request_update(page)
             return
             
         if db.check_user_exists(reg_name.value):
             show_error(page, "Este nome de usuário já está em uso!")
             reg_name.error_text = "Usuário já existe"
-            page.update()
+            request_update(page)
             return
 
         loading = show_loading(page, "Criando conta...")
@@ -607,12 +1379,12 @@ def login_view(page: ft.Page, db: Database, on_success):
         if db.add_user(reg_name.value, reg_pass.value, False, perms, phone=reg_phone.value):
             hide_loading(page, loading)
             show_success(page, f"Conta criada com sucesso! Bem-vindo(a), {reg_name.value}!")
-            time.sleep(0.5)
             toggle_member_mode("login")
         else:
             hide_loading(page, loading)
             show_error(page, "Erro ao criar conta. Tente novamente.")
 
+    @batched
     def toggle_member_mode(mode):
         if mode == "register":
             member_content.controls = [
@@ -636,7 +1408,7 @@ def login_view(page: ft.Page, db: Database, on_success):
                 ),
                 ft.TextButton("Não tem conta? Criar conta", on_click=lambda e: toggle_member_mode("register"))
             ]
-        page.update()
+        request_update(page)
 
     member_content = ft.Column(
         spacing=15, 
@@ -665,12 +1437,13 @@ def login_view(page: ft.Page, db: Database, on_success):
 
     current_content = ft.Container(content=member_content, padding=20)
     
+    @batched
     def switch_tab(e):
         is_member = e.control.data == "member"
         current_content.content = member_content if is_member else admin_content
         btn_member.style = ft.ButtonStyle(bgcolor=THEME_COLOR if is_member else "white", color="white" if is_member else THEME_COLOR)
         btn_admin.style = ft.ButtonStyle(bgcolor=THEME_COLOR if not is_member else "white", color="white" if not is_member else THEME_COLOR)
-        page.update()
+        request_update(page)
 
     btn_member = ft.Button("Sou Membro", on_click=switch_tab, data="member", 
                            style=ft.ButtonStyle(bgcolor=THEME_COLOR, color="white"), expand=True)
@@ -712,35 +1485,100 @@ def visitors_view(page: ft.Page, db: Database, readonly: bool = False):
     obs = ft.TextField(label="Observações", multiline=True, min_lines=2)
     addr_component = address_form_fields(page)
 
+    @batched
     def save(e):
         if not name.value:
             name.error_text = "Campo obrigatório"
             show_warning(page, "Por favor, preencha o nome do visitante!")
-            page.update()
+            request_update(page)
             return
         
+        insert(force=False)
+
+    @batched
+    def insert(force):
         loading = show_loading(page, "Salvando visitante...")
+        result = db.add_visitor(name.value, phone.value, email.value, addr_component["get_address"](), obs.value,
+                                force=force)
         
-        time.sleep(0.3)
-        
-        if db.add_visitor(name.value, phone.value, email.value, addr_component["get_full_address"](), obs.value):
+        if isinstance(result, list):
+            hide_loading(page, loading)
+            confirm_duplicate(result)
+        elif result:
             hide_loading(page, loading)
             show_success(page, f"Visitante '{name.value}' cadastrado com sucesso!")
-            
-            name.value = phone.value = email.value = obs.value = ""
-            name.error_text = None
-            for field in [addr_component["cep"], addr_component["logradouro"], addr_component["numero"], 
-                          addr_component["bairro"], addr_component["cidade"], addr_component["uf"]]:
-                field.value = ""
-            addr_component["status"].value = ""
+            clear_form()
         else:
             hide_loading(page, loading)
             show_error(page, "Erro ao salvar visitante. Tente novamente.")
         
-        page.update()
+        request_update(page)
+
+    def clear_form():
+        name.value = phone.value = email.value = obs.value = ""
+        name.error_text = None
+        for field in [addr_component["cep"], addr_component["logradouro"], addr_component["numero"], 
+                      addr_component["bairro"], addr_component["cidade"], addr_component["uf"]]:
+            field.value = ""
+        addr_component["status"].value = ""
+
+    def confirm_duplicate(candidates):
+        """Cadastros parecidos encontrados: confirma antes de criar outro"""
+        def close():
+            dialog.open = False
+            request_update(page)
+
+        @batched
+        def insert_anyway(e):
+            close()
+            insert(force=True)
+
+        @batched
+        def register_return(e):
+            # É o mesmo visitante voltando: só registra a visita, sem novo cadastro
+            close()
+            visitor = e.control.data
+            if db.register_visit(visitor.id):
+                show_success(page, f"Retorno de '{visitor.name}' registrado!")
+                clear_form()
+            else:
+                show_error(page, "Erro ao registrar retorno.")
+
+        lines = [ft.Text("Já existe(m) cadastro(s) parecido(s):")]
+        for c in candidates[:5]:
+            visited = format_datetime(c.record.date_visit)
+            lines.append(ft.Row([
+                ft.Text(f"{c.record.name} · {c.record.phone or 'sem telefone'}"
+                        + (f" · visita em {visited}" if visited else "") + f" ({c.score:.0%})", size=12, expand=True),
+                ft.TextButton("Registrar retorno", data=c.record, on_click=register_return)
+            ]))
+        dialog = ft.AlertDialog(
+            title=ft.Text("Possível visitante duplicado"),
+            content=ft.Column(lines, tight=True),
+            actions=[
+                ft.TextButton("Cancelar", on_click=lambda e: close()),
+                ft.TextButton("Cadastrar mesmo assim", on_click=insert_anyway)
+            ]
+        )
+        page.overlay.append(dialog)
+        dialog.open = True
+        request_update(page)
 
-    return ft.ListView([
-        ft.Text("Novo Visitante", size=20, weight="bold"),
+    @batched
+    def show_form():
+        container.content = form
+        request_update(page)
+
+    @batched
+    def show_import(e):
+        container.content = visitor_import_view(page, db, show_success, show_error, show_warning, show_form)
+        request_update(page)
+
+    form = ft.ListView([
+        ft.Row([
+            ft.Text("Novo Visitante", size=20, weight="bold"),
+            ft.OutlinedButton("Importar planilha", icon=ft.Icons.UPLOAD_FILE, on_click=show_import)
+        ], alignment="spaceBetween"),
         ft.Divider(),
         name,
         ft.Row([phone, email]),
@@ -751,6 +1589,17 @@ def visitors_view(page: ft.Page, db: Database, readonly: bool = False):
         obs,
         ft.Button("Salvar Visitante", icon=ft.Icons.SAVE, on_click=save, style=ft.ButtonStyle(bgcolor=THEME_COLOR, color="white"))
     ], expand=True, spacing=15, padding=20)
+    container = ft.Container(content=form, expand=True)
+    return container
+
+# Campos do visitante na mensagem de conflito
+VISITOR_EDIT_LABELS = {"name": "Nome", "phone": "WhatsApp", "email": "E-mail", "observations": "Observações",
+                       "cep": "CEP", "logradouro": "Logradouro", "numero": "Nº", "bairro": "Bairro",
+                       "cidade": "Cidade", "uf": "UF", "cell_id": "Célula"}
+
+def _edit_group(column):
+    # O endereço é gravado junto (partes + texto legado): conflita como um campo só
+    return "address" if column == "address" or column in ADDRESS_FIELDS else column
 
 def visitor_edit_view(page: ft.Page, db: Database, visitor_id: int, on_back_callback):
     visitor_data = db.get_visitor_by_id(visitor_id)
@@ -759,28 +1608,7 @@ def visitor_edit_view(page: ft.Page, db: Database, visitor_id: int, on_back_call
         on_back_callback()
         return ft.Container()
     
-    v_id, v_name, v_phone, v_email, v_address, v_date, v_obs = visitor_data
-    
-    def parse_address(address_str):
-        if not address_str:
-            return {"cep": "", "logradouro": "", "numero": "", "bairro": "", "cidade": "", "uf": ""}
-        try:
-            parts = address_str.split(" CEP: ")
-            cep = parts[1] if len(parts) > 1 else ""
-            main_parts = parts[0].split(" - ")
-            bairro_cidade = main_parts[1].split(", ") if len(main_parts) > 1 else ["", ""]
-            logradouro_numero = main_parts[0].split(", ") if len(main_parts) > 0 else ["", ""]
-            logradouro = logradouro_numero[0] if len(logradouro_numero) > 0 else ""
-            numero = logradouro_numero[1] if len(logradouro_numero) > 1 else ""
-            bairro = bairro_cidade[0] if len(bairro_cidade) > 0 else ""
-            cidade_uf = bairro_cidade[1].split("/") if len(bairro_cidade) > 1 else ["", ""]
-            cidade = cidade_uf[0] if len(cidade_uf) > 0 else ""
-            uf = cidade_uf[1] if len(cidade_uf) > 1 else ""
-            return {"cep": cep, "logradouro": logradouro, "numero": numero, "bairro": bairro, "cidade": cidade, "uf": uf}
-        except:
-            return {"cep": "", "logradouro": "", "numero": "", "bairro": "", "cidade": "", "uf": ""}
-    
-    addr_parts = parse_address(v_address)
+    v_id, v_name, v_phone, v_email, v_address, v_date, v_obs, addr_parts, v_updated_at, v_cell_id = visitor_data
     
     name = ft.TextField(label="Nome *", value=v_name, prefix_icon=ft.Icons.PERSON)
     phone = ft.TextField(label="WhatsApp", value=v_phone or "", prefix_icon=ft.Icons.PHONE, keyboard_type="phone")
@@ -794,13 +1622,89 @@ def visitor_edit_view(page: ft.Page, db: Database, visitor_id: int, on_back_call
     cidade = ft.TextField(label="Cidade", value=addr_parts["cidade"], expand=True)
     uf = ft.TextField(label="UF", value=addr_parts["uf"], width=80)
     status = ft.Text("", size=12)
+    # Célula escolhida (gravada junto com as demais alterações)
+    assigned = {"cell_id": v_cell_id}
+    cell_names = {c.id: c.name for c in db.get_all_cells()}
+    cell_text = ft.Text("", size=14)
+    suggestions = ft.Column([], spacing=0)
+
+    def form_values():
+        address = {"cep": cep.value, "logradouro": logradouro.value, "numero": numero.value,
+                   "bairro": bairro.value, "cidade": cidade.value, "uf": uf.value}
+        values = visitor_columns(name.value, phone.value, email.value, address, obs.value)
+        values['cell_id'] = assigned["cell_id"]
+        return values
+
+    def row_values(row):
+        values = visitor_row_values(row)
+        values['cell_id'] = row.get('cell_id')
+        return values
+
+    def cell_label(cell_id):
+        return cell_names.get(cell_id, "célula inativa") if cell_id else "nenhuma"
+
+    def show_cell():
+        cell_text.value = f"Célula: {cell_label(assigned['cell_id'])}"
+
+    def choose_cell(cell_id):
+        assigned["cell_id"] = cell_id
+        show_cell()
+        show_info(page, "Célula escolhida. Salve para confirmar.")
+        request_update(page)
+
+    def load_suggestions(cached_only):
+        """Células mais próximas do CEP (cached_only: sem ir à rede, para abrir a tela rápido)"""
+        found = db.suggest_cells(cep.value, logradouro.value, cidade.value, uf.value, cached_only=cached_only)
+        if found is None:
+            suggestions.controls = [ft.TextButton("Sugerir célula mais próxima", icon=ft.Icons.NEAR_ME,
+                                                  on_click=lambda e: suggest_now())]
+        elif not found:
+            suggestions.controls = [ft.Text("Sem sugestão: CEP não localizado ou nenhuma célula com endereço.",
+                                            size=12, color="grey")]
+        else:
+            suggestions.controls = [
+                ft.ListTile(
+                    leading=ft.Icon(ft.Icons.GROUPS, color=THEME_COLOR),
+                    title=ft.Text(s.name),
+                    subtitle=ft.Text(f"{s.meeting_day or ''} {s.meeting_time or ''} · {format_distance(s.distance_km)}"),
+                    trailing=ft.TextButton("Escolher", data=s.id, on_click=lambda e: choose_cell(e.control.data)),
+                    dense=True
+                ) for s in found
+            ]
 
+    @batched
+    def suggest_now():
+        loading = show_loading(page, "Localizando CEP...")
+        load_suggestions(cached_only=False)
+        hide_loading(page, loading)
+        request_update(page)
+
+    def fill_form(row):
+        """Carrega no formulário a versão `row` do banco (base das próximas comparações)"""
+        parts = address_from_row(row)
+        name.value = row.get('name') or ""
+        phone.value = row.get('phone') or ""
+        email.value = row.get('email') or ""
+        obs.value = row.get('observations') or ""
+        cep.value, logradouro.value, numero.value = parts["cep"], parts["logradouro"], parts["numero"]
+        bairro.value, cidade.value, uf.value = parts["bairro"], parts["cidade"], parts["uf"]
+        assigned["cell_id"] = row.get('cell_id')
+        show_cell()
+        loaded["values"] = form_values()
+        loaded["updated_at"] = row.get('updated_at')
+
+    # Versão carregada: as alterações são calculadas contra ela e o updated_at é a pré-condição
+    loaded = {"values": form_values(), "updated_at": v_updated_at}
+    show_cell()
+    load_suggestions(cached_only=True)
+
+    @batched
     def on_cep_change(e):
         if len(ViaCEPService.clean_cep(cep.value)) < 8:
             return
         status.value = "Buscando..."
         status.color = "blue"
-        page.update()
+        flush_updates(page)
         
         data = ViaCEPService.search_by_cep(cep.value)
         if data:
@@ -812,35 +1716,101 @@ def visitor_edit_view(page: ft.Page, db: Database, visitor_id: int, on_back_call
             status.value = "✓ Endereço encontrado!"
             status.color = "green"
             show_success(page, "Endereço carregado com sucesso!")
+            load_suggestions(cached_only=False)
         else:
             status.value = "✗ CEP não encontrado."
             status.color = "red"
             show_warning(page, "CEP não encontrado. Verifique o número.")
-        page.update()
+        request_update(page)
 
     cep.on_change = on_cep_change
     
+    @batched
     def save_changes(e):
         if not name.value:
             name.error_text = "Campo obrigatório"
             show_warning(page, "Por favor, preencha o nome do visitante!")
-            page.update()
+            request_update(page)
             return
         
+        changes = changed_columns(loaded["values"], form_values())
+        if not changes:
+            show_info(page, "Nenhuma alteração para salvar.")
+            on_back_callback()
+            return
+        submit(changes, loaded["updated_at"], merge=True)
+
+    @batched
+    def submit(changes, updated_at, merge):
         loading = show_loading(page, "Salvando alterações...")
-        time.sleep(0.3)
-        
-        full_address = f"{logradouro.value}, {numero.value} - {bairro.value}, {cidade.value}/{uf.value} CEP: {cep.value}"
-        
-        if db.update_visitor(visitor_id, name.value, phone.value, email.value, full_address, obs.value):
-            hide_loading(page, loading)
-            show_success(page, f"Visitante '{name.value}' atualizado com sucesso!")
-            time.sleep(0.5)
+        result = db.update_visitor(visitor_id, changes, updated_at)
+        hide_loading(page, loading)
+        if result is None:
+            show_error(page, "Erro ao atualizar visitante.")
+            return
+        if not result.conflict:
+            show_success(page, f"Visitante '{result.row.get('name')}' atualizado com sucesso!")
+            on_back_callback(result.row)
+            return
+        if result.row is None:
+            show_error(page, "Este visitante foi removido por outra pessoa.")
             on_back_callback()
+            return
+        
+        # Outra pessoa salvou depois do carregamento: compara os grupos de campos alterados
+        current_values = row_values(result.row)
+        theirs = changed_columns(loaded["values"], current_values)
+        mine = changed_columns(current_values, changes)
+        if not mine:
+            # A versão salva já tem exatamente as minhas alterações
+            show_success(page, f"Visitante '{result.row.get('name')}' atualizado com sucesso!")
+            on_back_callback(result.row)
+            return
+        overlap = {_edit_group(c) for c in theirs} & {_edit_group(c) for c in mine}
+        if not overlap and merge:
+            # Campos diferentes: grava as minhas alterações sobre a versão nova
+            submit(changes, result.row.get('updated_at'), merge=False)
         else:
-            hide_loading(page, loading)
-            show_error(page, "Erro ao atualizar visitante.")
+            show_conflict(changes, result.row, overlap)
+
+    def show_conflict(changes, current, overlap):
+        current_values = row_values(current)
+        lines = [ft.Text("Este visitante foi alterado por outra pessoa enquanto você editava.")]
+        shown = lambda column, value: cell_label(value) if column == 'cell_id' else value or ''
+        for column, label in VISITOR_EDIT_LABELS.items():
+            if _edit_group(column) in overlap and column in changes and current_values.get(column) != changes[column]:
+                lines.append(ft.Text(f"{label}: \"{shown(column, current_values.get(column))}\" (salvo) × "
+                                     f"\"{shown(column, changes[column])}\" (seu)", size=12))
+
+        def close():
+            dialog.open = False
+            request_update(page)
+
+        @batched
+        def keep_mine(e):
+            close()
+            submit(changes, current.get('updated_at'), merge=False)
+
+        @batched
+        def use_saved(e):
+            close()
+            fill_form(current)
+            show_info(page, "Formulário atualizado com a versão salva.")
+            request_update(page)
+
+        dialog = ft.AlertDialog(
+            title=ft.Text("Conflito de edição"),
+            content=ft.Column(lines, tight=True),
+            actions=[
+                ft.TextButton("Usar a versão salva", on_click=use_saved),
+                ft.TextButton("Salvar as minhas", on_click=keep_mine, style=ft.ButtonStyle(color="red"))
+            ]
+        )
+        page.overlay.append(dialog)
+        dialog.open = True
+        request_update(page)
     
+    @batched
     def cancel_edit(e):
         on_back_callback()
 
@@ -858,6 +1828,10 @@ def visitor_edit_view(page: ft.Page, db: Database, visitor_id: int, on_back_call
         ft.Row([logradouro, numero]),
         ft.Row([bairro, cidade, uf]),
         ft.Divider(),
+        ft.Text("Casa de Cornélio", weight="bold"),
+        cell_text,
+        suggestions,
+        ft.Divider(),
         obs,
         ft.Row([
             ft.OutlinedButton("Cancelar", on_click=cancel_edit, icon=ft.Icons.CANCEL),
@@ -870,173 +1844,540 @@ def visitors_list_view(page: ft.Page, db: Database, readonly: bool = False, on_e
     if readonly:
         return ft.Center(ft.Text("Área restrita."))
 
-    list_column = ft.Column([], scroll="auto", expand=True)
-    
-    def refresh_list(e=None):
-        items = db.get_all_visitors()
-        list_controls = []
+    list_column = ft.ListView([], expand=True, spacing=5)
+    city_filter = ft.TextField(label="Cidade", width=200, dense=True)
+    district_filter = ft.TextField(label="Bairro", width=200, dense=True)
+    paging = {"cursor": None}
+    # Filtro da lista carregada (cidade, bairro): as próximas páginas usam o mesmo
+    active_filter = {"cidade": "", "bairro": ""}
+    more_button = ft.TextButton("Carregar mais", icon=ft.Icons.EXPAND_MORE, on_click=lambda e: load_page())
+
+    def build_card(v):
+        v_id, v_name, v_phone = v.id, v.name, v.phone
+        v_date = format_datetime(v.date_visit)
+        
+        action_buttons = []
+        
+        if v_phone:
+            whatsapp_url = open_whatsapp(v_phone, v_name)
+            action_buttons.append(
+                ft.IconButton(
+                    icon=ft.Icons.MESSAGE,
+                    icon_color="green",
+                    tooltip=f"WhatsApp: {v_phone}",
+                    url=whatsapp_url
+                )
+            )
+        else:
+            action_buttons.append(
+                ft.Icon(ft.Icons.PHONE_DISABLED, color="grey", tooltip="Sem telefone")
+            )
         
-        if not items:
-            list_controls.append(
+        action_buttons.append(
+            ft.IconButton(
+                icon=ft.Icons.EVENT_REPEAT,
+                icon_color=THEME_COLOR,
+                tooltip="Registrar retorno",
+                data=(v_id, v_name),
+                on_click=lambda e: register_return(*e.control.data)
+            )
+        )
+        
+        if on_edit_visitor:
+            action_buttons.append(
+                ft.IconButton(
+                    icon=ft.Icons.EDIT,
+                    icon_color=THEME_COLOR,
+                    tooltip="Editar visitante",
+                    data=v_id,
+                    on_click=lambda e: on_edit_visitor(e.control.data)
+                )
+            )
+
+        return ft.Card(
+            content=ft.Container(
+                content=ft.Row([
+                    ft.Icon(ft.Icons.PERSON, color=THEME_COLOR, size=40),
+                    ft.Column([
+                        ft.Text(v_name, weight="bold", size=16),
+                        ft.Text(f"Visita: {v_date}", size=12, color="grey"),
+                        ft.Text(v_phone if v_phone else "Sem telefone", size=12, color="grey"),
+                    ], spacing=2, expand=True),
+                    ft.Row(action_buttons, spacing=5)
+                ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                padding=15
+            ),
+            data=v_id
+        )
+
+    @batched
+    def load_page(reset=False):
+        """Busca a próxima página (ou a primeira, com reset) e acrescenta os cards no fim da lista"""
+        controls = list_column.controls
+        if reset:
+            controls.clear()
+            paging["cursor"] = None
+        elif controls and controls[-1] is more_button:
+            controls.pop()
+        items, paging["cursor"] = db.get_visitors_page(paging["cursor"], active_filter["cidade"],
+                                                       active_filter["bairro"])
+        if reset and not items:
+            controls.append(
                 ft.Container(
                     content=ft.Column([
                         ft.Icon(ft.Icons.PERSON_REMOVE, size=64, color="grey"),
-                        ft.Text("Nenhum visitante cadastrado.", size=16, color="grey")
+                        ft.Text("Nenhum visitante encontrado." if any(active_filter.values())
+                                else "Nenhum visitante cadastrado.", size=16, color="grey")
                     ], horizontal_alignment="center", spacing=10),
                     padding=40
                 )
             )
+        controls.extend(build_card(v) for v in items)
+        if paging["cursor"]:
+            controls.append(more_button)
+        request_update(page)
+
+    @batched
+    def refresh_list(e=None, notify=True):
+        cidade, bairro = city_filter.value.strip(), district_filter.value.strip()
+        if bairro and not cidade and not DEFAULT_CITY:
+            show_warning(page, "Informe a cidade para filtrar por bairro.")
+            return
+        active_filter.update(cidade=cidade, bairro=bairro)
+        load_page(reset=True)
+        if notify and list_column.controls and list_column.controls[0].data is not None:
+            # Só a primeira página é carregada: o total vem de uma contagem
+            total = db.count_visitors(cidade, bairro)
+            if total is not None:
+                show_info(page, f"{total} visitante(s) encontrado(s)")
+
+    def patch_row(row):
+        """Troca só o card do visitante salvo (linha devolvida pelo update)"""
+        item = VisitorListItem._make(row.get(f) for f in VisitorListItem._fields)
+        controls = list_column.controls
+        index = next((i for i, c in enumerate(controls) if c.data == item.id), None)
+        if index is None:
+            return False
+        controls[index] = build_card(item)
+        request_update(page)
+        return True
+    
+    @batched
+    def register_return(visitor_id, visitor_name):
+        if db.register_visit(visitor_id):
+            show_success(page, f"Retorno de '{visitor_name}' registrado!")
         else:
-            show_info(page, f"{len(items)} visitante(s) encontrado(s)")
-            
-        for v in items:
-            v_id = v[0]
-            v_name = v[1]
-            v_phone = v[2]
-            v_email = v[3]
-            v_date = v[5]
-            
-            action_buttons = []
-            
-            if v_phone:
-                whatsapp_url = open_whatsapp(v_phone, v_name)
-                action_buttons.append(
-                    ft.IconButton(
-                        icon=ft.Icons.MESSAGE,
-                        icon_color="green",
-                        tooltip=f"WhatsApp: {v_phone}",
-                        url=whatsapp_url
-                    )
-                )
-            else:
-                action_buttons.append(
-                    ft.Icon(ft.Icons.PHONE_DISABLED, color="grey", tooltip="Sem telefone")
-                )
-            
-            if on_edit_visitor:
-                action_buttons.append(
-                    ft.IconButton(
-                        icon=ft.Icons.EDIT,
-                        icon_color=THEME_COLOR,
-                        tooltip="Editar visitante",
-                        data=v_id,
-                        on_click=lambda e: on_edit_visitor(e.control.data)
-                    )
-                )
-
-            list_controls.append(
-                ft.Card(
-                    content=ft.Container(
-                        content=ft.Row([
-                            ft.Icon(ft.Icons.PERSON, color=THEME_COLOR, size=40),
-                            ft.Column([
-                                ft.Text(v_name, weight="bold", size=16),
-                                ft.Text(f"Visita: {v_date}", size=12, color="grey"),
-                                ft.Text(v_phone if v_phone else "Sem telefone", size=12, color="grey"),
-                            ], spacing=2, expand=True),
-                            ft.Row(action_buttons, spacing=5)
-                        ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
-                        padding=15
-                    )
-                )
-            )
-        
-        list_column.controls = list_controls
-        page.update()
+            show_error(page, "Erro ao registrar retorno.")
+
+    @batched
+    def show_duplicates(e):
+        view.content = duplicates_view(page, db, show_success, show_error, show_loading, hide_loading,
+                                       on_back=show_list)
+        request_update(page)
+
+    @batched
+    def assign_cells(e):
+        loading = show_loading(page, "Encaminhando visitantes sem célula (na 1ª vez os CEPs são localizados)...")
+        summary = db.assign_nearest_cells()
+        hide_loading(page, loading)
+        if summary is None:
+            show_error(page, "Erro ao encaminhar visitantes.")
+            return
+        skipped = []
+        if summary.no_location:
+            skipped.append(f"{summary.no_location} sem CEP localizado")
+        if summary.too_far:
+            skipped.append(f"{summary.too_far} longe de qualquer célula")
+        show_success(page, f"{summary.assigned} visitante(s) encaminhado(s)"
+                           + (f" ({', '.join(skipped)})" if skipped else ""))
+
+    @batched
+    def show_retention(e):
+        view.content = retention_view(page, db, show_loading, hide_loading, on_back=show_list)
+        request_update(page)
+
+    @batched
+    def show_list():
+        view.content = list_content
+        refresh_list(notify=False)
     
-    refresh_list()
+    refresh_list(notify=False)
 
-    return ft.Container(
-        content=ft.Column([
+    list_content = ft.Column([
+        ft.Row([
+            ft.Text("Lista de Visitantes", size=20, weight="bold"),
             ft.Row([
-                ft.Text("Lista de Visitantes", size=20, weight="bold"),
+                ft.IconButton(
+                    icon=ft.Icons.PEOPLE_ALT,
+                    tooltip="Possíveis duplicados",
+                    on_click=show_duplicates
+                ),
+                ft.IconButton(
+                    icon=ft.Icons.QUERY_STATS,
+                    tooltip="Retenção de visitantes",
+                    on_click=show_retention
+                ),
+                ft.IconButton(
+                    icon=ft.Icons.ALT_ROUTE,
+                    tooltip="Encaminhar visitantes sem célula para a mais próxima",
+                    on_click=assign_cells
+                ),
+                export_control(page, db, "visitors", show_success, show_error),
                 ft.IconButton(
                     icon=ft.Icons.REFRESH,
                     tooltip="Atualizar lista",
                     on_click=refresh_list
                 )
-            ], alignment="spaceBetween"),
-            ft.Divider(),
-            list_column
-        ], expand=True, spacing=10),
+            ], spacing=5)
+        ], alignment="spaceBetween"),
+        ft.Row([
+            city_filter,
+            district_filter,
+            ft.IconButton(icon=ft.Icons.FILTER_ALT, tooltip="Filtrar por bairro", on_click=refresh_list)
+        ]),
+        ft.Divider(),
+        list_column
+    ], expand=True, spacing=10)
+
+    view = ft.Container(
+        content=list_content,
         padding=20,
-        expand=True
+        expand=True,
+        data={"on_show": lambda: refresh_list(notify=False), "tables": ("visitors",), "scrollable": list_column,
+              "patch": patch_row}
     )
+    return view
+
+def report_bulk(page, ids, applied, done, error):
+    """Resultado de uma ação em lote: tudo, parte (os demais seguem selecionados) ou nada"""
+    if len(applied) == len(ids):
+        show_success(page, f"{len(ids)} {done} com sucesso!")
+    elif applied:
+        show_warning(page, f"Só {len(applied)} de {len(ids)} {done}: houve um erro no meio. "
+                           "Os demais continuam selecionados para tentar de novo.")
+    else:
+        show_error(page, error)
+
+def bulk_selection(page, noun, edit_fields, on_deactivate, on_edit):
+    """
+    Seleção múltipla para as listas de voluntários e células.
+
+    edit_fields: {coluna: controle} do diálogo de edição em lote (vazio = mantém)
+    on_deactivate(ids) e on_edit(ids, dados) aplicam a ação e retornam os ids gravados;
+    numa falha parcial, só os que faltaram continuam selecionados.
+    Retorna dict com "toggle" (botão do cabeçalho), "bar" (barra de ações),
+    "checkbox(id)" para cada card e "forget(ids)"/"reset()" para a lista.
+    """
+    state = {"on": False}
+    checkboxes = {}
+    selected = set()
+    count_text = ft.Text("", size=12)
+
+    def refresh_bar():
+        count_text.value = f"{len(selected)} {noun}(s) selecionado(s)"
+        request_update(page)
+
+    def on_check(e):
+        if e.control.value:
+            selected.add(e.control.data)
+        else:
+            selected.discard(e.control.data)
+        refresh_bar()
+
+    def checkbox(item_id):
+        cb = ft.Checkbox(value=item_id in selected, visible=state["on"], data=item_id, on_change=on_check)
+        checkboxes[item_id] = cb
+        return cb
+
+    @batched
+    def set_mode(on):
+        state["on"] = on
+        if not on:
+            selected.clear()
+        for cb in checkboxes.values():
+            cb.visible = on
+            cb.value = cb.data in selected
+        bar.visible = on
+        toggle.icon = ft.Icons.CLOSE if on else ft.Icons.CHECKLIST
+        toggle.tooltip = "Cancelar seleção" if on else "Selecionar vários"
+        refresh_bar()
+
+    @batched
+    def select_loaded(e):
+        selected.update(checkboxes)
+        for cb in checkboxes.values():
+            cb.value = True
+        refresh_bar()
+
+    def finish(ids, applied):
+        if len(applied) == len(ids):
+            set_mode(False)
+            return
+        selected.difference_update(applied)
+        for item_id in applied:
+            if item_id in checkboxes:
+                checkboxes[item_id].value = False
+        refresh_bar()
+
+    def forget(ids):
+        for item_id in ids:
+            checkboxes.pop(item_id, None)
+            selected.discard(item_id)
+        refresh_bar()
+
+    def reset():
+        checkboxes.clear()
+        selected.clear()
+        refresh_bar()
+
+    def close(dialog):
+        dialog.open = False
+        request_update(page)
+
+    @batched
+    def confirm_deactivate(e):
+        if not selected:
+            show_warning(page, f"Nenhum(a) {noun} selecionado(a).")
+            return
+        ids = sorted(selected)
+
+        @batched
+        def confirmed(e):
+            close(dialog)
+            finish(ids, on_deactivate(ids))
+
+        dialog = ft.AlertDialog(
+            title=ft.Text("Confirmar desativação"),
+            content=ft.Text(f"Desativar {len(ids)} {noun}(s)?"),
+            actions=[
+                ft.TextButton("Cancelar", on_click=lambda e: close(dialog)),
+                ft.TextButton("Desativar", on_click=confirmed, style=ft.ButtonStyle(color="red"))
+            ]
+        )
+        page.overlay.append(dialog)
+        dialog.open = True
+        request_update(page)
+
+    @batched
+    def open_edit(e):
+        if not selected:
+            show_warning(page, f"Nenhum(a) {noun} selecionado(a).")
+            return
+        ids = sorted(selected)
+        for control in edit_fields.values():
+            control.value = None
+
+        @batched
+        def save(e):
+            data = {column: control.value for column, control in edit_fields.items() if control.value}
+            if not data:
+                show_warning(page, "Preencha ao menos um campo para alterar.")
+                return
+            close(dialog)
+            finish(ids, on_edit(ids, data))
+
+        dialog = ft.AlertDialog(
+            title=ft.Text(f"Editar {len(ids)} {noun}(s)"),
+            content=ft.Column(list(edit_fields.values()) + [
+                ft.Text("Campos em branco não são alterados.", size=12, color="grey")
+            ], tight=True),
+            actions=[
+                ft.TextButton("Cancelar", on_click=lambda e: close(dialog)),
+                ft.TextButton("Salvar", on_click=save)
+            ]
+        )
+        page.overlay.append(dialog)
+        dialog.open = True
+        request_update(page)
+
+    toggle = ft.IconButton(ft.Icons.CHECKLIST, tooltip="Selecionar vários", on_click=lambda e: set_mode(not state["on"]))
+    bar = ft.Row([
+        count_text,
+        ft.TextButton("Selecionar carregados", icon=ft.Icons.SELECT_ALL, on_click=select_loaded),
+        ft.TextButton("Editar", icon=ft.Icons.EDIT, on_click=open_edit),
+        ft.TextButton("Desativar", icon=ft.Icons.DELETE, on_click=confirm_deactivate,
+                      style=ft.ButtonStyle(color="red")),
+    ], visible=False, wrap=True)
+    return {"toggle": toggle, "bar": bar, "checkbox": checkbox, "forget": forget, "reset": reset}
+
+DEPARTMENTS = ("Pastor(a)", "Administração", "Louvor", "Infantil", "Mídia", "Diácono(a)")
+MEETING_DAYS = ("Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo")
+# Opção dos filtros de lista que não restringe nada
+ALL_OPTION = "Todos"
 
 def volunteers_view(page: ft.Page, db: Database, readonly: bool = False):
     current_view = ft.Ref[ft.Column]()
     
     name = ft.TextField(label="Nome Completo *")
     role = ft.TextField(label="Cargo/Função *")
-    dept = ft.Dropdown(label="Departamento", options=[
-        ft.dropdown.Option("Pastor(a)"), ft.dropdown.Option("Administração"), 
-        ft.dropdown.Option("Louvor"), ft.dropdown.Option("Infantil"), 
-        ft.dropdown.Option("Mídia"), ft.dropdown.Option("Diácono(a)")
-    ])
+    dept = ft.Dropdown(label="Departamento", options=[ft.dropdown.Option(d) for d in DEPARTMENTS])
     phone = ft.TextField(label="Telefone")
     email = ft.TextField(label="Email")
     hire_date = ft.TextField(label="Data Início", value=datetime.now().strftime("%d/%m/%Y"), width=150)
     addr_component = address_form_fields(page)
     obs = ft.TextField(label="Obs", multiline=True)
-
-    def show_list(e=None):
-        items = db.get_all_volunteers()
-        list_controls = []
+    list_column = ft.ListView([], expand=True, spacing=5)
+    dept_filter = ft.Dropdown(label="Departamento", width=200, dense=True, value=ALL_OPTION,
+                              options=[ft.dropdown.Option(ALL_OPTION)] + [ft.dropdown.Option(d) for d in DEPARTMENTS])
+    exporter = export_control(page, db, "volunteers", show_success, show_error)
+    mode = {"list": True}
+    paging = {"cursor": None}
+    # Registros dos cards carregados (id -> VolunteerListItem), para editar a lista no lugar
+    records = {}
+    more_button = ft.TextButton("Carregar mais", icon=ft.Icons.EXPAND_MORE, on_click=lambda e: load_page())
+
+    def current_department():
+        return dept_filter.value if dept_filter.value != ALL_OPTION else None
+
+    def build_card(i):
+        leading = ft.Icon(ft.Icons.BADGE, color=THEME_COLOR)
+        trailing = None
+        if not readonly:
+            leading = ft.Row([selection["checkbox"](i.id), leading], spacing=0, tight=True)
+            trailing = ft.IconButton(ft.Icons.DELETE, icon_color="red", 
+                                    tooltip="Desativar voluntário",
+                                    on_click=lambda e, x=i.id, n=i.name: delete_collab(x, n))
+        return ft.Card(ft.ListTile(
+            leading=leading,
+            title=ft.Text(i.name, weight="bold"),
+            subtitle=ft.Text(f"{i.role} - {i.department}\n{i.phone}"),
+            trailing=trailing
+        ), data=i.id)
+
+    def remove_cards(ids):
+        """Tira da lista os cards desativados, sem recarregar"""
+        ids = set(ids)
+        list_column.controls = [c for c in list_column.controls if c.data not in ids]
+        for item_id in ids:
+            records.pop(item_id, None)
+        selection["forget"](ids)
+        if not records:
+            load_page(reset=True)
+        request_update(page)
+
+    def patch_cards(ids, data):
+        """Reconstrói só os cards editados; os que saem do filtro atual são removidos"""
+        department = current_department()
+        gone = []
+        controls = list_column.controls
+        for index, control in enumerate(controls):
+            if control.data in ids and control.data in records:
+                item = records[control.data] = records[control.data]._replace(**data)
+                if department and item.department != department:
+                    gone.append(item.id)
+                else:
+                    controls[index] = build_card(item)
+        if gone:
+            remove_cards(gone)
+        request_update(page)
+
+    @batched
+    def bulk_deactivate(ids):
+        loading = show_loading(page, f"Desativando {len(ids)} voluntário(s)...")
+        applied = db.deactivate_volunteers(ids)
+        hide_loading(page, loading)
+        if applied:
+            remove_cards(applied)
+        report_bulk(page, ids, applied, "voluntário(s) desativado(s)", "Erro ao desativar voluntários.")
+        return applied
+
+    @batched
+    def bulk_edit(ids, data):
+        loading = show_loading(page, f"Atualizando {len(ids)} voluntário(s)...")
+        applied = db.update_volunteers(ids, data)
+        hide_loading(page, loading)
+        if applied:
+            patch_cards(set(applied), data)
+        report_bulk(page, ids, applied, "voluntário(s) atualizado(s)", "Erro ao atualizar voluntários.")
+        return applied
+
+    selection = bulk_selection(page, "voluntário", {
+        "role": ft.TextField(label="Cargo/Função"),
+        "department": ft.Dropdown(label="Departamento", options=[ft.dropdown.Option(d) for d in DEPARTMENTS]),
+    }, bulk_deactivate, bulk_edit)
+
+    @batched
+    def load_page(reset=False):
+        """Busca a próxima página (ou a primeira, com reset) e acrescenta os cards no fim da lista"""
+        controls = list_column.controls
+        if reset:
+            controls.clear()
+            records.clear()
+            selection["reset"]()
+            paging["cursor"] = None
+        elif controls and controls[-1] is more_button:
+            controls.pop()
+        department = current_department()
+        items, paging["cursor"] = db.get_volunteers_page(paging["cursor"], department)
+        records.update((i.id, i) for i in items)
         
-        if not items:
-            list_controls.append(
+        if reset and not items:
+            controls.append(
                 ft.Container(
                     content=ft.Column([
                         ft.Icon(ft.Icons.GROUP_REMOVE, size=64, color="grey"),
-                        ft.Text("Nenhum voluntário cadastrado.", size=16, color="grey")
+                        ft.Text("Nenhum voluntário encontrado." if department else "Nenhum voluntário cadastrado.",
+                                size=16, color="grey")
                     ], horizontal_alignment="center", spacing=10),
                     padding=40
                 )
             )
-        
-        for i in items:
-            c_id, c_name, c_phone, _, _, c_role, c_dept = i[0], i[1], i[2], i[3], i[4], i[5], i[6]
-            
-            trailing = None
-            if not readonly:
-                trailing = ft.IconButton(ft.Icons.DELETE, icon_color="red", 
-                                        tooltip="Desativar voluntário",
-                                        on_click=lambda e, x=c_id, n=c_name: delete_collab(x, n))
-            
-            list_controls.append(
-                ft.Card(ft.ListTile(
-                    leading=ft.Icon(ft.Icons.BADGE, color=THEME_COLOR),
-                    title=ft.Text(c_name, weight="bold"),
-                    subtitle=ft.Text(f"{c_role} - {c_dept}\n{c_phone}"),
-                    trailing=trailing
-                ))
-            )
-        
+        controls.extend(build_card(i) for i in items)
+        if paging["cursor"]:
+            controls.append(more_button)
+        request_update(page)
+
+    @batched
+    def show_list(e=None):
+        mode["list"] = True
         header_controls = [ft.Text("Equipe e Voluntários", size=20, weight="bold")]
+        schedule_button = ft.IconButton(ft.Icons.CALENDAR_MONTH, on_click=show_schedule, tooltip="Escalas dos ministérios")
         if not readonly:
-            header_controls.append(ft.IconButton(ft.Icons.ADD, on_click=show_form, bgcolor=THEME_COLOR, icon_color="white", tooltip="Adicionar voluntário"))
+            header_controls.append(ft.Row([
+                schedule_button,
+                selection["toggle"],
+                exporter,
+                ft.IconButton(ft.Icons.ADD, on_click=show_form, bgcolor=THEME_COLOR, icon_color="white", tooltip="Adicionar voluntário")
+            ], spacing=5))
+        else:
+            header_controls.append(schedule_button)
 
         content = ft.Column([
             ft.Row(header_controls, alignment="spaceBetween"),
+            ft.Row([
+                dept_filter,
+                ft.IconButton(icon=ft.Icons.FILTER_ALT, tooltip="Filtrar por departamento",
+                              on_click=lambda e: load_page(reset=True))
+            ]),
+            selection["bar"],
             ft.Divider(),
-            ft.Column(list_controls, scroll="auto", expand=True)
+            list_column
         ], expand=True)
         
         current_view.current.controls = [content]
-        page.update()
+        load_page(reset=True)
 
+    @batched
+    def show_schedule(e=None):
+        mode["list"] = False
+        scheduled = [(v.id, v.name) for v in db.get_all_volunteers() if v.department in ROTA_DEPARTMENTS]
+        current_view.current.controls = [schedule_view(page, db, scheduled, show_success, show_error, show_warning,
+                                                       show_loading, hide_loading, on_back=show_list, readonly=readonly)]
+        request_update(page)
+
+    @batched
     def delete_collab(id, name):
         if readonly: return
         loading = show_loading(page, "Desativando voluntário...")
-        time.sleep(0.3)
         if db.deactivate_collaborator(id):
             hide_loading(page, loading)
             show_success(page, f"Voluntário '{name}' desativado com sucesso!")
-            show_list()
+            remove_cards([id])
         else:
             hide_loading(page, loading)
             show_error(page, "Erro ao desativar voluntário.")
 
+    @batched
     def save(e):
         if readonly: return
         
@@ -1046,9 +2387,7 @@ def volunteers_view(page: ft.Page, db: Database, readonly: bool = False):
         
         loading = show_loading(page, "Salvando voluntário...")
         
-        time.sleep(0.3)
-        
-        if db.add_collaborator(name.value, phone.value, email.value, addr_component["get_full_address"](), 
+        if db.add_collaborator(name.value, phone.value, email.value, addr_component["get_address"](), 
                             role.value, dept.value, hire_date.value, obs.value):
             hide_loading(page, loading)
             show_success(page, f"Voluntário '{name.value}' cadastrado com sucesso!")
@@ -1056,9 +2395,11 @@ def volunteers_view(page: ft.Page, db: Database, readonly: bool = False):
         else:
             hide_loading(page, loading)
             show_error(page, "Erro ao salvar voluntário.")
-            page.update()
+            request_update(page)
 
+    @batched
     def show_form(e=None):
+        mode["list"] = False
         content = ft.Column([
             ft.Row([ft.IconButton(ft.Icons.ARROW_BACK, on_click=show_list, tooltip="Voltar"), 
                    ft.Text("Novo Voluntário", size=20, weight="bold")]),
@@ -1071,112 +2412,232 @@ def volunteers_view(page: ft.Page, db: Database, readonly: bool = False):
             ft.Button("Salvar", on_click=save, style=ft.ButtonStyle(bgcolor=THEME_COLOR, color="white"))
         ], scroll="auto", expand=True)
         current_view.current.controls = [content]
-        page.update()
+        request_update(page)
 
-    col = ft.Column(expand=True, ref=current_view)
+    col = ft.Column(expand=True, ref=current_view,
+                    data={"on_show": lambda: mode["list"] and show_list(), "tables": ("volunteers",), "scrollable": list_column})
     show_list()
     return col
 
-def cells_view(page: ft.Page, db: Database, readonly: bool = False):
+def cells_view(page: ft.Page, db: Database, readonly: bool = False, username=None):
     current_view = ft.Ref[ft.Column]()
     
     name = ft.TextField(label="Nome da Célula *")
     leader = ft.TextField(label="Líder *", prefix_icon=ft.Icons.PERSON)
     host = ft.TextField(label="Anfitrião", prefix_icon=ft.Icons.HOME)
-    day = ft.Dropdown(label="Dia", options=[
-        ft.dropdown.Option("Segunda"), ft.dropdown.Option("Terça"), ft.dropdown.Option("Quarta"),
-        ft.dropdown.Option("Quinta"), ft.dropdown.Option("Sexta"), ft.dropdown.Option("Sábado"), ft.dropdown.Option("Domingo")
-    ], width=150)
+    day = ft.Dropdown(label="Dia", options=[ft.dropdown.Option(d) for d in MEETING_DAYS], width=150)
     time_field = ft.TextField(label="Horário", value="20:00", width=100)
     addr_component = address_form_fields(page)
     obs = ft.TextField(label="Observações")
-
-    def show_list(e=None):
-        items = db.get_all_cells()
-        list_controls = []
+    list_column = ft.ListView([], expand=True, spacing=5)
+    day_filter = ft.Dropdown(label="Dia da reunião", width=200, dense=True, value=ALL_OPTION,
+                             options=[ft.dropdown.Option(ALL_OPTION)] + [ft.dropdown.Option(d) for d in MEETING_DAYS])
+    exporter = export_control(page, db, "cells", show_success, show_error)
+    mode = {"list": True}
+    paging = {"cursor": None}
+    # Registros dos cards carregados (id -> CellListItem), para editar a lista no lugar
+    records = {}
+    more_button = ft.TextButton("Carregar mais", icon=ft.Icons.EXPAND_MORE, on_click=lambda e: load_page())
+
+    def current_day():
+        return day_filter.value if day_filter.value != ALL_OPTION else None
+
+    def build_card(c):
+        c_id = c.id
+        c_name = c.name
+        c_leader = c.leader_name
+        c_host = c.host_name
+        c_address = c.address if c.address else "Endereço não informado"
+        c_day = c.meeting_day
+        c_time = c.meeting_time
         
-        if not items:
-            list_controls.append(
+        leading = ft.Icon(ft.Icons.GROUPS, color=THEME_COLOR, size=30)
+        trailing = None
+        if not readonly:
+            leading = ft.Row([selection["checkbox"](c_id), leading], spacing=0, tight=True)
+            trailing = ft.PopupMenuButton(
+                items=[
+                    ft.PopupMenuItem(
+                        content=ft.Row([ft.Icon(ft.Icons.FACT_CHECK, color=THEME_COLOR), ft.Text("Registrar presença")]),
+                        on_click=lambda e, x=c_id: show_checkin(cell_id=x)
+                    ),
+                    ft.PopupMenuItem(
+                        content=ft.Row([ft.Icon(ft.Icons.DELETE, color="red"), ft.Text("Desativar")]), 
+                        on_click=lambda e, x=c_id, n=c_name: deactivate(x, n)
+                    )
+                ]
+            )
+        
+        card_content = ft.Container(
+            content=ft.Column([
+                ft.ListTile(
+                    leading=leading,
+                    title=ft.Text(c_name, weight="bold"),
+                    subtitle=ft.Text(f"Líder: {c_leader}\n{c_day} às {c_time}"),
+                    trailing=trailing
+                ),
+                ft.Container(
+                    content=ft.Column([
+                        ft.Row([
+                            ft.Icon(ft.Icons.HOME_FILLED, size=16, color="grey"),
+                            ft.Text(f"Anfitrião: {c_host}" if c_host else "Anfitrião não informado", size=12, color="grey")
+                        ]),
+                        ft.Row([
+                            ft.Icon(ft.Icons.LOCATION_ON, size=16, color="red"),
+                            ft.Text(c_address, size=12, color="grey", expand=True)
+                        ], alignment=ft.MainAxisAlignment.START, vertical_alignment=ft.CrossAxisAlignment.START)
+                    ], spacing=5), 
+                    padding=ft.padding.only(left=20, bottom=10, right=10, top=0)
+                )
+            ]),
+            padding=ft.padding.only(top=5, bottom=5)
+        )
+        return ft.Card(content=card_content, data=c_id)
+
+    def remove_cards(ids):
+        """Tira da lista os cards desativados, sem recarregar"""
+        ids = set(ids)
+        list_column.controls = [c for c in list_column.controls if c.data not in ids]
+        for item_id in ids:
+            records.pop(item_id, None)
+        selection["forget"](ids)
+        if not records:
+            load_page(reset=True)
+        request_update(page)
+
+    def patch_cards(ids, data):
+        """Reconstrói só os cards editados; os que saem do filtro atual são removidos"""
+        meeting_day = current_day()
+        gone = []
+        controls = list_column.controls
+        for index, control in enumerate(controls):
+            if control.data in ids and control.data in records:
+                item = records[control.data] = records[control.data]._replace(**data)
+                if meeting_day and item.meeting_day != meeting_day:
+                    gone.append(item.id)
+                else:
+                    controls[index] = build_card(item)
+        if gone:
+            remove_cards(gone)
+        request_update(page)
+
+    @batched
+    def bulk_deactivate(ids):
+        loading = show_loading(page, f"Desativando {len(ids)} célula(s)...")
+        applied = db.deactivate_cells(ids)
+        hide_loading(page, loading)
+        if applied:
+            remove_cards(applied)
+        report_bulk(page, ids, applied, "célula(s) desativada(s)", "Erro ao desativar células.")
+        return applied
+
+    @batched
+    def bulk_edit(ids, data):
+        loading = show_loading(page, f"Atualizando {len(ids)} célula(s)...")
+        applied = db.update_cells(ids, data)
+        hide_loading(page, loading)
+        if applied:
+            patch_cards(set(applied), data)
+        report_bulk(page, ids, applied, "célula(s) atualizada(s)", "Erro ao atualizar células.")
+        return applied
+
+    selection = bulk_selection(page, "célula", {
+        "leader_name": ft.TextField(label="Líder"),
+        "meeting_day": ft.Dropdown(label="Dia", options=[ft.dropdown.Option(d) for d in MEETING_DAYS]),
+        "meeting_time": ft.TextField(label="Horário"),
+    }, bulk_deactivate, bulk_edit)
+
+    @batched
+    def load_page(reset=False):
+        """Busca a próxima página (ou a primeira, com reset) e acrescenta os cards no fim da lista"""
+        controls = list_column.controls
+        if reset:
+            controls.clear()
+            records.clear()
+            selection["reset"]()
+            paging["cursor"] = None
+        elif controls and controls[-1] is more_button:
+            controls.pop()
+        meeting_day = current_day()
+        items, paging["cursor"] = db.get_cells_page(paging["cursor"], meeting_day)
+        records.update((c.id, c) for c in items)
+        
+        if reset and not items:
+            controls.append(
                 ft.Container(
                     content=ft.Column([
                         ft.Icon(ft.Icons.GROUP_OFF, size=64, color="grey"),
-                        ft.Text("Nenhuma célula cadastrada.", size=16, color="grey")
+                        ft.Text("Nenhuma célula encontrada." if meeting_day else "Nenhuma célula cadastrada.",
+                                size=16, color="grey")
                     ], horizontal_alignment="center", spacing=10),
                     padding=40
                 )
             )
-            
-        for c in items:
-            c_id = c[0]
-            c_name = c[1]
-            c_leader = c[2]
-            c_host = c[3]
-            c_address = c[4] if c[4] else "Endereço não informado"
-            c_day = c[5]
-            c_time = c[6]
-            
-            trailing = None
-            if not readonly:
-                trailing = ft.PopupMenuButton(
-                    items=[
-                        ft.PopupMenuItem(
-                            content=ft.Row([ft.Icon(ft.Icons.DELETE, color="red"), ft.Text("Desativar")]), 
-                            on_click=lambda e, x=c_id, n=c_name: deactivate(x, n)
-                        )
-                    ]
-                )
-            
-            card_content = ft.Container(
-                content=ft.Column([
-                    ft.ListTile(
-                        leading=ft.Icon(ft.Icons.GROUPS, color=THEME_COLOR, size=30),
-                        title=ft.Text(c_name, weight="bold"),
-                        subtitle=ft.Text(f"Líder: {c_leader}\n{c_day} às {c_time}"),
-                        trailing=trailing
-                    ),
-                    ft.Container(
-                        content=ft.Column([
-                            ft.Row([
-                                ft.Icon(ft.Icons.HOME_FILLED, size=16, color="grey"),
-                                ft.Text(f"Anfitrião: {c_host}" if c_host else "Anfitrião não informado", size=12, color="grey")
-                            ]),
-                            ft.Row([
-                                ft.Icon(ft.Icons.LOCATION_ON, size=16, color="red"),
-                                ft.Text(c_address, size=12, color="grey", expand=True)
-                            ], alignment=ft.MainAxisAlignment.START, vertical_alignment=ft.CrossAxisAlignment.START)
-                        ], spacing=5), 
-                        padding=ft.padding.only(left=20, bottom=10, right=10, top=0)
-                    )
-                ]),
-                padding=ft.padding.only(top=5, bottom=5)
-            )
-
-            list_controls.append(ft.Card(content=card_content))
+        controls.extend(build_card(c) for c in items)
+        if paging["cursor"]:
+            controls.append(more_button)
+        request_update(page)
 
+    @batched
+    def show_list(e=None):
+        mode["list"] = True
         header_controls = [ft.Text("Casa de Cornélio", size=20, weight="bold")]
-        if not readonly:
-            header_controls.append(ft.IconButton(ft.Icons.ADD, on_click=show_form, bgcolor=THEME_COLOR, icon_color="white", tooltip="Adicionar célula"))
+        summary_button = ft.IconButton(ft.Icons.BAR_CHART, on_click=show_summary, tooltip="Resumo de presença")
+        if readonly:
+            header_controls.append(summary_button)
+        else:
+            header_controls.append(ft.Row([
+                summary_button,
+                ft.IconButton(ft.Icons.FACT_CHECK, on_click=lambda e: show_checkin(), tooltip="Registrar presença"),
+                selection["toggle"],
+                exporter,
+                ft.IconButton(ft.Icons.ADD, on_click=show_form, bgcolor=THEME_COLOR, icon_color="white", tooltip="Adicionar célula")
+            ], spacing=5))
 
         content = ft.Column([
             ft.Row(header_controls, alignment="spaceBetween"),
+            ft.Row([
+                day_filter,
+                ft.IconButton(icon=ft.Icons.FILTER_ALT, tooltip="Filtrar por dia da reunião",
+                              on_click=lambda e: load_page(reset=True))
+            ]),
+            selection["bar"],
             ft.Divider(),
-            ft.Column(list_controls, scroll="auto", expand=True)
+            list_column
         ], expand=True)
         current_view.current.controls = [content]
-        page.update()
+        load_page(reset=True)
 
+    def active_cells():
+        return [(c.id, c.name) for c in db.get_all_cells()]
+
+    @batched
+    def show_checkin(cell_id=None):
+        if readonly: return
+        mode["list"] = False
+        current_view.current.controls = [checkin_view(page, db, active_cells(), show_success, show_error, show_warning,
+                                                      on_back=show_list, cell_id=cell_id, username=username)]
+        request_update(page)
+
+    @batched
+    def show_summary(e=None):
+        mode["list"] = False
+        current_view.current.controls = [attendance_summary_view(page, db, active_cells(), on_back=show_list)]
+        request_update(page)
+
+    @batched
     def deactivate(id, name):
         if readonly: return
         loading = show_loading(page, "Desativando célula...")
-        time.sleep(0.3)
         if db.deactivate_cell(id):
             hide_loading(page, loading)
             show_success(page, f"Célula '{name}' desativada com sucesso!")
-            show_list()
+            remove_cards([id])
         else:
             hide_loading(page, loading)
             show_error(page, "Erro ao desativar célula.")
 
+    @batched
     def save(e):
         if readonly: return
         
@@ -1186,9 +2647,7 @@ def cells_view(page: ft.Page, db: Database, readonly: bool = False):
         
         loading = show_loading(page, "Salvando célula...")
         
-        time.sleep(0.3)
-        
-        if db.add_cell(name.value, leader.value, host.value, addr_component["get_full_address"](), 
+        if db.add_cell(name.value, leader.value, host.value, addr_component["get_address"](), 
                     day.value, time_field.value, obs.value):
             hide_loading(page, loading)
             show_success(page, f"Célula '{name.value}' cadastrada com sucesso!")
@@ -1196,9 +2655,11 @@ def cells_view(page: ft.Page, db: Database, readonly: bool = False):
         else:
             hide_loading(page, loading)
             show_error(page, "Erro ao salvar célula.")
-            page.update()
+            request_update(page)
 
+    @batched
     def show_form(e=None):
+        mode["list"] = False
         content = ft.Column([
             ft.Row([ft.IconButton(ft.Icons.ARROW_BACK, on_click=show_list, tooltip="Voltar"), 
                    ft.Text("Nova Célula", size=20, weight="bold")]),
@@ -1212,9 +2673,10 @@ def cells_view(page: ft.Page, db: Database, readonly: bool = False):
             ft.Button("Salvar Célula", on_click=save, style=ft.ButtonStyle(bgcolor=THEME_COLOR, color="white"))
         ], scroll="auto", expand=True)
         current_view.current.controls = [content]
-        page.update()
+        request_update(page)
 
-    col = ft.Column(expand=True, ref=current_view)
+    col = ft.Column(expand=True, ref=current_view,
+                    data={"on_show": lambda: mode["list"] and show_list(), "tables": ("cells",), "scrollable": list_column})
     show_list()
     return col
 
@@ -1230,8 +2692,12 @@ def users_view(page: ft.Page, db: Database, readonly: bool = False):
     p_visit = ft.Checkbox(label="Visitantes", value=True)
     p_cell = ft.Checkbox(label="Casa de Cornélio")
     p_collab = ft.Checkbox(label="Voluntários")
+    mode = {"list": True}
+    editing = {"id": None, "username": None, "perms": {}}
 
+    @batched
     def show_list(e=None):
+        mode["list"] = True
         users = db.get_all_users()
         controls = []
         for u in users:
@@ -1241,9 +2707,13 @@ def users_view(page: ft.Page, db: Database, readonly: bool = False):
                     leading=ft.Icon(ft.Icons.ADMIN_PANEL_SETTINGS if is_admin else ft.Icons.PERSON),
                     title=ft.Text(uname),
                     subtitle=ft.Text("Administrador" if is_admin else "Usuário"),
-                    trailing=ft.IconButton(ft.Icons.DELETE, disabled=(uid==1), 
-                                         tooltip="Excluir usuário" if uid != 1 else "Não é possível excluir admin",
-                                         on_click=lambda e, x=uid, n=uname: delete(x, n))
+                    trailing=ft.Row([
+                        ft.IconButton(ft.Icons.EDIT, tooltip="Editar permissões",
+                                      on_click=lambda e, x=u: show_form(user=x)),
+                        ft.IconButton(ft.Icons.DELETE, disabled=(uid==1), 
+                                      tooltip="Excluir usuário" if uid != 1 else "Não é possível excluir admin",
+                                      on_click=lambda e, x=uid, n=uname: delete(x, n))
+                    ], tight=True, spacing=0)
                 )
             )
         
@@ -1255,11 +2725,11 @@ def users_view(page: ft.Page, db: Database, readonly: bool = False):
             ft.Column(controls, scroll="auto", expand=True)
         ], expand=True)
         current_view.current.controls = [content]
-        page.update()
+        request_update(page)
 
+    @batched
     def delete(id, username):
         loading = show_loading(page, "Excluindo usuário...")
-        time.sleep(0.3)
         if db.delete_user(id):
             hide_loading(page, loading)
             show_success(page, f"Usuário '{username}' excluído com sucesso!")
@@ -1268,17 +2738,29 @@ def users_view(page: ft.Page, db: Database, readonly: bool = False):
             hide_loading(page, loading)
             show_error(page, "Não é possível excluir este usuário.")
 
+    @batched
     def save(e):
+        perms = {"visitantes": p_visit.value, "celulas": p_cell.value, "voluntários": p_collab.value}
+        if editing["id"] is not None:
+            loading = show_loading(page, "Salvando usuário...")
+            # Mantém as demais chaves (ex.: readonly dos membros)
+            perms = {**editing["perms"], **perms}
+            if db.update_user(editing["id"], u_admin.value, perms, password=u_pass.value or None):
+                hide_loading(page, loading)
+                show_success(page, f"Usuário '{editing['username']}' atualizado com sucesso!")
+                u_pass.value = ""
+                show_list()
+            else:
+                hide_loading(page, loading)
+                show_error(page, "Erro ao atualizar usuário.")
+            return
+
         if not u_name.value or not u_pass.value:
             show_warning(page, "Preencha usuário e senha!")
             return
         
         loading = show_loading(page, "Criando usuário...")
         
-        time.sleep(0.3)
-        
-        perms = {"visitantes": p_visit.value, "celulas": p_cell.value, "voluntários": p_collab.value}
-        
         if db.add_user(u_name.value, u_pass.value, u_admin.value, perms):
             hide_loading(page, loading)
             show_success(page, f"Usuário '{u_name.value}' criado com sucesso!")
@@ -1287,21 +2769,38 @@ def users_view(page: ft.Page, db: Database, readonly: bool = False):
         else:
             hide_loading(page, loading)
             show_error(page, "Erro ao criar usuário. Nome pode já existir.")
-            page.update()
-
-    def show_form(e=None):
+            request_update(page)
+
+    @batched
+    def show_form(e=None, user=None):
+        mode["list"] = False
+        if user:
+            uid, uname, is_admin, perms_json = user
+            perms = json.loads(perms_json or "{}")
+            editing.update(id=uid, username=uname, perms=perms)
+            u_name.value, u_pass.value, u_admin.value = uname, "", bool(is_admin)
+            p_visit.value = bool(perms.get("visitantes"))
+            p_cell.value = bool(perms.get("celulas"))
+            p_collab.value = bool(perms.get("voluntários"))
+        elif editing["id"] is not None:
+            editing.update(id=None, username=None, perms={})
+            u_name.value = u_pass.value = ""
+            u_admin.value, p_visit.value, p_cell.value, p_collab.value = False, True, False, False
+        u_name.disabled = user is not None
+        u_pass.label = "Nova senha (opcional)" if user else "Senha"
         content = ft.Column([
             ft.Row([ft.IconButton(ft.Icons.ARROW_BACK, on_click=show_list, tooltip="Voltar"), 
-                   ft.Text("Novo Usuário")]),
+                   ft.Text("Editar Usuário" if user else "Novo Usuário")]),
             u_name, u_pass, u_admin,
             ft.Text("Permissões (Se não for Admin):"),
             p_visit, p_cell, p_collab,
-            ft.Button("Criar Usuário", on_click=save, bgcolor=THEME_COLOR, color="white")
+            ft.Button("Salvar" if user else "Criar Usuário", on_click=save, bgcolor=THEME_COLOR, color="white")
         ])
         current_view.current.controls = [content]
-        page.update()
+        request_update(page)
 
-    col = ft.Column(expand=True, ref=current_view)
+    col = ft.Column(expand=True, ref=current_view,
+                    data={"on_show": lambda: mode["list"] and show_list(), "tables": ("users",)})
     show_list()
     return col
 
@@ -1309,36 +2808,79 @@ def users_view(page: ft.Page, db: Database, readonly: bool = False):
 # MAIN APP LOGIC
 # ==============================================================================
 
-def main(page: ft.Page):
+def main(page: ft.Page, db: Optional[Database] = None):
     page.title = APP_TITLE
     page.theme = ft.Theme(color_scheme_seed=THEME_COLOR)
     page.window.width = 1000
     page.window.height = 800
     
-    db = Database()
+    # db pode ser injetado (ex.: loadtest.py com fake_supabase)
+    db = db or Database()
     
-    current_user = {"username": None, "permissions": {}, "readonly": False}
+    current_user = {"id": None, "username": None, "permissions": Permissions(0), "readonly": False, "epoch": 0}
     
+    @batched
     def logout(e=None):
         show_info(page, "Até logo! Sessão encerrada.")
-        time.sleep(0.5)
-        current_user["username"] = None
+        current_user["id"] = current_user["username"] = None
+        current_user["permissions"] = Permissions(0)
         current_user["readonly"] = False
         page.clean()
         page.add(login_view(page, db, login_success))
-        page.update()
+        request_update(page)
+
+    def set_session_user(user):
+        current_user["id"] = user.id
+        current_user["username"] = user.username
+        current_user["permissions"] = user.permissions
+        current_user["readonly"] = user.permissions.get("readonly")
+        current_user["epoch"] = db.permission_epoch(user.id)
 
-    def login_success(username):
-        current_user["username"] = username
-        perms = db.get_user_permissions(username)
-        current_user["permissions"] = perms
-        current_user["readonly"] = perms.get("readonly", False)
+    def prefetch_tabs():
+        """Carrega em segundo plano os dados de todas as abas permitidas"""
+        perms = current_user["permissions"]
+        loaders = []
+        if perms.get("visitantes"):
+            # Checagem de duplicados do cadastro: o índice fica pronto sem atrasar o primeiro salvamento
+            loaders.append(db.warm_visitor_index)
+        if perms.get("lista_visitantes"):
+            loaders.append(db.get_visitors_page)
+        if perms.get("celulas"):
+            loaders.append(db.get_cells_page)
+        if perms.get("voluntários"):
+            loaders.append(db.get_volunteers_page)
+        if perms.get("galeria", True):
+            # Álbuns já trazem contagem e capa: a primeira abertura da galeria não consulta photos
+            loaders.append(db.get_all_albums)
+        if perms.get("usuarios"):
+            loaders.append(db.get_all_users)
+        db.prefetch(loaders)
+
+    @batched
+    def login_success(user):
+        # Permissões já vieram compiladas na mesma consulta do login
+        set_session_user(user)
+        prefetch_tabs()
+        show_dashboard()
+
+    @batched
+    def reload_permissions():
+        """Um admin alterou este usuário: recompila as permissões e remonta o dashboard"""
+        user = db.get_session_user(current_user["username"])
+        if not user or user.id != current_user["id"]:
+            logout()
+            return
+        set_session_user(user)
+        prefetch_tabs()
+        show_warning(page, "Suas permissões foram atualizadas.")
         show_dashboard()
 
     def show_dashboard():
         page.clean()
         
         content_area = ft.Container(expand=True, padding=20)
+        # Views construídas ficam em cache durante a sessão do dashboard
+        views = ViewManager(page, content_area, db)
         
         edit_mode = {"active": False, "visitor_id": None}
         
@@ -1367,7 +2909,7 @@ def main(page: ft.Page):
 
         if perms.get("celulas"):
             rail.destinations.append(ft.NavigationRailDestination(icon=ft.Icons.GROUPS, label="Casa de Cornélio"))
-            pages_map.append(cells_view)
+            pages_map.append(lambda page, db, readonly: cells_view(page, db, readonly, current_user["username"]))
             
         if perms.get("voluntários"):
             rail.destinations.append(ft.NavigationRailDestination(icon=ft.Icons.BADGE, label="Equipe"))
@@ -1384,47 +2926,49 @@ def main(page: ft.Page):
         if perms.get("usuarios"):
             rail.destinations.append(ft.NavigationRailDestination(icon=ft.Icons.SECURITY, label="Usuários"))
             pages_map.append(users_view)
+            rail.destinations.append(ft.NavigationRailDestination(icon=ft.Icons.INSIGHTS, label="Métricas"))
+            pages_map.append(lambda page, db, readonly: metrics_view(page, db, show_success, show_error, readonly))
             
         rail.destinations.append(ft.NavigationRailDestination(icon=ft.Icons.LOGOUT, label="Sair"))
         
+        @batched
         def open_visitor_edit(visitor_id):
             edit_mode["active"] = True
             edit_mode["visitor_id"] = visitor_id
             
-            def back_to_list():
+            def back_to_list(row=None):
                 edit_mode["active"] = False
                 edit_mode["visitor_id"] = None
+                if row:
+                    # Linha salva já veio na resposta: só o card dela muda
+                    views.patch(1, row)
                 rail.selected_index = 1
                 change_page(1)
             
             content_area.content = visitor_edit_view(page, db, visitor_id, back_to_list)
             rail.selected_index = None
-            page.update()
+            request_update(page)
+        
+        def build_view(index):
+            view_func = pages_map[index]
+            
+            if view_func == visitors_list_view:
+                return view_func(page, db, readonly=is_readonly, on_edit_visitor=open_visitor_edit)
+            return view_func(page, db, readonly=is_readonly)
         
+        @batched
         def change_page(index):
             if index == len(rail.destinations) - 1:
                 logout()
                 return
+            if db.permission_epoch(current_user["id"]) != current_user["epoch"]:
+                reload_permissions()
+                return
             
             edit_mode["active"] = False
             edit_mode["visitor_id"] = None
             
-            view_func = pages_map[index]
-            
-            if view_func == visitors_list_view:
-                content_area.content = view_func(page, db, readonly=is_readonly, on_edit_visitor=open_visitor_edit)
-            else:
-                content_area.content = view_func(page, db, readonly=is_readonly)
-            
-            page.update()
-
-        if pages_map:
-            if pages_map[0] == visitors_list_view:
-                content_area.content = pages_map[0](page, db, readonly=is_readonly, on_edit_visitor=open_visitor_edit)
-            else:
-                content_area.content = pages_map[0](page, db, readonly=is_readonly)
-        else:
-            content_area.content = ft.Text("Sem permissões de acesso.")
+            views.show(index, lambda: build_view(index))
 
         page.add(
             ft.Row(
@@ -1436,7 +2980,12 @@ def main(page: ft.Page):
                 expand=True,
             )
         )
-        page.update()
+
+        if pages_map:
+            views.show(0, lambda: build_view(0))
+        else:
+            content_area.content = ft.Text("Sem permissões de acesso.")
+            request_update(page)
 
     page.add(login_view(page, db, login_success))
 
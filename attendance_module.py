@@ -0,0 +1,363 @@
+"""
+Módulo de Presença nas Células
+Check-in semanal pelos líderes: as presenças ficam num buffer na sessão e
+são enviadas em lotes (upsert idempotente); os totais por célula e semana
+são mantidos a cada envio, então os painéis não leem a tabela bruta
+"""
+import flet as ft
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from visitor_import_module import normalize_name
+
+# Presenças por upsert
+ATTENDANCE_CHUNK = 500
+# O buffer é enviado após este tempo sem novas marcações, ou ao atingir FLUSH_SIZE
+FLUSH_DELAY = 5.0
+FLUSH_SIZE = 20
+SUMMARY_WEEKS = 8
+
+AttendanceWeek = namedtuple("AttendanceWeek", "cell_id week_start meetings present visitors")
+WEEK_COLUMNS = "cell_id, week_start, meetings, present, visitors"
+
+def week_start(meeting_date):
+    """Segunda-feira da semana da reunião ('aaaa-mm-dd')"""
+    d = date.fromisoformat(str(meeting_date)[:10])
+    return (d - timedelta(days=d.weekday())).isoformat()
+
+def attendance_key(cell_id, meeting_date, person_name):
+    """Chave de idempotência: a mesma pessoa só conta uma vez por reunião"""
+    return f"{cell_id}:{meeting_date}:{' '.join(person_name.lower().split())}"
+
+def parse_meeting_date(text):
+    """'dd/mm/aaaa' -> 'aaaa-mm-dd' (None se inválida)"""
+    try:
+        return datetime.strptime(text.strip(), "%d/%m/%Y").date().isoformat()
+    except (ValueError, AttributeError):
+        return None
+
+# ==============================================================================
+# BUFFER DE CHECK-IN
+# ==============================================================================
+
+class CheckinBuffer:
+    """
+    Presenças marcadas e ainda não enviadas (uma instância por tela de check-in).
+    Um envio que falha mantém as linhas para a próxima tentativa; como o upsert
+    ignora chaves já gravadas, reenviar é seguro.
+    """
+
+    def __init__(self, db, on_flushed):
+        self.db = db
+        self.on_flushed = on_flushed
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pending = {}
+        self.timer = None
+
+    def add(self, row):
+        """Enfileira; False se a pessoa já está no buffer"""
+        with self.lock:
+            if row["idempotency_key"] in self.pending:
+                return False
+            self.pending[row["idempotency_key"]] = row
+            full = len(self.pending) >= FLUSH_SIZE
+        if full:
+            self.flush()
+        else:
+            self.schedule()
+        return True
+
+    def discard(self, key):
+        with self.lock:
+            return self.pending.pop(key, None) is not None
+
+    def schedule(self):
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+            self.timer = threading.Timer(FLUSH_DELAY, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        """Envia o que estiver pendente; retorna quantas linhas foram enviadas (None se falhou)"""
+        with self.flush_lock:
+            with self.lock:
+                if self.timer:
+                    self.timer.cancel()
+                    self.timer = None
+                rows = list(self.pending.values())
+            if not rows:
+                return 0
+            inserted = self.db.record_attendance(rows)
+            if inserted is not None:
+                with self.lock:
+                    for row in rows:
+                        self.pending.pop(row["idempotency_key"], None)
+            self.on_flushed(rows, inserted)
+            return None if inserted is None else len(rows)
+
+# ==============================================================================
+# FUNÇÕES DE PRESENÇA NO DATABASE
+# ==============================================================================
+
+def add_attendance_methods_to_database(db_class):
+    """Adiciona métodos de presença nas células à classe Database"""
+
+    def record_attendance(self, rows):
+        """
+        Grava um lote de presenças (chaves repetidas são ignoradas) e recalcula
+        os totais das semanas tocadas. Retorna quantas linhas eram novas, ou None.
+        """
+        try:
+            inserted = 0
+            for start in range(0, len(rows), ATTENDANCE_CHUNK):
+                response = self.supabase.table('cell_attendance').upsert(
+                    rows[start:start + ATTENDANCE_CHUNK], on_conflict='idempotency_key', ignore_duplicates=True
+                ).execute()
+                inserted += len(response.data or [])
+            if inserted:
+                self._touch('cell_attendance')
+            # Mesmo sem linhas novas: um envio anterior pode ter caído antes dos totais
+            self._refresh_attendance_weeks({(r['cell_id'], week_start(r['meeting_date'])) for r in rows})
+            return inserted
+        except Exception as e:
+            self._log_error("Erro ao registrar presença", e)
+            return None
+
+    def remove_attendance(self, cell_id, meeting_date, person_name):
+        """Desfaz uma presença já enviada"""
+        try:
+            key = attendance_key(cell_id, meeting_date, person_name)
+            self.supabase.table('cell_attendance').delete().eq('idempotency_key', key).execute()
+            self._touch('cell_attendance')
+            self._refresh_attendance_weeks({(cell_id, week_start(meeting_date))})
+            return True
+        except Exception as e:
+            self._log_error("Erro ao remover presença", e)
+            return False
+
+    def _refresh_attendance_weeks(self, keys):
+        """
+        Recalcula os totais de cada (célula, semana) a partir só das presenças
+        daquela célula naquela semana (índice cell_id, meeting_date)
+        """
+        totals = []
+        for cell_id, week in keys:
+            end = (date.fromisoformat(week) + timedelta(days=6)).isoformat()
+            rows = (self.supabase.table('cell_attendance').select('meeting_date, is_visitor')
+                    .eq('cell_id', cell_id).gte('meeting_date', week).lte('meeting_date', end)
+                    .execute().data or [])
+            totals.append({
+                'cell_id': cell_id, 'week_start': week,
+                'meetings': len({r['meeting_date'] for r in rows}),
+                'present': len(rows),
+                'visitors': sum(1 for r in rows if r.get('is_visitor')),
+            })
+        if totals:
+            self.supabase.table('cell_attendance_weekly').upsert(totals, on_conflict='cell_id,week_start').execute()
+            self._touch('cell_attendance_weekly')
+
+    def get_last_attendance(self, cell_id):
+        """Presentes na última reunião registrada da célula: [(nome, visitante)]"""
+        try:
+            rows = self._select('cell_attendance', 'meeting_date, person_name, is_visitor',
+                                filters=(('eq', 'cell_id', cell_id),), order=(('meeting_date', True),), limit=200)
+            if not rows:
+                return []
+            last = rows[0]['meeting_date']
+            return sorted((r['person_name'], bool(r.get('is_visitor'))) for r in rows if r['meeting_date'] == last)
+        except Exception as e:
+            self._log_error("Erro ao buscar última presença", e)
+            return []
+
+    def get_attendance_weeks(self, weeks=SUMMARY_WEEKS):
+        """Totais semanais de todas as células nas últimas semanas (tabela agregada), mais recentes primeiro"""
+        try:
+            since = week_start((date.today() - timedelta(weeks=weeks - 1)).isoformat())
+            # Centenas de células x semanas passam do limite de linhas de um SELECT: lê por páginas
+            totals = [AttendanceWeek(r['cell_id'], str(r['week_start'])[:10], r['meetings'], r['present'], r['visitors'])
+                      for rows in self.iter_pages('cell_attendance_weekly', 'id, ' + WEEK_COLUMNS,
+                                                  filters=(('gte', 'week_start', since),))
+                      for r in rows]
+            return sorted(totals, key=lambda w: w.week_start, reverse=True)
+        except Exception as e:
+            self._log_error("Erro ao buscar resumo de presença", e)
+            return []
+
+    db_class.record_attendance = record_attendance
+    db_class.remove_attendance = remove_attendance
+    db_class._refresh_attendance_weeks = _refresh_attendance_weeks
+    db_class.get_last_attendance = get_last_attendance
+    db_class.get_attendance_weeks = get_attendance_weeks
+
+# ==============================================================================
+# INTERFACE
+# ==============================================================================
+
+def checkin_view(page, db, cells, show_success, show_error, show_warning, on_back, cell_id=None, username=None):
+    """
+    Check-in de uma reunião: cada toque entra no buffer, que é enviado em lote.
+    cells: [(id, nome)] das células ativas
+    """
+    names = dict(cells)
+    cell = ft.Dropdown(label="Célula", expand=True, value=str(cell_id) if cell_id else None,
+                       options=[ft.dropdown.Option(key=str(i), text=n) for i, n in cells])
+    meeting = ft.TextField(label="Data", value=date.today().strftime("%d/%m/%Y"), width=140)
+    person = ft.TextField(label="Nome", expand=True, on_submit=lambda e: add_typed())
+    visitor = ft.Checkbox(label="Visitante")
+    status = ft.Text("", size=12, color="grey")
+    recent = ft.Row([], wrap=True, spacing=5)
+    marked = ft.Row([], wrap=True, spacing=5)
+    # chave -> chip na lista de marcados
+    chips = {}
+    state = {"cell_id": None, "meeting_date": None, "sent": 0}
+
+    def refresh_status():
+        pending = len(buffer.pending)
+        status.value = f"{len(chips)} presente(s) · {pending} aguardando envio" if pending else \
+            f"{len(chips)} presente(s) · tudo enviado"
+        page.update()
+
+    def on_flushed(rows, inserted):
+        if inserted is None:
+            show_error(page, "Sem conexão: as presenças ficam guardadas e serão reenviadas.")
+            buffer.schedule()
+        for row in rows:
+            chip = chips.get(row["idempotency_key"])
+            if chip and inserted is not None:
+                chip.bgcolor = None
+        refresh_status()
+
+    buffer = CheckinBuffer(db, on_flushed)
+
+    def open_meeting(e=None):
+        if not cell.value:
+            show_warning(page, "Escolha a célula.")
+            return
+        meeting_date = parse_meeting_date(meeting.value)
+        if not meeting_date:
+            show_warning(page, "Data inválida (use dd/mm/aaaa).")
+            return
+        buffer.flush()
+        state["cell_id"], state["meeting_date"] = int(cell.value), meeting_date
+        chips.clear()
+        marked.controls = []
+        recent.controls = [
+            ft.OutlinedButton(n + (" (visitante)" if v else ""), data=(n, v), on_click=lambda e: mark(*e.control.data))
+            for n, v in db.get_last_attendance(state["cell_id"])
+        ]
+        refresh_status()
+
+    def mark(name, is_visitor):
+        if not state["cell_id"]:
+            open_meeting()
+            if not state["cell_id"]:
+                return
+        name = normalize_name(name)
+        row = {
+            'cell_id': state["cell_id"], 'meeting_date': state["meeting_date"], 'person_name': name,
+            'is_visitor': is_visitor, 'recorded_by': username,
+            'idempotency_key': attendance_key(state["cell_id"], state["meeting_date"], name),
+        }
+        key = row['idempotency_key']
+        if key in chips:
+            show_warning(page, f"'{name}' já está marcado(a).")
+            return
+        chips[key] = ft.Chip(label=ft.Text(name), bgcolor=ft.Colors.AMBER_100, data=row,
+                             leading=ft.Icon(ft.Icons.PERSON_ADD if is_visitor else ft.Icons.PERSON),
+                             on_delete=lambda e: unmark(e.control.data))
+        marked.controls.append(chips[key])
+        # Entra no buffer antes do status, que conta as pendentes
+        buffer.add(row)
+        refresh_status()
+
+    def unmark(row):
+        key = row['idempotency_key']
+        # Espera um envio em andamento: a linha está no buffer ou já no banco, nunca nos dois
+        with buffer.flush_lock:
+            discarded = buffer.discard(key)
+        if not discarded:
+            # Já enviado: remove do banco
+            if not db.remove_attendance(row['cell_id'], row['meeting_date'], row['person_name']):
+                show_error(page, "Erro ao remover presença.")
+                return
+        marked.controls.remove(chips.pop(key))
+        refresh_status()
+
+    def add_typed():
+        if not person.value or not person.value.strip():
+            return
+        mark(person.value, bool(visitor.value))
+        person.value = ""
+        visitor.value = False
+        page.update()
+
+    def send(e=None):
+        sent = buffer.flush()
+        if sent:
+            show_success(page, f"Presença de {sent} pessoa(s) enviada em "
+                               f"{names.get(state['cell_id'], 'célula')}!")
+
+    def back(e):
+        buffer.flush()
+        on_back()
+
+    return ft.Column([
+        ft.Row([
+            ft.IconButton(ft.Icons.ARROW_BACK, on_click=back, tooltip="Voltar"),
+            ft.Text("Presença na célula", size=20, weight="bold"),
+        ]),
+        ft.Row([cell, meeting, ft.IconButton(ft.Icons.CHECK, tooltip="Abrir reunião", on_click=open_meeting)]),
+        ft.Text("Presentes na última reunião (toque para marcar):", size=12, color="grey"),
+        recent,
+        ft.Row([person, visitor, ft.IconButton(ft.Icons.ADD, tooltip="Marcar presença", on_click=lambda e: add_typed())]),
+        ft.Divider(),
+        status,
+        marked,
+        ft.Button("Enviar agora", icon=ft.Icons.CLOUD_UPLOAD, on_click=send),
+    ], scroll="auto", expand=True)
+
+
+def attendance_summary_view(page, db, cells, on_back):
+    """Painel da liderança: totais por semana e por célula (só a tabela agregada)"""
+    names = dict(cells)
+    weeks = db.get_attendance_weeks()
+    by_week = {}
+    for w in weeks:
+        by_week.setdefault(w.week_start, []).append(w)
+
+    def week_label(week):
+        return date.fromisoformat(week).strftime("%d/%m")
+
+    overview = ft.DataTable(
+        columns=[ft.DataColumn(ft.Text("Semana")), ft.DataColumn(ft.Text("Células"), numeric=True),
+                 ft.DataColumn(ft.Text("Presentes"), numeric=True), ft.DataColumn(ft.Text("Visitantes"), numeric=True)],
+        rows=[ft.DataRow(cells=[ft.DataCell(ft.Text(v)) for v in (
+            week_label(week), f"{len(ws)}/{len(names)}", str(sum(w.present for w in ws)), str(sum(w.visitors for w in ws))
+        )]) for week, ws in by_week.items()]
+    )
+
+    latest = next(iter(by_week), None)
+    reported = {w.cell_id: w for w in by_week.get(latest, [])}
+    per_cell = ft.DataTable(
+        columns=[ft.DataColumn(ft.Text("Célula")), ft.DataColumn(ft.Text("Presentes"), numeric=True),
+                 ft.DataColumn(ft.Text("Visitantes"), numeric=True)],
+        rows=[ft.DataRow(cells=[ft.DataCell(ft.Text(v, color=None if cell_id in reported else "grey")) for v in (
+            name, str(reported[cell_id].present) if cell_id in reported else "sem registro",
+            str(reported[cell_id].visitors) if cell_id in reported else "-"
+        )]) for cell_id, name in sorted(names.items(), key=lambda c: c[1])]
+    )
+
+    return ft.Column([
+        ft.Row([
+            ft.IconButton(ft.Icons.ARROW_BACK, on_click=lambda e: on_back(), tooltip="Voltar"),
+            ft.Text("Resumo de presença", size=20, weight="bold"),
+        ]),
+        ft.Text(f"Últimas {SUMMARY_WEEKS} semanas", size=12, color="grey"),
+        overview if weeks else ft.Text("Nenhuma presença registrada.", color="grey"),
+        ft.Divider(),
+        ft.Text(f"Semana de {week_label(latest)}" if latest else "", weight="bold"),
+        per_cell if latest else ft.Container(),
+    ], scroll="auto", expand=True)
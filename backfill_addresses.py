@@ -0,0 +1,66 @@
+"""
+Preenche as colunas estruturadas de endereço (cep, logradouro, numero,
+bairro, cidade, uf) a partir da coluna address dos registros antigos.
+O texto de address não é alterado; endereços fora do formato do sistema
+(texto livre) são listados no final para correção manual.
+
+Uso:
+    python backfill_addresses.py [--dry-run]
+"""
+import sys
+from app import Database, parse_legacy_address
+
+TABLES = ('visitors', 'volunteers', 'cells')
+PAGE_SIZE = 500
+
+
+def backfill_table(db, table, dry_run=False):
+    """Migra uma tabela página por página; retorna (lidos, atualizados, [(id, address) ignorados])"""
+    read = updated = 0
+    skipped = []
+    last_id = 0
+    while True:
+        # Paginação por id: registros atualizados não deslocam as páginas seguintes
+        response = (db.supabase.table(table)
+                    .select('id, address, cep')
+                    .is_('cep', 'null')
+                    .gt('id', last_id)
+                    .order('id')
+                    .limit(PAGE_SIZE)
+                    .execute())
+        rows = response.data or []
+        if not rows:
+            break
+        for row in rows:
+            read += 1
+            last_id = row['id']
+            if not (row.get('address') or "").strip():
+                continue
+            parts = parse_legacy_address(row['address'])
+            if parts is None:
+                skipped.append((row['id'], row['address']))
+                continue
+            if not dry_run and not db.update_address(table, row['id'], parts, keep_text=True):
+                continue
+            updated += 1
+        if len(rows) < PAGE_SIZE:
+            break
+    return read, updated, skipped
+
+
+def main():
+    dry_run = "--dry-run" in sys.argv
+    db = Database()
+    for table in TABLES:
+        read, updated, skipped = backfill_table(db, table, dry_run)
+        print(f"{table}: {read} registro(s) sem endereço estruturado, {updated} atualizado(s)")
+        if skipped:
+            print(f"  {len(skipped)} endereço(s) fora do formato, não alterado(s):")
+            for row_id, address in skipped:
+                print(f"    id {row_id}: {address}")
+    if dry_run:
+        print("(dry-run: nada foi gravado)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Backup e restauração completos do IEQ Gestão.
+
+backup:  cada tabela vira um <tabela>.ndjson.gz (uma linha JSON por registro),
+         lida página por página e com as tabelas buscadas em paralelo, mais um
+         manifest.json com contagens e hashes. Com --storage, as fotos da
+         galeria são espelhadas de forma incremental em <destino>/storage:
+         objetos já copiados (mesmo caminho e hash) não são baixados de novo.
+restore: carrega um backup em lotes com upsert([...]).
+
+Uso:
+    python backup.py backup [--dest backups] [--storage] [--workers 4]
+    python backup.py restore backups/20260101_0300 [--storage] [--tables visitors,cells]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from app import Database
+
+# Ordem de restauração (photos depende de albums)
+TABLES = ("users", "visitors", "visits", "volunteers", "cells", "cell_attendance",
+          "cell_attendance_weekly", "services", "volunteer_unavailability", "rota_assignments",
+          "albums", "photos")
+# users é restaurada por username: o schema já cria o admin com id próprio
+ON_CONFLICT = {"users": "username"}
+PAGE_SIZE = 1000
+RESTORE_BATCH = 1000
+FORMAT_VERSION = 1
+
+# ==============================================================================
+# BACKUP
+# ==============================================================================
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dump_table(db, table, folder):
+    """Grava a tabela em NDJSON compactado, uma página por vez"""
+    path = os.path.join(folder, f"{table}.ndjson.gz")
+    rows = 0
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+        for page in db.iter_pages(table, "*", page_size=PAGE_SIZE):
+            f.writelines(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in page)
+            rows += len(page)
+    return {"file": os.path.basename(path), "rows": rows, "sha256": file_sha256(path)}
+
+
+def iter_ndjson(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def mirror_storage(db, folder, dest_root, workers):
+    """
+    Copia as fotos para <dest_root>/storage/objects/<hash>, indexadas por caminho.
+
+    O índice (index.json) é compartilhado entre backups: caminhos já presentes
+    com o objeto no disco são pulados; conteúdo repetido é gravado uma só vez.
+    """
+    storage_dir = os.path.join(dest_root, "storage")
+    objects_dir = os.path.join(storage_dir, "objects")
+    index_path = os.path.join(storage_dir, "index.json")
+    os.makedirs(objects_dir, exist_ok=True)
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+
+    def object_path(digest):
+        return os.path.join(objects_dir, digest[:2], digest)
+
+    paths = {r["storage_path"] for r in iter_ndjson(os.path.join(folder, "photos.ndjson.gz"))
+             if r.get("storage_path")}
+    missing = [p for p in sorted(paths) if p not in index or not os.path.exists(object_path(index[p]["sha256"]))]
+
+    def fetch(storage_path):
+        data = db.download_photo(storage_path)
+        if data is None:
+            return storage_path, None
+        digest = hashlib.sha256(data).hexdigest()
+        target = object_path(digest)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+        return storage_path, {"sha256": digest, "size": len(data)}
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for storage_path, entry in pool.map(fetch, missing):
+            if entry is None:
+                failed.append(storage_path)
+            else:
+                index[storage_path] = entry
+
+    tmp = f"{index_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, index_path)
+
+    # O backup guarda apenas a fotografia do índice para os caminhos deste momento
+    snapshot = {p: index[p] for p in paths if p in index}
+    with open(os.path.join(folder, "storage_index.json"), "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    return {"objects": len(snapshot), "downloaded": len(missing) - len(failed), "failed": failed,
+            "bytes": sum(e["size"] for e in snapshot.values())}
+
+
+def run_backup(db, dest_root, tables, workers, with_storage):
+    folder = os.path.join(dest_root, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(folder)
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(tables, pool.map(lambda t: dump_table(db, t, folder), tables)))
+    for table, info in results.items():
+        print(f"  {table:<12}{info['rows']:>8} linha(s)")
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "tables": results,
+    }
+    if with_storage and "photos" in results:
+        storage = mirror_storage(db, folder, dest_root, workers)
+        manifest["storage"] = storage
+        print(f"  storage: {storage['objects']} objeto(s), {storage['downloaded']} novo(s)"
+              + (f", {len(storage['failed'])} falha(s)" if storage["failed"] else ""))
+
+    with open(os.path.join(folder, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Backup em {folder} ({time.perf_counter() - start:.1f} s)")
+    return folder
+
+# ==============================================================================
+# RESTAURAÇÃO
+# ==============================================================================
+
+def restore_table(db, folder, table, info):
+    path = os.path.join(folder, info["file"])
+    if file_sha256(path) != info["sha256"]:
+        raise SystemExit(f"{info['file']}: hash diferente do manifest (arquivo corrompido?)")
+    on_conflict = ON_CONFLICT.get(table, "id")
+    batch, restored = [], 0
+    for row in iter_ndjson(path):
+        if on_conflict != "id":
+            row.pop("id", None)
+        batch.append(row)
+        if len(batch) >= RESTORE_BATCH:
+            if not db.upsert_rows(table, batch, on_conflict=on_conflict):
+                raise SystemExit(f"Falha ao restaurar {table}")
+            restored += len(batch)
+            batch = []
+    if batch:
+        if not db.upsert_rows(table, batch, on_conflict=on_conflict):
+            raise SystemExit(f"Falha ao restaurar {table}")
+        restored += len(batch)
+    return restored
+
+
+def restore_storage(db, folder, workers):
+    snapshot_path = os.path.join(folder, "storage_index.json")
+    if not os.path.exists(snapshot_path):
+        print("  storage: backup sem fotos espelhadas")
+        return
+    with open(snapshot_path, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    objects_dir = os.path.join(os.path.dirname(os.path.abspath(folder)), "storage", "objects")
+
+    def push(item):
+        storage_path, entry = item
+        with open(os.path.join(objects_dir, entry["sha256"][:2], entry["sha256"]), "rb") as f:
+            return db.restore_photo(storage_path, f.read())
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        ok = sum(pool.map(push, snapshot.items()))
+    print(f"  storage: {ok}/{len(snapshot)} foto(s) restaurada(s)")
+
+
+def run_restore(db, folder, tables, workers, with_storage):
+    with open(os.path.join(folder, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise SystemExit(f"Formato de backup não suportado: {manifest.get('format')}")
+    start = time.perf_counter()
+    for table in TABLES:
+        if table in tables and table in manifest["tables"]:
+            restored = restore_table(db, folder, table, manifest["tables"][table])
+            print(f"  {table:<12}{restored:>8} linha(s)")
+    if with_storage:
+        restore_storage(db, folder, workers)
+    print(f"Restauração concluída ({time.perf_counter() - start:.1f} s)")
+    print("Ajuste as sequências de id no SQL Editor do Supabase:")
+    for table in tables:
+        if table != "users":
+            print(f"  SELECT setval('{table}_id_seq', (SELECT COALESCE(MAX(id), 1) FROM {table}));")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backup e restauração do IEQ Gestão")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    b = sub.add_parser("backup", help="gera um novo backup")
+    b.add_argument("--dest", default="backups", help="pasta dos backups")
+    b.add_argument("--storage", action="store_true", help="espelha também as fotos da galeria")
+
+    r = sub.add_parser("restore", help="restaura um backup")
+    r.add_argument("folder", help="pasta do backup (contém manifest.json)")
+    r.add_argument("--storage", action="store_true", help="regrava também as fotos da galeria")
+
+    for p in (b, r):
+        p.add_argument("--tables", default=",".join(TABLES), help="tabelas, separadas por vírgula")
+        p.add_argument("--workers", type=int, default=4, help="operações em paralelo")
+    args = parser.parse_args()
+
+    tables = [t for t in args.tables.split(",") if t in TABLES]
+    db = Database()
+    if args.command == "backup":
+        run_backup(db, args.dest, tables, args.workers, args.storage)
+    else:
+        run_restore(db, args.folder, tables, args.workers, args.storage)
+
+
+if __name__ == "__main__":
+    main()
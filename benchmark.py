@@ -0,0 +1,200 @@
+"""
+Benchmarks do IEQ Gestão com Supabase em memória (fake_supabase)
+
+Mede tempo de parede, idas ao servidor, pico de memória (tracemalloc),
+quantidade de controles Flet montados e page.update() enviados.
+
+Uso:
+    python benchmark.py
+    python benchmark.py --latency 40 --jitter 10 --sizes 1000,10000
+    python benchmark.py --scenarios login,album_open --json bench.json
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from app import Database, address_key, count_controls, visitors_list_view
+from fake_supabase import FakeSupabaseClient
+from passwords import hash_password
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+PHOTO_COUNT = 100
+PHOTO_BYTES = 50 * 1024
+
+
+class BenchPage:
+    """Página mínima para montar as views fora do Flet, contando os envios"""
+
+    def __init__(self):
+        self.overlay = []
+        self.controls = []
+        self.snack_bar = None
+        self.updates = 0
+
+    def update(self, *controls):
+        self.updates += 1
+
+    def add(self, *controls):
+        self.controls.extend(controls)
+        self.update()
+
+    def clean(self):
+        self.controls.clear()
+
+    def run_task(self, handler, *args, **kwargs):
+        return asyncio.run(handler(*args, **kwargs))
+
+    def get_upload_url(self, file_name, expires):
+        return f"/upload/{file_name}"
+
+# ==============================================================================
+# DADOS DE EXEMPLO
+# ==============================================================================
+
+def seed_users(client):
+    client.seed_rows('users', [
+        {'username': 'admin', 'password': hash_password('admin123'), 'is_admin': True, 'permissions': {}},
+        {'username': 'recepcao', 'password': hash_password('recepcao123'), 'is_admin': False,
+         'permissions': {'visitantes': True, 'celulas': True}},
+    ])
+
+
+def seed_visitors(client, count):
+    bairros = ("Centro", "Jardim América", "Vila Nova", "São José", "Boa Vista")
+    client.seed_rows('visitors', (
+        {
+            'name': f"Visitante {i:06d}",
+            'phone': f"(11) 9{i % 10000:04d}-{i % 9000 + 1000:04d}",
+            'email': f"visitante{i}@exemplo.com",
+            'address': f"Rua {i % 300}, {i % 1000} - {bairros[i % 5]}, São Paulo/SP CEP: 0{i % 10000:04d}-000",
+            'cep': f"0{i % 10000:04d}-000", 'logradouro': f"Rua {i % 300}", 'numero': str(i % 1000),
+            'bairro': bairros[i % 5], 'cidade': "São Paulo", 'uf': "SP",
+            'cidade_key': address_key("São Paulo"), 'bairro_key': address_key(bairros[i % 5]),
+            'date_visit': f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}T19:{i % 60:02d}:00+00:00",
+            'observations': "Veio com a família" if i % 3 == 0 else None,
+        } for i in range(count)
+    ))
+
+
+def seed_album(client, photos):
+    newest = max(range(photos), key=lambda i: i % 60) if photos else None
+    client.seed_rows('albums', [{'name': "Culto de Ano Novo", 'description': "Fotos do culto",
+                                 'event_date': "2026-01-01", 'created_by': 'admin', 'photo_count': photos,
+                                 'cover_path': f"1/foto_{newest:03d}.jpg" if photos else None}])
+    client.seed_rows('photos', (
+        {'album_id': 1, 'file_name': f"foto_{i:03d}.jpg", 'storage_path': f"1/foto_{i:03d}.jpg",
+         'file_path': f"https://fake.supabase.local/1/foto_{i:03d}.jpg", 'description': "",
+         'uploaded_by': 'admin', 'file_size': PHOTO_BYTES,
+         'created_at': f"2026-01-01T20:{i % 60:02d}:00+00:00"} for i in range(photos)
+    ))
+
+# ==============================================================================
+# CENÁRIOS
+# ==============================================================================
+
+def scenario_login(db, page):
+    """Mesmo caminho de attempt_admin_login + login_success"""
+    user = db.authenticate('admin', 'admin123')
+    assert user and user.permissions.get('usuarios')
+    return {}
+
+
+def scenario_visitor_list(db, page):
+    view = visitors_list_view(page, db)
+    return {'controls': count_controls(view)}
+
+
+def scenario_album_open(db, page):
+    """Mesmo acesso a dados de show_album_photos"""
+    album = db.get_album_by_id(1)
+    photos = db.get_photos_by_album(album['id'])
+    urls = [db.get_photo_url(p.storage_path) for p in photos]
+    assert len(urls) == PHOTO_COUNT
+    return {}
+
+
+def scenario_photo_upload(db, page):
+    """Mesmo laço de start_upload para PHOTO_COUNT fotos"""
+    payload = b"\xff" * PHOTO_BYTES
+    for i in range(PHOTO_COUNT):
+        result = db.upload_photo_to_storage(payload, f"upload_{i:03d}.jpg", 1)
+        db.add_photo(1, f"upload_{i:03d}.jpg", result['public_url'], result['storage_path'],
+                     "", 'admin', len(payload), refresh_cover=False)
+    db.refresh_album_cover(1)
+    return {}
+
+
+def build_scenarios(sizes):
+    """Lista de (nome, função de carga, função medida)"""
+    scenarios = [("login", seed_users, scenario_login)]
+    for size in sizes:
+        scenarios.append((f"visitor_list_{size // 1000}k", lambda c, n=size: seed_visitors(c, n), scenario_visitor_list))
+    scenarios.append(("album_open", lambda c: seed_album(c, PHOTO_COUNT), scenario_album_open))
+    scenarios.append(("photo_upload_100", lambda c: seed_album(c, 0), scenario_photo_upload))
+    return scenarios
+
+# ==============================================================================
+# EXECUÇÃO
+# ==============================================================================
+
+def run_scenario(name, seed, scenario, latency_ms, jitter_ms):
+    client = FakeSupabaseClient(latency_ms=latency_ms, jitter_ms=jitter_ms, seed=42)
+    seed(client)
+    db = Database(client=client)
+    page = BenchPage()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    extra = scenario(db, page)
+    wall_ms = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'scenario': name,
+        'wall_ms': round(wall_ms, 1),
+        'round_trips': client.round_trips,
+        'peak_mb': round(peak / (1024 * 1024), 2),
+        'controls': extra.get('controls', 0),
+        'page_updates': page.updates,
+    }
+
+
+def print_report(results, latency_ms, jitter_ms):
+    print(f"\nLatência simulada: {latency_ms:g} ms ± {jitter_ms:g} ms")
+    header = f"{'cenário':<22}{'tempo (ms)':>12}{'idas':>8}{'pico (MB)':>12}{'controles':>12}{'updates':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['scenario']:<22}{r['wall_ms']:>12.1f}{r['round_trips']:>8}{r['peak_mb']:>12.2f}"
+              f"{r['controls']:>12}{r['page_updates']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do IEQ Gestão (Supabase em memória)")
+    parser.add_argument("--latency", type=float, default=30.0, help="latência por ida ao servidor (ms)")
+    parser.add_argument("--jitter", type=float, default=5.0, help="variação da latência (ms)")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="tamanhos da lista de visitantes, separados por vírgula")
+    parser.add_argument("--scenarios", default="", help="filtra cenários pelo prefixo do nome")
+    parser.add_argument("--json", dest="json_path", help="grava os resultados em JSON")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    wanted = [s for s in args.scenarios.split(",") if s]
+    results = []
+    for name, seed, scenario in build_scenarios(sizes):
+        if wanted and not any(name.startswith(w) for w in wanted):
+            continue
+        results.append(run_scenario(name, seed, scenario, args.latency, args.jitter))
+
+    print_report(results, args.latency, args.jitter)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({'latency_ms': args.latency, 'jitter_ms': args.jitter, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
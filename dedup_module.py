@@ -0,0 +1,412 @@
+"""
+Módulo de Duplicados
+Detecção de visitantes cadastrados mais de uma vez: chaves de bloqueio
+(telefone normalizado, e-mail e nome fonético em português), pontuação
+só entre candidatos do mesmo bloco e sugestões de mesclagem
+"""
+import flet as ft
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict, namedtuple
+from difflib import SequenceMatcher
+from functools import lru_cache
+from timestamps import format_date
+from ui_updates import batched, request_update
+from visitor_import_module import NAME_PARTICLES, phone_digits
+
+# Pontuação mínima para sugerir (0 a 1) e para bloquear o cadastro
+SUGGEST_THRESHOLD = 0.75
+# Blocos maiores (nomes muito comuns) não geram pares: telefone/e-mail ainda os cobrem
+MAX_BLOCK = 50
+# As escritas do processo atualizam o índice na hora; a releitura completa (que pega
+# escritas de outros processos) acontece só após este tempo, em segundo plano
+INDEX_TTL = 600
+INDEX_COLUMNS = "id, name, phone, email, cep, date_visit"
+
+# Registro indexado: campos já normalizados para as comparações
+DedupRecord = namedtuple("DedupRecord", "id name phone email cep date_visit norm_name name_key phone_key")
+DuplicateCandidate = namedtuple("DuplicateCandidate", "record score")
+DuplicateGroup = namedtuple("DuplicateGroup", "primary duplicates")
+
+# ==============================================================================
+# NORMALIZAÇÃO E CHAVES
+# ==============================================================================
+
+def _unaccent(text):
+    text = unicodedata.normalize("NFKD", text.lower().replace("ç", "s"))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+# Regras fonéticas aplicadas em ordem (grafias que soam igual em português do Brasil)
+_PHONETIC_RULES = [(re.compile(p), r) for p, r in (
+    (r"[^a-z]", ""),
+    (r"ph", "f"), (r"lh", "l"), (r"nh", "n"), (r"[cs]h", "x"), (r"th", "t"),
+    (r"qu", "k"), (r"gu(?=[ei])", "g"), (r"c(?=[ei])", "s"), (r"g(?=[ei])", "j"),
+    (r"[cq]", "k"), (r"y", "i"), (r"w", "v"), (r"z", "s"), (r"h", ""),
+    (r"l(?=[^aeiou]|$)", "u"), (r"[mn](?=[^aeiou]|$)", "m"),
+)]
+_VOWELS_AFTER_FIRST = re.compile(r"(?<!^)[aeiou]")
+_REPEATS = re.compile(r"(.)\1+")
+
+@lru_cache(maxsize=65536)
+def phonetic_key(word):
+    """'Thiago' e 'Tiago' -> 'tg'; 'Luiz'/'Luís' -> 'ls' (primeira letra e consoantes)"""
+    key = _unaccent(word)
+    for pattern, replacement in _PHONETIC_RULES:
+        key = pattern.sub(replacement, key)
+    return _REPEATS.sub(r"\1", _VOWELS_AFTER_FIRST.sub("", key))
+
+def name_tokens(name):
+    return [t for t in _unaccent(name or "").split() if t not in NAME_PARTICLES]
+
+def name_key(name):
+    """Primeiro e último nome fonéticos ('' se o nome tiver uma palavra só)"""
+    tokens = name_tokens(name)
+    if len(tokens) < 2:
+        return ""
+    return f"{phonetic_key(tokens[0])}|{phonetic_key(tokens[-1])}"
+
+def make_record(row):
+    """Linha de visitors -> DedupRecord"""
+    name = row.get("name") or ""
+    email = (row.get("email") or "").strip().lower()
+    return DedupRecord(
+        row["id"], name, row.get("phone") or "", email if "@" in email else "",
+        (row.get("cep") or "").replace("-", ""), row.get("date_visit"),
+        " ".join(name_tokens(name)), name_key(name), phone_digits(row.get("phone"))
+    )
+
+def blocking_keys(rec):
+    """Chaves de bloco: só registros que compartilham alguma chave são comparados"""
+    keys = []
+    if len(rec.phone_key) >= 8:
+        # Últimos 8 dígitos: cobre DDD omitido e o 9 adicional
+        keys.append("t:" + rec.phone_key[-8:])
+    if rec.email:
+        keys.append("e:" + rec.email)
+    if rec.name_key:
+        keys.append("n:" + rec.name_key)
+    return keys
+
+def score(a, b):
+    """Semelhança de 0 a 1 entre dois registros"""
+    name_sim = SequenceMatcher(None, a.norm_name, b.norm_name).ratio() if a.norm_name and b.norm_name else 0.0
+    if a.name_key and a.name_key == b.name_key:
+        name_sim = max(name_sim, 0.9)
+    total = 0.55 * name_sim
+    if a.phone_key and a.phone_key == b.phone_key:
+        total += 0.4
+    elif len(a.phone_key) >= 8 and a.phone_key[-8:] == b.phone_key[-8:]:
+        total += 0.3
+    if a.email and a.email == b.email:
+        total += 0.3
+    if a.cep and a.cep == b.cep:
+        total += 0.1
+    return min(total, 1.0)
+
+# ==============================================================================
+# ÍNDICE
+# ==============================================================================
+
+class VisitorIndex:
+    """Chaves de bloqueio de todos os visitantes, em memória (um por banco, no processo)"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.records = {}
+        self.blocks = defaultdict(set)
+        self.built_at = None
+        # Escritas que chegaram durante uma leitura (reaplicadas no índice novo); None = sem leitura em curso
+        self.journal = None
+        # Sinalizado ao fim da leitura em curso (com sucesso ou não)
+        self.loaded = threading.Event()
+
+    def add(self, rec):
+        self.remove(rec.id)
+        self.records[rec.id] = rec
+        for key in blocking_keys(rec):
+            self.blocks[key].add(rec.id)
+
+    def remove(self, visitor_id):
+        old = self.records.pop(visitor_id, None)
+        if old:
+            for key in blocking_keys(old):
+                block = self.blocks.get(key)
+                if block:
+                    block.discard(visitor_id)
+                    if not block:
+                        del self.blocks[key]
+
+    def apply(self, rows=(), removed=()):
+        """Aplica uma escrita em visitors (linhas inseridas/alteradas e ids removidos)"""
+        with self.lock:
+            if self.journal is not None:
+                self.journal.append((list(rows), list(removed)))
+            if self.built_at is None:
+                return
+            for visitor_id in removed:
+                self.remove(visitor_id)
+            for row in rows:
+                self.add(make_record(row))
+
+    def _load(self, db):
+        for rows in db.iter_pages("visitors", INDEX_COLUMNS):
+            for row in rows:
+                self.add(make_record(row))
+
+    def refresh(self, db, wait=True):
+        """
+        Garante o índice em dia: ausente ou com mais de INDEX_TTL, é lido em segundo
+        plano (o índice atual continua respondendo) e trocado no fim. Só a primeira
+        carga pode fazer esperar, e só com wait. Retorna True se há índice pronto.
+        """
+        with self.lock:
+            ready = self.built_at is not None
+            if ready and time.monotonic() - self.built_at <= INDEX_TTL:
+                return True
+            loaded = self.loaded
+            start = self.journal is None
+            if start:
+                self.journal = []
+                loaded = self.loaded = threading.Event()
+        if start:
+            threading.Thread(target=self._rebuild, args=(db, loaded), daemon=True, name="visitor-index").start()
+        if not ready and wait:
+            loaded.wait()
+            return self.built_at is not None
+        return ready
+
+    def _rebuild(self, db, loaded):
+        fresh = VisitorIndex()
+        try:
+            fresh._load(db)
+            with self.lock:
+                fresh.built_at = time.monotonic()
+                for rows, removed in self.journal:
+                    fresh.apply(rows, removed)
+                self.records, self.blocks, self.built_at = fresh.records, fresh.blocks, fresh.built_at
+        except Exception as e:
+            db._log_error("Erro ao montar o índice de duplicados", e)
+        finally:
+            with self.lock:
+                self.journal = None
+            loaded.set()
+
+    def candidates(self, rec, threshold=SUGGEST_THRESHOLD):
+        """Registros do índice parecidos com `rec`, do mais ao menos provável"""
+        ids = set()
+        for key in blocking_keys(rec):
+            ids.update(self.blocks.get(key, ()))
+        ids.discard(rec.id)
+        found = [DuplicateCandidate(self.records[i], score(rec, self.records[i])) for i in ids]
+        return sorted((c for c in found if c.score >= threshold), key=lambda c: -c.score)
+
+    def pairs(self, threshold=SUGGEST_THRESHOLD):
+        """Pares (id, id, pontuação) acima do limite, comparando só dentro dos blocos"""
+        seen = set()
+        for block in self.blocks.values():
+            if len(block) < 2 or len(block) > MAX_BLOCK:
+                continue
+            ids = sorted(block)
+            for i, a in enumerate(ids):
+                for b in ids[i + 1:]:
+                    if (a, b) in seen:
+                        continue
+                    seen.add((a, b))
+                    s = score(self.records[a], self.records[b])
+                    if s >= threshold:
+                        yield a, b, s
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def _visitor_index(db):
+    with _indexes_lock:
+        index = _indexes.setdefault(db.backend_key, VisitorIndex())
+    return index
+
+def group_pairs(records, pairs):
+    """Une os pares em grupos (union-find); o registro mais antigo de cada grupo é o principal"""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    best = {}
+    for a, b, s in pairs:
+        parent[find(a)] = find(b)
+        best[a] = max(best.get(a, 0), s)
+        best[b] = max(best.get(b, 0), s)
+
+    members = defaultdict(list)
+    for x in parent:
+        members[find(x)].append(records[x])
+    groups = []
+    for recs in members.values():
+        recs.sort(key=lambda r: (r.date_visit or "", r.id))
+        primary = recs[0]
+        groups.append(DuplicateGroup(primary, [DuplicateCandidate(r, best[r.id]) for r in recs[1:]]))
+    groups.sort(key=lambda g: -max(c.score for c in g.duplicates))
+    return groups
+
+# ==============================================================================
+# FUNÇÕES DE DUPLICADOS NO DATABASE
+# ==============================================================================
+
+def add_dedup_methods_to_database(db_class):
+    """Adiciona métodos de detecção e mesclagem de duplicados à classe Database"""
+
+    def _fresh_visitor_index(self, wait=True):
+        """Índice de visitantes (lido em segundo plano, relido após INDEX_TTL); None se ainda não está pronto"""
+        index = _visitor_index(self)
+        return index if index.refresh(self, wait) else None
+
+    def warm_visitor_index(self):
+        """Começa a montar o índice de duplicados em segundo plano (após o login)"""
+        self._fresh_visitor_index(wait=False)
+
+    def _index_visitors(self, rows=(), removed=()):
+        """Aplica ao índice uma escrita em visitors já feita (insert, lote, edição, endereço, mesclagem)"""
+        _visitor_index(self).apply(rows, removed)
+
+    def find_visitor_duplicates(self, name, phone, email, cep=None):
+        """Visitantes já cadastrados parecidos com os dados informados (via índice)"""
+        try:
+            rec = make_record({"id": None, "name": name, "phone": phone, "email": email, "cep": cep})
+            # Índice ainda em montagem: o cadastro segue sem a checagem em vez de esperar a leitura
+            index = self._fresh_visitor_index(wait=False)
+            if index is None:
+                return []
+            with index.lock:
+                return index.candidates(rec)
+        except Exception as e:
+            self._log_error("Erro ao procurar duplicados", e)
+            return []
+
+    def find_duplicate_groups(self, threshold=SUGGEST_THRESHOLD):
+        """Sugestões de mesclagem para toda a base"""
+        try:
+            index = self._fresh_visitor_index()
+            if index is None:
+                raise RuntimeError("índice de duplicados indisponível")
+            with index.lock:
+                return group_pairs(index.records, list(index.pairs(threshold)))
+        except Exception as e:
+            self._log_error("Erro ao procurar duplicados", e)
+            return []
+
+    def merge_visitors(self, primary_id, duplicate_ids):
+        """
+        Mescla os duplicados no principal: campos vazios são completados, as
+        observações e datas de visita dos duplicados são anotadas e eles são removidos
+        """
+        try:
+            ids = [primary_id] + list(duplicate_ids)
+            rows = {r['id']: r for r in self.supabase.table('visitors').select('*').in_('id', ids).execute().data or []}
+            primary = rows.get(primary_id)
+            if not primary:
+                return False
+            changes = {}
+            notes = [primary.get('observations') or ""]
+            for dup_id in duplicate_ids:
+                dup = rows.get(dup_id)
+                if not dup:
+                    continue
+                for column in ('phone', 'email', 'address', 'cep', 'logradouro', 'numero', 'bairro', 'cidade', 'uf',
+                               'cidade_key', 'bairro_key'):
+                    if not (changes.get(column) or primary.get(column)) and dup.get(column):
+                        changes[column] = dup[column]
+                visited = format_date(dup.get('date_visit'))
+                notes.append(f"Mesclado de '{dup.get('name')}'" + (f" (visita em {visited})" if visited else "")
+                             + (f": {dup['observations']}" if dup.get('observations') else ""))
+            observations = "\n".join(n for n in notes if n)
+            if observations != (primary.get('observations') or ""):
+                changes['observations'] = observations
+            if changes:
+                primary = self.supabase.table('visitors').update(changes).eq('id', primary_id).execute().data[0]
+            # Antes do delete (ON DELETE CASCADE): retornos e primeiras visitas passam para o principal
+            self._move_visits(duplicate_ids, primary_id, [rows[d].get('date_visit') for d in duplicate_ids if d in rows])
+            self.supabase.table('visitors').delete().in_('id', list(duplicate_ids)).execute()
+            self._touch('visitors')
+            self._index_visitors(rows=[primary], removed=duplicate_ids)
+            return True
+        except Exception as e:
+            self._log_error("Erro ao mesclar visitantes", e)
+            return False
+
+    db_class._fresh_visitor_index = _fresh_visitor_index
+    db_class.warm_visitor_index = warm_visitor_index
+    db_class._index_visitors = _index_visitors
+    db_class.find_visitor_duplicates = find_visitor_duplicates
+    db_class.find_duplicate_groups = find_duplicate_groups
+    db_class.merge_visitors = merge_visitors
+
+# ==============================================================================
+# INTERFACE
+# ==============================================================================
+
+def _record_text(rec):
+    visited = format_date(rec.date_visit)
+    details = [d for d in (rec.phone, rec.email, f"visita {visited}" if visited else "") if d]
+    return f"{rec.name} · " + " · ".join(details) if details else rec.name
+
+def duplicates_view(page, db, show_success, show_error, show_loading, hide_loading, on_back):
+    """Sugestões de mesclagem de visitantes duplicados"""
+    groups_column = ft.ListView([], expand=True, spacing=5)
+    summary = ft.Text("", size=12, color="grey")
+
+    def group_card(group):
+        rows = [ft.Text(f"Principal: {_record_text(group.primary)}", weight="bold")]
+        rows += [ft.Text(f"{c.score:.0%} · {_record_text(c.record)}", size=12) for c in group.duplicates]
+        card = ft.Card(content=ft.Container(padding=10, content=ft.Column(rows + [ft.Row([
+            ft.TextButton("Ignorar", on_click=lambda e: remove(card)),
+            ft.TextButton("Mesclar", icon=ft.Icons.MERGE, on_click=lambda e: merge(group, card)),
+        ], alignment="end")], spacing=4)))
+        return card
+
+    @batched
+    def remove(card):
+        groups_column.controls.remove(card)
+        summary.value = f"{len(groups_column.controls)} grupo(s) de possíveis duplicados"
+        request_update(page)
+
+    @batched
+    def merge(group, card):
+        loading = show_loading(page, "Mesclando visitantes...")
+        ok = db.merge_visitors(group.primary.id, [c.record.id for c in group.duplicates])
+        hide_loading(page, loading)
+        if ok:
+            show_success(page, f"{len(group.duplicates)} cadastro(s) mesclado(s) em '{group.primary.name}'")
+            remove(card)
+        else:
+            show_error(page, "Erro ao mesclar visitantes.")
+
+    @batched
+    def load(e=None):
+        loading = show_loading(page, "Procurando duplicados...")
+        start = time.perf_counter()
+        groups = db.find_duplicate_groups()
+        hide_loading(page, loading)
+        groups_column.controls = [group_card(g) for g in groups] or [
+            ft.Container(content=ft.Text("Nenhum possível duplicado encontrado.", color="grey"), padding=40)
+        ]
+        summary.value = f"{len(groups)} grupo(s) de possíveis duplicados ({time.perf_counter() - start:.1f} s)"
+        request_update(page)
+
+    content = ft.Column([
+        ft.Row([
+            ft.IconButton(ft.Icons.ARROW_BACK, on_click=lambda e: on_back(), tooltip="Voltar"),
+            ft.Text("Possíveis duplicados", size=20, weight="bold"),
+            ft.IconButton(ft.Icons.REFRESH, on_click=load, tooltip="Procurar de novo"),
+        ]),
+        summary,
+        ft.Divider(),
+        groups_column
+    ], expand=True)
+    load()
+    return content
@@ -0,0 +1,230 @@
+"""
+Módulo de Exportação
+Visitantes, voluntários e células para CSV, CSV compactado (.csv.gz) ou XLSX,
+gravados página por página direto do banco (memória constante)
+"""
+import flet as ft
+import asyncio
+import csv
+import gzip
+import os
+import shutil
+import time
+import urllib.parse
+import uuid
+from datetime import datetime
+from timestamps import format_datetime
+
+PAGE_SIZE = 1000
+
+# Modo web: exportações gravadas dentro do assets_dir do ft.app (servido pelo Flet em /exports/...),
+# cada uma numa pasta de nome aleatório; apagadas depois de WEB_EXPORT_TTL segundos
+WEB_EXPORT_DIR = os.path.join("assets", "exports")
+WEB_EXPORT_TTL = 3600
+
+ADDRESS_COLUMNS = [("cep", "CEP"), ("logradouro", "Logradouro"), ("numero", "Número"),
+                   ("bairro", "Bairro"), ("cidade", "Cidade"), ("uf", "UF")]
+
+# Tabela -> nome do arquivo, filtros e (coluna, título) na ordem da planilha
+EXPORTS = {
+    "visitors": {
+        "name": "visitantes",
+        "filters": (),
+        "columns": [("id", "ID"), ("name", "Nome"), ("phone", "Telefone"), ("email", "E-mail")]
+                   + ADDRESS_COLUMNS + [("date_visit", "Data da visita"), ("observations", "Observações")],
+    },
+    "volunteers": {
+        "name": "voluntarios",
+        "filters": (("eq", "active", True),),
+        "columns": [("id", "ID"), ("name", "Nome"), ("role", "Cargo"), ("department", "Departamento"),
+                    ("phone", "Telefone"), ("email", "E-mail")]
+                   + ADDRESS_COLUMNS + [("hire_date", "Data início"), ("registration_date", "Cadastro"),
+                                        ("observations", "Observações")],
+    },
+    "cells": {
+        "name": "celulas",
+        "filters": (("eq", "active", True),),
+        "columns": [("id", "ID"), ("name", "Nome"), ("leader_name", "Líder"), ("host_name", "Anfitrião"),
+                    ("meeting_day", "Dia"), ("meeting_time", "Horário")]
+                   + ADDRESS_COLUMNS + [("observations", "Observações")],
+    },
+}
+
+# Colunas convertidas para texto de exibição
+FORMATTERS = {"date_visit": format_datetime, "registration_date": format_datetime}
+
+FORMATS = {"csv": "CSV", "csv.gz": "CSV compactado (.csv.gz)", "xlsx": "Excel (.xlsx)"}
+
+# ==============================================================================
+# ESCRITORES
+# ==============================================================================
+
+class CsvWriter:
+    """CSV com ';' e BOM (abre direto no Excel em português); gzip opcional"""
+
+    def __init__(self, path, compress=False):
+        if compress:
+            self.file = gzip.open(path, "wt", encoding="utf-8-sig", newline="")
+        else:
+            self.file = open(path, "w", encoding="utf-8-sig", newline="")
+        self.writer = csv.writer(self.file, delimiter=";")
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxWriter:
+    """Planilha em modo write_only: as linhas vão para o disco conforme chegam"""
+
+    def __init__(self, path):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise RuntimeError("Instale o pacote openpyxl para exportar arquivos .xlsx")
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+def export_format(path):
+    """Formato pela extensão do arquivo"""
+    lower = path.lower()
+    if lower.endswith(".csv.gz"):
+        return "csv.gz"
+    if lower.endswith(".xlsx"):
+        return "xlsx"
+    return "csv"
+
+
+def open_writer(path, fmt=None):
+    fmt = fmt or export_format(path)
+    if fmt == "xlsx":
+        return XlsxWriter(path)
+    return CsvWriter(path, compress=fmt == "csv.gz")
+
+# ==============================================================================
+# EXPORTAÇÃO
+# ==============================================================================
+
+def export_table(db, table, path, fmt=None, on_progress=None, page_size=PAGE_SIZE):
+    """
+    Exporta a tabela para `path`, uma página do banco por vez.
+
+    on_progress(gravadas, total) é chamado após cada página (total pode ser None).
+    Retorna a quantidade de linhas gravadas.
+    """
+    spec = EXPORTS[table]
+    fields = [column for column, _ in spec["columns"]]
+    formatters = [(i, FORMATTERS[f]) for i, f in enumerate(fields) if f in FORMATTERS]
+    total = db.count_rows(table, spec["filters"])
+
+    writer = open_writer(path, fmt)
+    written = 0
+    try:
+        writer.write_rows([[title for _, title in spec["columns"]]])
+        for rows in db.iter_pages(table, ", ".join(fields), spec["filters"], page_size):
+            values = [[r.get(f) for f in fields] for r in rows]
+            for i, formatter in formatters:
+                for v in values:
+                    v[i] = formatter(v[i])
+            writer.write_rows(values)
+            written += len(values)
+            if on_progress:
+                on_progress(written, total)
+    finally:
+        writer.close()
+    return written
+
+
+def default_file_name(table, fmt):
+    return f"{EXPORTS[table]['name']}_{datetime.now():%Y%m%d_%H%M}.{fmt}"
+
+
+def web_export_path(file_name):
+    """(caminho no servidor, URL relativa) de uma exportação baixada pelo navegador"""
+    now = time.time()
+    if os.path.isdir(WEB_EXPORT_DIR):
+        for entry in os.scandir(WEB_EXPORT_DIR):
+            if entry.is_dir() and now - entry.stat().st_mtime > WEB_EXPORT_TTL:
+                shutil.rmtree(entry.path, ignore_errors=True)
+    token = uuid.uuid4().hex
+    folder = os.path.join(WEB_EXPORT_DIR, token)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, file_name), f"exports/{token}/{urllib.parse.quote(file_name)}"
+
+# ==============================================================================
+# INTERFACE
+# ==============================================================================
+
+def export_control(page, db, table, show_success, show_error):
+    """Menu de exportação para o cabeçalho das listas, com progresso ao lado"""
+    progress_text = ft.Text("", size=12, color="blue")
+    busy = {"active": False}
+
+    def on_progress(written, total):
+        if total:
+            progress_text.value = f"Exportando {written}/{total} ({written * 100 // total}%)"
+        else:
+            progress_text.value = f"Exportando {written} linha(s)..."
+        page.update()
+
+    async def run_export(fmt):
+        if busy["active"]:
+            return
+        file_name = default_file_name(table, fmt)
+        try:
+            path = await ft.FilePicker().save_file(
+                dialog_title="Salvar exportação",
+                file_name=file_name,
+                allowed_extensions=[fmt.split(".")[0]]
+            )
+        except Exception as ex:
+            print(f"Erro ao escolher arquivo: {ex}")
+            path = None
+        download_url = None
+        if path is None:
+            if not getattr(page, "web", False):
+                return
+            # Modo web: sem diálogo de salvar; o arquivo é servido pelo Flet e o navegador o baixa
+            path, download_url = web_export_path(file_name)
+        elif not path.lower().endswith(f".{fmt}"):
+            path = f"{path}.{fmt}"
+
+        busy["active"] = True
+        try:
+            # Fora do loop de eventos: a tela continua respondendo durante a exportação
+            written = await asyncio.to_thread(export_table, db, table, path, fmt, on_progress)
+            if download_url:
+                launched = page.launch_url(urllib.parse.urljoin(page.url or "/", download_url))
+                if asyncio.iscoroutine(launched):
+                    await launched
+                show_success(page, f"{written} registro(s) exportado(s): download de {file_name} iniciado")
+            else:
+                show_success(page, f"{written} registro(s) exportado(s) para {path}")
+        except Exception as ex:
+            print(f"Erro na exportação: {ex}")
+            show_error(page, f"Erro na exportação: {ex}")
+        finally:
+            busy["active"] = False
+            progress_text.value = ""
+            page.update()
+
+    menu = ft.PopupMenuButton(
+        icon=ft.Icons.DOWNLOAD,
+        tooltip="Exportar",
+        items=[
+            ft.PopupMenuItem(content=ft.Text(label), on_click=lambda e, f=fmt: page.run_task(run_export, f))
+            for fmt, label in FORMATS.items()
+        ]
+    )
+    return ft.Row([progress_text, menu], spacing=5)
@@ -0,0 +1,301 @@
+"""
+Supabase em memória para benchmarks e testes de carga
+
+Imita a parte da API do supabase-py usada pelo sistema:
+    table().select/insert/update/upsert/delete
+           .eq/neq/gt/gte/lt/lte/in_/is_/ilike/order/limit/range/execute
+    storage.from_().upload/remove/download/list/get_public_url
+
+Cada execute() e cada operação de storage conta como uma ida ao servidor
+e espera a latência configurada (com jitter).
+"""
+import copy
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+# Valores padrão preenchidos pelo banco (ver supabase_schema.sql)
+TABLE_DEFAULTS = {
+    'users': {'is_admin': False, 'permissions': {}, 'is_google_auth': False},
+    'visitors': {},
+    'volunteers': {'active': True},
+    'cells': {'active': True},
+    'albums': {},
+    'photos': {},
+    'visits': {},
+    'cell_attendance': {'is_visitor': False},
+    'cell_attendance_weekly': {'meetings': 0, 'present': 0, 'visitors': 0},
+    'services': {'needs': {}},
+    'volunteer_unavailability': {},
+    'rota_assignments': {},
+}
+TIMESTAMP_COLUMNS = {
+    'visitors': ('date_visit', 'created_at', 'updated_at'),
+    'volunteers': ('registration_date', 'created_at', 'updated_at'),
+    'visits': ('visited_at', 'created_at'),
+}
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeTable:
+    """Armazenamento de uma tabela: linhas por id e sequência própria"""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = {}
+        self.next_id = 1
+
+    def insert_row(self, values):
+        row = dict(TABLE_DEFAULTS.get(self.name, {}))
+        now = _now_iso()
+        for column in TIMESTAMP_COLUMNS.get(self.name, ('created_at', 'updated_at')):
+            row[column] = now
+        row.update(values)
+        if row.get('id') is None:
+            row['id'] = self.next_id
+        self.next_id = max(self.next_id, row['id'] + 1)
+        self.rows[row['id']] = row
+        return row
+
+
+class FakeQuery:
+    """Construtor de consultas encadeável, no estilo do postgrest-py"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.action = 'select'
+        self.columns = None
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+        self.orders = []
+        self.offset = 0
+        self.max_rows = None
+        self.count = None
+
+    # --- ações ---
+    def select(self, columns='*', count=None):
+        self.action = 'select'
+        self.columns = None if columns.strip() == '*' else [c.strip() for c in columns.split(',')]
+        self.count = count
+        return self
+
+    def insert(self, data):
+        self.action = 'insert'
+        self.payload = data if isinstance(data, list) else [data]
+        return self
+
+    def upsert(self, data, on_conflict='id', ignore_duplicates=False):
+        self.action = 'upsert'
+        self.payload = data if isinstance(data, list) else [data]
+        self.on_conflict = [c.strip() for c in on_conflict.split(',')]
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, data):
+        self.action = 'update'
+        self.payload = data
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    # --- filtros ---
+    def _filter(self, predicate):
+        self.filters.append(predicate)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda r: r.get(column) == value)
+
+    def neq(self, column, value):
+        return self._filter(lambda r: r.get(column) != value)
+
+    def gt(self, column, value):
+        return self._filter(lambda r: r.get(column) is not None and r.get(column) > value)
+
+    def gte(self, column, value):
+        return self._filter(lambda r: r.get(column) is not None and r.get(column) >= value)
+
+    def lt(self, column, value):
+        return self._filter(lambda r: r.get(column) is not None and r.get(column) < value)
+
+    def lte(self, column, value):
+        return self._filter(lambda r: r.get(column) is not None and r.get(column) <= value)
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._filter(lambda r: r.get(column) in values)
+
+    def is_(self, column, value):
+        expected = None if value in (None, 'null') else value
+        return self._filter(lambda r: r.get(column) is expected if expected is None else r.get(column) == expected)
+
+    def ilike(self, column, pattern):
+        needle = pattern.strip('%').lower()
+        return self._filter(lambda r: needle in str(r.get(column) or '').lower())
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.max_rows = count
+        return self
+
+    def range(self, start, end):
+        self.offset = start
+        self.max_rows = end - start + 1
+        return self
+
+    # --- execução ---
+    def _matching(self, table):
+        return [r for r in table.rows.values() if all(f(r) for f in self.filters)]
+
+    def _project(self, row):
+        if self.columns is None:
+            return copy.deepcopy(row)
+        return {c: copy.deepcopy(row.get(c)) for c in self.columns}
+
+    def execute(self):
+        self.client.round_trip()
+        with self.client.lock:
+            table = self.client.get_table(self.table)
+            if self.action == 'insert':
+                return FakeResponse([copy.deepcopy(table.insert_row(v)) for v in self.payload])
+            if self.action == 'upsert':
+                result = []
+                for values in self.payload:
+                    if self.on_conflict == ['id']:
+                        existing = table.rows.get(values.get('id'))
+                    else:
+                        key = tuple(values.get(c) for c in self.on_conflict)
+                        existing = next((r for r in table.rows.values()
+                                         if tuple(r.get(c) for c in self.on_conflict) == key), None)
+                    if existing is not None:
+                        # ignore_duplicates: mantém a linha existente e não a devolve (como o PostgREST)
+                        if not self.ignore_duplicates:
+                            existing.update(values)
+                            result.append(copy.deepcopy(existing))
+                    else:
+                        result.append(copy.deepcopy(table.insert_row(values)))
+                return FakeResponse(result)
+            rows = self._matching(table)
+            if self.action == 'update':
+                now = _now_iso()
+                for r in rows:
+                    r.update(self.payload)
+                    if 'updated_at' in r:
+                        r['updated_at'] = now
+                return FakeResponse([copy.deepcopy(r) for r in rows])
+            if self.action == 'delete':
+                for r in rows:
+                    del table.rows[r['id']]
+                return FakeResponse([copy.deepcopy(r) for r in rows])
+
+            total = len(rows)
+            for column, desc in reversed(self.orders):
+                rows.sort(key=lambda r: (r.get(column) is None, r.get(column) if r.get(column) is not None else 0),
+                          reverse=desc)
+            end = None if self.max_rows is None else self.offset + self.max_rows
+            rows = rows[self.offset:end]
+            return FakeResponse([self._project(r) for r in rows], count=total if self.count else None)
+
+
+class FakeBucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def upload(self, path, file, file_options=None):
+        self.client.round_trip()
+        with self.client.lock:
+            self.client.objects[(self.name, path)] = bytes(file)
+        return {'Key': f"{self.name}/{path}"}
+
+    def remove(self, paths):
+        self.client.round_trip()
+        with self.client.lock:
+            for path in paths:
+                self.client.objects.pop((self.name, path), None)
+        return [{'name': p} for p in paths]
+
+    def download(self, path):
+        self.client.round_trip()
+        return self.client.objects[(self.name, path)]
+
+    def list(self, path=None, options=None):
+        self.client.round_trip()
+        prefix = f"{path.rstrip('/')}/" if path else ""
+        return [{'name': p[len(prefix):], 'metadata': {'size': len(data)}}
+                for (bucket, p), data in self.client.objects.items()
+                if bucket == self.name and p.startswith(prefix)]
+
+    def get_public_url(self, path):
+        # Montada localmente pelo supabase-py: não é uma ida ao servidor
+        return f"https://fake.supabase.local/storage/v1/object/public/{self.name}/{path}"
+
+
+class FakeStorage:
+    def __init__(self, client):
+        self.client = client
+
+    def from_(self, bucket):
+        return FakeBucket(self.client, bucket)
+
+
+class FakeSupabaseClient:
+    """
+    Substituto do supabase.Client em memória.
+
+    latency_ms / jitter_ms: tempo simulado de cada ida ao servidor
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tables = {}
+        self.objects = {}
+        self.round_trips = 0
+        self.lock = threading.RLock()
+        self._random = random.Random(seed)
+        self.storage = FakeStorage(self)
+
+    def get_table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = FakeTable(name)
+        return table
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def round_trip(self):
+        with self.lock:
+            self.round_trips += 1
+            delay = self.latency_ms + (self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def reset_counters(self):
+        with self.lock:
+            self.round_trips = 0
+
+    def seed_rows(self, table, rows):
+        """Carrega linhas diretamente, sem latência nem contagem de idas"""
+        with self.lock:
+            t = self.get_table(table)
+            for values in rows:
+                t.insert_row(values)
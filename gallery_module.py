@@ -6,8 +6,19 @@ import flet as ft
 from datetime import datetime
 import base64
 import io
+import mimetypes
 from PIL import Image
 import uuid
+from collections import namedtuple
+from operator import itemgetter
+from timestamps import format_date
+from ui_updates import batch_updates, batched, flush_updates, request_update
+
+# Registro compacto das fotos de um álbum (apenas as colunas usadas na galeria)
+PhotoItem = namedtuple("PhotoItem", "id file_name storage_path description")
+PHOTO_COLUMNS = ", ".join(PhotoItem._fields)
+# photo_count e cover_path (foto mais recente) ficam no próprio álbum: a lista não consulta photos
+ALBUM_COLUMNS = "id, name, description, event_date, photo_count, cover_path"
 
 # ==============================================================================
 # FUNÇÕES DE GALERIA NO DATABASE
@@ -26,27 +37,27 @@ def add_gallery_methods_to_database(db_class):
                 'created_by': created_by
             }
             response = self.supabase.table('albums').insert(data).execute()
+            self._touch('albums')
             return response.data[0] if response.data else None
         except Exception as e:
-            print(f"Erro ao criar álbum: {e}")
+            self._log_error("Erro ao criar álbum", e)
             return None
     
     def get_all_albums(self):
         """Lista todos os álbuns"""
         try:
-            response = self.supabase.table('albums').select('*').order('event_date', desc=True).execute()
-            return response.data if response.data else []
+            return self._select('albums', ALBUM_COLUMNS, order=[('event_date', True)])
         except Exception as e:
-            print(f"Erro ao listar álbuns: {e}")
+            self._log_error("Erro ao listar álbuns", e)
             return []
     
     def get_album_by_id(self, album_id):
         """Busca álbum por ID"""
         try:
-            response = self.supabase.table('albums').select('*').eq('id', album_id).execute()
-            return response.data[0] if response.data else None
+            rows = self._select('albums', filters=[('eq', 'id', album_id)])
+            return rows[0] if rows else None
         except Exception as e:
-            print(f"Erro ao buscar álbum: {e}")
+            self._log_error("Erro ao buscar álbum", e)
             return None
     
     def update_album(self, album_id, name, description, event_date):
@@ -58,9 +69,10 @@ def add_gallery_methods_to_database(db_class):
                 'event_date': event_date
             }
             self.supabase.table('albums').update(data).eq('id', album_id).execute()
+            self._touch('albums')
             return True
         except Exception as e:
-            print(f"Erro ao atualizar álbum: {e}")
+            self._log_error("Erro ao atualizar álbum", e)
             return False
     
     def delete_album(self, album_id):
@@ -70,19 +82,22 @@ def add_gallery_methods_to_database(db_class):
             photos = self.get_photos_by_album(album_id)
             for photo in photos:
                 try:
-                    self.supabase.storage.from_('gallery').remove([photo['storage_path']])
+                    self.supabase.storage.from_('gallery').remove([photo.storage_path])
                 except:
                     pass
             
             # Deletar álbum (cascade vai deletar fotos da tabela)
             self.supabase.table('albums').delete().eq('id', album_id).execute()
+            self._touch('albums')
+            self._touch('photos')
             return True
         except Exception as e:
-            print(f"Erro ao deletar álbum: {e}")
+            self._log_error("Erro ao deletar álbum", e)
             return False
     
-    def add_photo(self, album_id, file_name, file_path, storage_path, description, uploaded_by, file_size):
-        """Adiciona foto ao álbum"""
+    def add_photo(self, album_id, file_name, file_path, storage_path, description, uploaded_by, file_size,
+                  refresh_cover=True):
+        """Adiciona foto ao álbum (refresh_cover=False em lotes: chame refresh_album_cover no final)"""
         try:
             data = {
                 'album_id': album_id,
@@ -94,20 +109,41 @@ def add_gallery_methods_to_database(db_class):
                 'file_size': file_size
             }
             response = self.supabase.table('photos').insert(data).execute()
+            self._touch('photos')
+            if refresh_cover:
+                self.refresh_album_cover(album_id)
             return response.data[0] if response.data else None
         except Exception as e:
-            print(f"Erro ao adicionar foto: {e}")
+            self._log_error("Erro ao adicionar foto", e)
             return None
     
     def get_photos_by_album(self, album_id):
         """Lista fotos de um álbum"""
         try:
-            response = self.supabase.table('photos').select('*').eq('album_id', album_id).order('created_at', desc=True).execute()
-            return response.data if response.data else []
+            rows = self._select('photos', PHOTO_COLUMNS, filters=[('eq', 'album_id', album_id)], order=[('created_at', True)])
+            get = itemgetter(*PhotoItem._fields)
+            return [PhotoItem._make(get(r)) for r in rows]
         except Exception as e:
-            print(f"Erro ao listar fotos: {e}")
+            self._log_error("Erro ao listar fotos", e)
             return []
     
+    def _album_cover(self, album_id):
+        """(quantidade de fotos, storage_path da mais recente) de um álbum em uma consulta"""
+        response = (self.supabase.table('photos').select('storage_path', count='exact')
+                    .eq('album_id', album_id).order('created_at', desc=True).limit(1).execute())
+        return response.count or 0, response.data[0].get('storage_path') if response.data else None
+
+    def refresh_album_cover(self, album_id):
+        """Regrava photo_count e cover_path do álbum depois de incluir/excluir fotos"""
+        try:
+            count, path = self._album_cover(album_id)
+            self.supabase.table('albums').update({'photo_count': count, 'cover_path': path}).eq('id', album_id).execute()
+            self._touch('albums')
+            return True
+        except Exception as e:
+            self._log_error("Erro ao atualizar capa do álbum", e)
+            return False
+    
     def delete_photo(self, photo_id):
         """Deleta foto"""
         try:
@@ -122,10 +158,12 @@ def add_gallery_methods_to_database(db_class):
                     pass
                 # Deletar do banco
                 self.supabase.table('photos').delete().eq('id', photo_id).execute()
+                self._touch('photos')
+                self.refresh_album_cover(photo['album_id'])
                 return True
             return False
         except Exception as e:
-            print(f"Erro ao deletar foto: {e}")
+            self._log_error("Erro ao deletar foto", e)
             return False
     
     def upload_photo_to_storage(self, file_bytes, file_name, album_id):
@@ -149,7 +187,7 @@ def add_gallery_methods_to_database(db_class):
                 'public_url': url
             }
         except Exception as e:
-            print(f"Erro ao fazer upload: {e}")
+            self._log_error("Erro ao fazer upload", e)
             return None
     
     def get_photo_url(self, storage_path):
@@ -157,9 +195,31 @@ def add_gallery_methods_to_database(db_class):
         try:
             return self.supabase.storage.from_('gallery').get_public_url(storage_path)
         except Exception as e:
-            print(f"Erro ao obter URL: {e}")
+            self._log_error("Erro ao obter URL", e)
             return None
     
+    def download_photo(self, storage_path):
+        """Baixa o arquivo de uma foto do Storage (backup)"""
+        try:
+            return self.supabase.storage.from_('gallery').download(storage_path)
+        except Exception as e:
+            self._log_error("Erro ao baixar foto", e)
+            return None
+    
+    def restore_photo(self, storage_path, file_bytes):
+        """Regrava uma foto no mesmo caminho do Storage (restauração de backup)"""
+        try:
+            content_type = mimetypes.guess_type(storage_path)[0] or "image/jpeg"
+            self.supabase.storage.from_('gallery').upload(
+                storage_path,
+                file_bytes,
+                file_options={"content-type": content_type, "upsert": "true"}
+            )
+            return True
+        except Exception as e:
+            self._log_error("Erro ao restaurar foto", e)
+            return False
+    
     # Adicionar métodos à classe
     db_class.create_album = create_album
     db_class.get_all_albums = get_all_albums
@@ -168,9 +228,13 @@ def add_gallery_methods_to_database(db_class):
     db_class.delete_album = delete_album
     db_class.add_photo = add_photo
     db_class.get_photos_by_album = get_photos_by_album
+    db_class._album_cover = _album_cover
+    db_class.refresh_album_cover = refresh_album_cover
     db_class.delete_photo = delete_photo
     db_class.upload_photo_to_storage = upload_photo_to_storage
     db_class.get_photo_url = get_photo_url
+    db_class.download_photo = download_photo
+    db_class.restore_photo = restore_photo
 
 # ==============================================================================
 # VIEW DE GALERIA
@@ -181,9 +245,13 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
     
     current_view = ft.Ref[ft.Column]()
     selected_album = {'id': None}
+    # Tela atual: 'albums', 'album' (fotos) ou 'form' (formulários não são recarregados)
+    screen = {'name': 'albums'}
     
+    @batched
     def show_albums_list(e=None):
         """Mostra lista de álbuns"""
+        screen['name'] = 'albums'
         albums = db.get_all_albums()
         
         album_cards = []
@@ -201,28 +269,23 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
             )
         else:
             for album in albums:
-                # Contar fotos
-                photos_count = len(db.get_photos_by_album(album['id']))
+                photos_count = album.get('photo_count') or 0
+                cover_url = db.get_photo_url(album['cover_path']) if album.get('cover_path') else None
                 
-                # Formatar data
-                event_date = album.get('event_date', '')
-                if event_date:
-                    try:
-                        dt = datetime.fromisoformat(str(event_date))
-                        event_date = dt.strftime("%d/%m/%Y")
-                    except:
-                        pass
+                event_date = format_date(album.get('event_date'))
                 
                 card = ft.Card(
                     content=ft.Container(
                         content=ft.Column([
-                            # Imagem de capa (placeholder por enquanto)
+                            # Imagem de capa (foto mais recente; ícone se o álbum estiver vazio)
                             ft.Container(
-                                content=ft.Icon(ft.Icons.PHOTO_LIBRARY, size=60, color="white"),
+                                content=ft.Image(src=cover_url, fit="cover", width=300, height=150)
+                                if cover_url else ft.Icon(ft.Icons.PHOTO_LIBRARY, size=60, color="white"),
                                 bgcolor="#1976D2",
                                 height=150,
                                 alignment=ft.alignment.Alignment(0, 0),
-                                border_radius=ft.border_radius.BorderRadius(top_left=10, top_right=10, bottom_left=0, bottom_right=0)
+                                border_radius=ft.border_radius.BorderRadius(top_left=10, top_right=10, bottom_left=0, bottom_right=0),
+                                clip_behavior=ft.ClipBehavior.HARD_EDGE
                             ),
                             # Informações
                             ft.Container(
@@ -291,13 +354,16 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
         ], expand=True, scroll="auto")
         
         current_view.current.controls = [content]
-        page.update()
+        request_update(page)
     
+    @batched
     def confirm_delete_album(album_id, album_name):
         """Confirma exclusão de álbum"""
+        @batched
         def delete_confirmed(e):
             dialog.open = False
-            page.update()
+            # O diálogo fecha antes da exclusão (que pode demorar)
+            flush_updates(page)
             
             loading = show_loading(page, "Deletando álbum...")
             
@@ -309,9 +375,10 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
                 hide_loading(page, loading)
                 show_error(page, "Erro ao deletar álbum.")
         
+        @batched
         def cancel_delete(e):
             dialog.open = False
-            page.update()
+            request_update(page)
         
         dialog = ft.AlertDialog(
             title=ft.Text("Confirmar Exclusão"),
@@ -323,14 +390,17 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
         )
         page.overlay.append(dialog)
         dialog.open = True
-        page.update()
+        request_update(page)
     
+    @batched
     def show_create_album_form(e=None):
         """Formulário de criação de álbum"""
+        screen['name'] = 'form'
         album_name = ft.TextField(label="Nome do Álbum *", hint_text="Ex: Culto de Ano Novo 2026")
         album_desc = ft.TextField(label="Descrição", multiline=True, min_lines=2, max_lines=4)
         album_date = ft.TextField(label="Data do Evento", hint_text="DD/MM/AAAA", width=200)
         
+        @batched
         def save_album(e):
             if not album_name.value:
                 show_warning(page, "Preencha o nome do álbum!")
@@ -381,10 +451,12 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
         ], spacing=15, scroll="auto")
         
         current_view.current.controls = [content]
-        page.update()
+        request_update(page)
     
+    @batched
     def show_album_photos(album_id):
         """Mostra fotos de um álbum"""
+        screen['name'] = 'album'
         selected_album['id'] = album_id
         album = db.get_album_by_id(album_id)
         
@@ -411,7 +483,7 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
         else:
             for photo in photos:
                 # Obter URL da foto
-                photo_url = db.get_photo_url(photo['storage_path'])
+                photo_url = db.get_photo_url(photo.storage_path)
                 
                 card = ft.Card(
                     content=ft.Container(
@@ -420,7 +492,7 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
                             ft.Container(
                                 content=ft.Image(
                                     src=photo_url,
-                                    fit=ft.ImageFit.COVER,
+                                    fit="cover",
                                     width=250,
                                     height=250,
                                     error_content=ft.Icon(ft.Icons.BROKEN_IMAGE, size=40)
@@ -433,15 +505,15 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
                             # Info
                             ft.Container(
                                 content=ft.Column([
-                                    ft.Text(photo['file_name'], size=12, weight="bold", max_lines=1, overflow=ft.TextOverflow.ELLIPSIS),
-                                    ft.Text(photo.get('description', ''), size=10, color="grey", max_lines=2),
+                                    ft.Text(photo.file_name, size=12, weight="bold", max_lines=1, overflow=ft.TextOverflow.ELLIPSIS),
+                                    ft.Text(photo.description or '', size=10, color="grey", max_lines=2),
                                     ft.Row([
                                         ft.IconButton(
                                             icon=ft.Icons.DELETE,
                                             icon_color="red",
                                             icon_size=20,
                                             tooltip="Deletar foto",
-                                            on_click=lambda e, pid=photo['id']: delete_photo(pid),
+                                            on_click=lambda e, pid=photo.id: delete_photo(pid),
                                             disabled=readonly
                                         ) if not readonly else ft.Container()
                                     ], alignment="end")
@@ -489,8 +561,9 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
         ], expand=True, scroll="auto")
         
         current_view.current.controls = [content]
-        page.update()
+        request_update(page)
     
+    @batched
     def delete_photo(photo_id):
         """Deleta uma foto"""
         loading = show_loading(page, "Deletando foto...")
@@ -512,8 +585,10 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
                 result.append(os.path.join(root, f))
         return result
     
+    @batched
     def show_upload_form(album_id):
         """Formulário de upload de fotos"""
+        screen['name'] = 'form'
         photo_description = ft.TextField(label="Descrição (opcional)", multiline=True)
         selected_files_text = ft.Text("Nenhum arquivo selecionado", size=12, color="grey")
         progress_text = ft.Text("", size=12, color="blue")
@@ -525,7 +600,7 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
             """Callback de progresso do upload"""
             if e.progress is not None:
                 progress_text.value = f"Enviando {e.file_name}: {int(e.progress * 100)}%"
-                page.update()
+                request_update(page)
         
         async def handle_pick_files(e):
             """Seleciona arquivos usando a API assíncrona"""
@@ -551,13 +626,93 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
                     if upload_button_ref['button']:
                         upload_button_ref['button'].visible = False
                 
-                page.update()
+                request_update(page)
             except Exception as ex:
                 print(f"Erro ao selecionar arquivos: {ex}")
                 import traceback
                 traceback.print_exc()
                 show_error(page, "Erro ao selecionar arquivos.")
         
+        @batched
+        def finish_upload(loading, files_before, description):
+            """Envia ao Supabase os arquivos recebidos pelo Flet (parte síncrona: um envio à tela)"""
+            import os
+            
+            hide_loading(page, loading)
+            
+            # Tirar snapshot depois e encontrar os arquivos novos
+            files_after = set(glob_uploads())
+            new_files = files_after - files_before
+            print(f"Arquivos novos encontrados: {new_files}")
+            
+            if not new_files:
+                show_error(page, "Nenhum arquivo foi salvo pelo Flet após o upload.")
+                return
+            
+            # Enviar os arquivos novos para o Supabase
+            loading = show_loading(page, "Processando fotos no Supabase...")
+            uploaded_count = 0
+            errors = []
+            
+            for file_path in new_files:
+                try:
+                    file_name = os.path.basename(file_path)
+                    
+                    with open(file_path, 'rb') as f:
+                        file_bytes = f.read()
+                    
+                    print(f"✓ Arquivo lido: {file_name} ({len(file_bytes)} bytes)")
+                    
+                    # upload_photo_to_storage gera o nome único internamente
+                    upload_result = db.upload_photo_to_storage(file_bytes, file_name, album_id)
+                    
+                    if upload_result:
+                        db.add_photo(
+                            album_id=album_id,
+                            file_name=file_name,
+                            file_path=upload_result['public_url'],
+                            storage_path=upload_result['storage_path'],
+                            description=description,
+                            uploaded_by=current_user['username'],
+                            file_size=len(file_bytes),
+                            refresh_cover=False
+                        )
+                        uploaded_count += 1
+                        print(f"✓ Upload para Supabase concluído: {file_name}")
+                    else:
+                        errors.append(f"Falha no upload para Supabase: {file_name}")
+                    
+                    # Limpar arquivo temporário
+                    try:
+                        os.remove(file_path)
+                        print(f"✓ Arquivo temporário removido: {file_path}")
+                    except Exception as ex:
+                        print(f"Aviso: Não foi possível remover arquivo temporário: {ex}")
+                        
+                except Exception as ex:
+                    error_msg = f"Erro ao processar {file_path}: {str(ex)}"
+                    print(error_msg)
+                    errors.append(error_msg)
+                    import traceback
+                    traceback.print_exc()
+            
+            # Capa e contagem do álbum: uma vez por lote
+            if uploaded_count:
+                db.refresh_album_cover(album_id)
+            hide_loading(page, loading)
+            progress_text.value = ""
+            
+            if uploaded_count > 0:
+                show_success(page, f"{uploaded_count} foto(s) adicionada(s) com sucesso!")
+                if errors:
+                    print(f"\n⚠ Avisos/Erros: {len(errors)}")
+                    for err in errors[:5]:
+                        print(f"  - {err}")
+                show_album_photos(album_id)
+            else:
+                error_summary = "\n".join(errors[:2])
+                show_error(page, f"Erro ao processar as fotos.\n{error_summary}")
+        
         async def start_upload(description):
             """Inicia o processo de upload"""
             if not selected_files['files']:
@@ -596,84 +751,16 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
                 await selected_files['picker'].upload(upload_list)
                 print("Upload para Flet concluído!")
                 
-                hide_loading(page, loading)
-                
-                # Tirar snapshot depois e encontrar os arquivos novos
-                files_after = set(glob_uploads())
-                new_files = files_after - files_before
-                print(f"Arquivos novos encontrados: {new_files}")
-                
-                if not new_files:
-                    show_error(page, "Nenhum arquivo foi salvo pelo Flet após o upload.")
-                    return
-                
-                # Enviar os arquivos novos para o Supabase
-                loading = show_loading(page, "Processando fotos no Supabase...")
-                uploaded_count = 0
-                errors = []
-                
-                for file_path in new_files:
-                    try:
-                        file_name = os.path.basename(file_path)
-                        
-                        with open(file_path, 'rb') as f:
-                            file_bytes = f.read()
-                        
-                        print(f"✓ Arquivo lido: {file_name} ({len(file_bytes)} bytes)")
-                        
-                        # upload_photo_to_storage gera o nome único internamente
-                        upload_result = db.upload_photo_to_storage(file_bytes, file_name, album_id)
-                        
-                        if upload_result:
-                            db.add_photo(
-                                album_id=album_id,
-                                file_name=file_name,
-                                file_path=upload_result['public_url'],
-                                storage_path=upload_result['storage_path'],
-                                description=description,
-                                uploaded_by=current_user['username'],
-                                file_size=len(file_bytes)
-                            )
-                            uploaded_count += 1
-                            print(f"✓ Upload para Supabase concluído: {file_name}")
-                        else:
-                            errors.append(f"Falha no upload para Supabase: {file_name}")
-                        
-                        # Limpar arquivo temporário
-                        try:
-                            os.remove(file_path)
-                            print(f"✓ Arquivo temporário removido: {file_path}")
-                        except Exception as ex:
-                            print(f"Aviso: Não foi possível remover arquivo temporário: {ex}")
-                            
-                    except Exception as ex:
-                        error_msg = f"Erro ao processar {file_path}: {str(ex)}"
-                        print(error_msg)
-                        errors.append(error_msg)
-                        import traceback
-                        traceback.print_exc()
-                
-                hide_loading(page, loading)
-                progress_text.value = ""
-                
-                if uploaded_count > 0:
-                    show_success(page, f"{uploaded_count} foto(s) adicionada(s) com sucesso!")
-                    if errors:
-                        print(f"\n⚠ Avisos/Erros: {len(errors)}")
-                        for err in errors[:5]:
-                            print(f"  - {err}")
-                    show_album_photos(album_id)
-                else:
-                    error_summary = "\n".join(errors[:2])
-                    show_error(page, f"Erro ao processar as fotos.\n{error_summary}")
+                finish_upload(loading, files_before, description)
                     
             except Exception as ex:
-                hide_loading(page, loading)
-                progress_text.value = ""
                 print(f"Erro geral no upload: {ex}")
                 import traceback
                 traceback.print_exc()
-                show_error(page, f"Erro ao fazer upload: {str(ex)}")
+                with batch_updates():
+                    hide_loading(page, loading)
+                    progress_text.value = ""
+                    show_error(page, f"Erro ao fazer upload: {str(ex)}")
         
         def trigger_upload(e):
             """Wrapper síncrono para chamar a função assíncrona"""
@@ -722,9 +809,17 @@ def gallery_view(page: ft.Page, db, current_user, show_success, show_error, show
         ], spacing=15, scroll="auto")
         
         current_view.current.controls = [content]
-        page.update()
+        request_update(page)
+    
+    @batched
+    def on_show():
+        """Recarrega a tela atual quando a view volta a ser exibida"""
+        if screen['name'] == 'albums':
+            show_albums_list()
+        elif screen['name'] == 'album':
+            show_album_photos(selected_album['id'])
     
     # Inicializar view
-    col = ft.Column(expand=True, ref=current_view)
+    col = ft.Column(expand=True, ref=current_view, data={"on_show": on_show, "tables": ("albums", "photos")})
     show_albums_list()
     return col
\ No newline at end of file
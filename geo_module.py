@@ -0,0 +1,299 @@
+"""
+Módulo de Localização
+Coordenadas por CEP (consulta externa com cache local em SQLite), índice em
+grade das células ativas e encaminhamento de visitantes para a célula mais
+próxima, um a um (edição) ou todos os sem célula de uma vez
+"""
+import heapq
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+GEOCODE_CACHE = os.getenv("IEQ_GEOCODE_CACHE", "geocode_cache.db")
+BRASILAPI_URL = "https://brasilapi.com.br/api/cep/v2"
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "ieq-gestao/2.0"
+# CEP sem coordenadas só é consultado de novo depois deste tempo
+NEGATIVE_TTL = 7 * 86400
+# Política do Nominatim: no máximo uma consulta por segundo
+NOMINATIM_INTERVAL = 1.0
+GEOCODE_WORKERS = 4
+
+# Células por quadrado da grade (em média), lado mínimo e distância máxima para encaminhar (km)
+CELLS_PER_SQUARE = 2
+MIN_GRID_KM = 0.5
+MAX_ASSIGN_KM = float(os.getenv("IEQ_MAX_CELL_KM", "15"))
+KM_PER_DEGREE = 111.32
+
+CellPoint = namedtuple("CellPoint", "id name meeting_day meeting_time latitude longitude")
+CellSuggestion = namedtuple("CellSuggestion", "id name meeting_day meeting_time distance_km")
+AssignSummary = namedtuple("AssignSummary", "assigned no_location too_far")
+CELL_COLUMNS = "id, name, meeting_day, meeting_time, cep, logradouro, cidade, uf"
+
+def clean_cep(cep):
+    return "".join(c for c in str(cep or "") if c.isdigit())
+
+# ==============================================================================
+# GEOCODIFICAÇÃO COM CACHE
+# ==============================================================================
+
+class CepGeocoder:
+    """
+    CEP -> (latitude, longitude). Primeiro a BrasilAPI; sem coordenadas lá,
+    o Nominatim com rua/cidade/UF. Resultados (inclusive "não encontrado")
+    ficam num SQLite local e em memória, então cada CEP vai à rede uma vez.
+    """
+
+    def __init__(self, path=GEOCODE_CACHE):
+        self.lock = threading.Lock()
+        self.nominatim_lock = threading.Lock()
+        self.last_nominatim = 0.0
+        self.memory = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS cep_coords (
+            cep TEXT PRIMARY KEY, latitude REAL, longitude REAL, source TEXT, fetched_at REAL)""")
+
+    def cached(self, cep):
+        """(encontrado, coordenadas): coordenadas None se o CEP não tem localização"""
+        cep = clean_cep(cep)
+        with self.lock:
+            if cep in self.memory:
+                return True, self.memory[cep]
+            row = self.conn.execute("SELECT latitude, longitude, fetched_at FROM cep_coords WHERE cep = ?",
+                                    (cep,)).fetchone()
+        if row is None:
+            return False, None
+        coords = (row[0], row[1]) if row[0] is not None else None
+        if coords is None and time.time() - row[2] > NEGATIVE_TTL:
+            return False, None
+        with self.lock:
+            self.memory[cep] = coords
+        return True, coords
+
+    def lookup(self, cep, street=None, city=None, uf=None):
+        """Coordenadas do CEP (None se não localizado); consulta a rede só sem cache"""
+        cep = clean_cep(cep)
+        if len(cep) != 8:
+            return None
+        found, coords = self.cached(cep)
+        if found:
+            return coords
+        try:
+            source = "brasilapi"
+            coords = self._brasilapi(cep)
+            if coords is None and city:
+                source = "nominatim"
+                coords = self._nominatim(street, city, uf)
+        except Exception as e:
+            # Falha de rede não vai para o cache: tenta de novo na próxima vez
+            print(f"Erro ao localizar CEP {cep}: {e}")
+            return None
+        with self.lock:
+            self.memory[cep] = coords
+            self.conn.execute("INSERT OR REPLACE INTO cep_coords VALUES (?, ?, ?, ?, ?)",
+                              (cep, coords[0] if coords else None, coords[1] if coords else None,
+                               source if coords else None, time.time()))
+        return coords
+
+    def _brasilapi(self, cep):
+        response = requests.get(f"{BRASILAPI_URL}/{cep}", timeout=5)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        point = (response.json().get("location") or {}).get("coordinates") or {}
+        if point.get("latitude") and point.get("longitude"):
+            return float(point["latitude"]), float(point["longitude"])
+        return None
+
+    def _nominatim(self, street, city, uf):
+        with self.nominatim_lock:
+            wait = self.last_nominatim + NOMINATIM_INTERVAL - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                params = {"city": city, "state": uf or "", "country": "Brasil", "format": "json", "limit": 1}
+                if street:
+                    params["street"] = street
+                response = requests.get(NOMINATIM_URL, params=params, headers={"User-Agent": USER_AGENT}, timeout=5)
+                response.raise_for_status()
+                results = response.json()
+                if results:
+                    return float(results[0]["lat"]), float(results[0]["lon"])
+            finally:
+                self.last_nominatim = time.monotonic()
+        return None
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+def get_geocoder():
+    global _geocoder
+    with _geocoder_lock:
+        if _geocoder is None:
+            _geocoder = CepGeocoder()
+    return _geocoder
+
+# ==============================================================================
+# ÍNDICE ESPACIAL
+# ==============================================================================
+
+class CellIndex:
+    """
+    Grade de quadrados sobre as células (coordenadas projetadas em km, válidas
+    na escala de uma cidade), com lado para ~CELLS_PER_SQUARE células por quadrado.
+    A busca percorre anéis de quadrados a partir do ponto e para quando nenhum
+    anel seguinte pode ter célula mais perto.
+    """
+
+    def __init__(self, cells):
+        self.size = len(cells)
+        latitudes = [c.latitude for c in cells]
+        self.cos_lat = math.cos(math.radians(sum(latitudes) / len(latitudes))) if cells else 1.0
+        self.points = [self.project(c.latitude, c.longitude) + (c,) for c in cells]
+        area = 0.0
+        if cells:
+            xs, ys = [p[0] for p in self.points], [p[1] for p in self.points]
+            area = (max(xs) - min(xs)) * (max(ys) - min(ys))
+        self.side = max(MIN_GRID_KM, math.sqrt(area * CELLS_PER_SQUARE / max(self.size, 1)))
+        self.grid = defaultdict(list)
+        for x, y, c in self.points:
+            self.grid[int(x // self.side), int(y // self.side)].append((x, y, c))
+        keys = list(self.grid)
+        self.bounds = (min(k[0] for k in keys), max(k[0] for k in keys),
+                       min(k[1] for k in keys), max(k[1] for k in keys)) if keys else None
+
+    def project(self, latitude, longitude):
+        return longitude * KM_PER_DEGREE * self.cos_lat, latitude * KM_PER_DEGREE
+
+    def nearest(self, latitude, longitude, k=3):
+        """As k células mais próximas: [(distância em km, CellPoint)]"""
+        if not self.size:
+            return []
+        x, y = self.project(latitude, longitude)
+        gx, gy = int(x // self.side), int(y // self.side)
+        min_x, max_x, min_y, max_y = self.bounds
+        # Anéis que não encostam na área ocupada pela grade não têm células
+        first = max(0, gx - max_x, min_x - gx, gy - max_y, min_y - gy)
+        rings = max(abs(gx - min_x), abs(gx - max_x), abs(gy - min_y), abs(gy - max_y))
+        if (2 * rings + 1) ** 2 - (2 * first - 1) ** 2 > 4 * self.size:
+            # Grade esparsa perto do ponto: percorrer todas as células sai mais barato
+            candidates = ((math.hypot(px - x, py - y), c) for px, py, c in self.points)
+            return heapq.nsmallest(k, candidates, key=lambda t: t[0])
+        best = []
+        grid = self.grid
+        for r in range(first, rings + 1):
+            for i in range(max(gx - r, min_x), min(gx + r, max_x) + 1):
+                if i in (gx - r, gx + r):
+                    columns = range(max(gy - r, min_y), min(gy + r, max_y) + 1)
+                else:
+                    columns = (gy - r, gy + r)
+                for j in columns:
+                    for px, py, c in grid.get((i, j), ()):
+                        d = math.hypot(px - x, py - y)
+                        if len(best) < k:
+                            heapq.heappush(best, (-d, c.id, c))
+                        elif d < -best[0][0]:
+                            heapq.heapreplace(best, (-d, c.id, c))
+            # O anel r + 1 fica a pelo menos r * side do ponto
+            if len(best) == k and -best[0][0] <= r * self.side:
+                break
+        return sorted(((-d, c) for d, _, c in best), key=lambda t: t[0])
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# ==============================================================================
+# FUNÇÕES DE LOCALIZAÇÃO NO DATABASE
+# ==============================================================================
+
+def add_geo_methods_to_database(db_class):
+    """Adiciona métodos de célula mais próxima à classe Database"""
+
+    def _cell_index(self):
+        """Índice das células ativas, refeito quando a tabela cells muda"""
+        generation = self._generation('cells')
+        with _indexes_lock:
+            cached = _indexes.get(self.backend_key)
+        if cached and cached[0] == generation:
+            return cached[1]
+        geocoder = get_geocoder()
+        rows = self._select('cells', CELL_COLUMNS, filters=(('eq', 'active', True),))
+        with ThreadPoolExecutor(GEOCODE_WORKERS) as pool:
+            coords = list(pool.map(lambda r: geocoder.lookup(r.get('cep'), r.get('logradouro'), r.get('cidade'),
+                                                             r.get('uf')), rows))
+        index = CellIndex([CellPoint(r['id'], r['name'], r.get('meeting_day'), r.get('meeting_time'), *c)
+                           for r, c in zip(rows, coords) if c])
+        with _indexes_lock:
+            _indexes[self.backend_key] = (generation, index)
+        return index
+
+    def suggest_cells(self, cep, street=None, city=None, uf=None, k=3, cached_only=False):
+        """
+        Células mais próximas do CEP (CellSuggestion, da mais perto). Com
+        cached_only=True não consulta a rede: retorna None se o CEP ainda não foi localizado.
+        """
+        try:
+            geocoder = get_geocoder()
+            if cached_only:
+                found, coords = geocoder.cached(cep)
+                if not found:
+                    return None
+            else:
+                coords = geocoder.lookup(cep, street, city, uf)
+            if not coords:
+                return []
+            return [CellSuggestion(c.id, c.name, c.meeting_day, c.meeting_time, d)
+                    for d, c in self._cell_index().nearest(*coords, k=k)]
+        except Exception as e:
+            self._log_error("Erro ao sugerir célula", e)
+            return []
+
+    def assign_nearest_cells(self, max_km=MAX_ASSIGN_KM, on_progress=None):
+        """
+        Encaminha todos os visitantes sem célula para a célula ativa mais próxima
+        (até max_km). Uma consulta por CEP distinto; um UPDATE por célula e página.
+        """
+        try:
+            index = self._cell_index()
+            geocoder = get_geocoder()
+            assigned = no_location = too_far = 0
+            filters = [('is_', 'cell_id', 'null')]
+            with ThreadPoolExecutor(GEOCODE_WORKERS) as pool:
+                for rows in self.iter_pages('visitors', 'id, cep, logradouro, cidade, uf', filters):
+                    ceps = {clean_cep(r.get('cep')): r for r in rows if len(clean_cep(r.get('cep'))) == 8}
+                    located = dict(zip(ceps, pool.map(
+                        lambda r: geocoder.lookup(r['cep'], r.get('logradouro'), r.get('cidade'), r.get('uf')),
+                        ceps.values())))
+                    by_cell = defaultdict(list)
+                    for r in rows:
+                        coords = located.get(clean_cep(r.get('cep')))
+                        nearest = index.nearest(*coords, k=1) if coords else []
+                        if not nearest:
+                            no_location += 1
+                        elif nearest[0][0] > max_km:
+                            too_far += 1
+                        else:
+                            by_cell[nearest[0][1].id].append(r['id'])
+                    for cell_id, ids in by_cell.items():
+                        self._update_ids('visitors', ids, {'cell_id': cell_id})
+                        assigned += len(ids)
+                    if on_progress:
+                        on_progress(assigned, no_location + too_far)
+            return AssignSummary(assigned, no_location, too_far)
+        except Exception as e:
+            self._log_error("Erro ao encaminhar visitantes", e)
+            return None
+
+    db_class._cell_index = _cell_index
+    db_class.suggest_cells = suggest_cells
+    db_class.assign_nearest_cells = assign_nearest_cells
+
+def format_distance(km):
+    return f"{km * 1000:.0f} m" if km < 1 else f"{km:.1f} km".replace(".", ",")
@@ -0,0 +1,212 @@
+"""
+Teste de carga com várias sessões Flet simultâneas (Supabase em memória)
+
+Cada sessão chama main(page) como o Flet web faz e executa o roteiro:
+login → lista de visitantes → cadastro de visitante → galeria → abrir álbum
+→ upload de fotos. Os handlers reais são encontrados na árvore de controles
+e chamados diretamente, na mesma thread de trabalho que o Flet usaria.
+
+O upload de fotos é exercitado na camada de dados (mesmo laço de
+start_upload), pois o envio de arquivos depende do servidor de upload do Flet.
+
+Uso:
+    python loadtest.py --sessions 50 --concurrency 10 --latency 30
+"""
+import argparse
+import gc
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import flet as ft
+
+from app import Database, count_controls, main, read_flights
+from benchmark import BenchPage, seed_album, seed_users, seed_visitors
+from fake_supabase import FakeSupabaseClient
+
+STEPS = ("abrir_app", "login", "lista_visitantes", "cadastro_visitante", "galeria", "abrir_album", "upload_fotos")
+
+
+class LoadPage(BenchPage):
+    """Página de uma sessão simulada: conta as mensagens enviadas ao navegador"""
+
+    def __init__(self):
+        super().__init__()
+        self.title = None
+        self.theme = None
+        self.window = SimpleNamespace(width=None, height=None)
+        self._lock = threading.Lock()
+
+    def update(self, *controls):
+        # Cada page.update() do Flet web vira uma mensagem no websocket
+        with self._lock:
+            self.updates += 1
+
+# ==============================================================================
+# NAVEGAÇÃO NA ÁRVORE DE CONTROLES
+# ==============================================================================
+
+def iter_controls(page):
+    """Percorre os controles montados na página (controls, content e overlay)"""
+    stack = list(page.controls) + list(page.overlay)
+    while stack:
+        c = stack.pop()
+        if c is None or isinstance(c, str):
+            continue
+        yield c
+        children = getattr(c, "controls", None)
+        if isinstance(children, list):
+            stack.extend(children)
+        stack.append(getattr(c, "content", None))
+
+
+def find(page, predicate, what):
+    for c in iter_controls(page):
+        if predicate(c):
+            return c
+    raise LookupError(f"Controle não encontrado: {what}")
+
+
+def handler_named(name):
+    return lambda c: getattr(getattr(c, "on_click", None), "__name__", None) == name
+
+
+def click(control):
+    control.on_click(SimpleNamespace(control=control, data=None))
+
+
+def go_to(page, label):
+    rail = find(page, lambda c: isinstance(c, ft.NavigationRail), "menu lateral")
+    index = next(i for i, d in enumerate(rail.destinations) if d.label == label)
+    rail.selected_index = index
+    rail.on_change(SimpleNamespace(control=rail, data=None))
+
+# ==============================================================================
+# ROTEIRO DE UMA SESSÃO
+# ==============================================================================
+
+def run_session(session_id, client, photos_per_session, timings):
+    page = LoadPage()
+    db = Database(client=client)
+
+    def step(name, action):
+        start = time.perf_counter()
+        action()
+        elapsed = (time.perf_counter() - start) * 1000
+        with timings["lock"]:
+            timings[name].append(elapsed)
+
+    def login():
+        click(find(page, lambda c: getattr(c, "data", None) == "admin", "aba Sou Voluntário"))
+        find(page, lambda c: isinstance(c, ft.TextField) and c.label == "Usuário", "campo Usuário").value = "admin"
+        find(page, lambda c: isinstance(c, ft.TextField) and c.label == "Senha", "campo Senha").value = "admin123"
+        click(find(page, handler_named("attempt_admin_login"), "botão Entrar"))
+
+    def register_visitor():
+        go_to(page, "Cadastro Visitante")
+        find(page, lambda c: isinstance(c, ft.TextField) and c.label == "Nome *", "campo Nome").value = \
+            f"Visitante carga {session_id}"
+        find(page, lambda c: isinstance(c, ft.TextField) and c.label == "WhatsApp", "campo WhatsApp").value = \
+            f"(11) 98888-{session_id % 10000:04d}"
+        click(find(page, handler_named("save"), "botão Salvar Visitante"))
+
+    def open_album():
+        click(find(page, lambda c: getattr(c, "icon", None) == ft.Icons.VISIBILITY, "botão Ver Fotos"))
+
+    def upload_photos():
+        payload = b"\xff" * 50 * 1024
+        for i in range(photos_per_session):
+            result = db.upload_photo_to_storage(payload, f"s{session_id}_{i}.jpg", 1)
+            db.add_photo(1, f"s{session_id}_{i}.jpg", result['public_url'], result['storage_path'],
+                         "", 'admin', len(payload), refresh_cover=False)
+        db.refresh_album_cover(1)
+
+    step("abrir_app", lambda: main(page, db=db))
+    step("login", login)
+    step("lista_visitantes", lambda: go_to(page, "Lista Visitantes"))
+    step("cadastro_visitante", register_visitor)
+    step("galeria", lambda: go_to(page, "Galeria"))
+    step("abrir_album", open_album)
+    step("upload_fotos", upload_photos)
+    return page
+
+# ==============================================================================
+# EXECUÇÃO E RELATÓRIO
+# ==============================================================================
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Teste de carga multi-sessão do IEQ Gestão")
+    parser.add_argument("--sessions", type=int, default=50, help="total de sessões simuladas")
+    parser.add_argument("--concurrency", type=int, default=10, help="sessões simultâneas")
+    parser.add_argument("--latency", type=float, default=30.0, help="latência por ida ao servidor (ms)")
+    parser.add_argument("--jitter", type=float, default=5.0, help="variação da latência (ms)")
+    parser.add_argument("--visitors", type=int, default=2000, help="visitantes já cadastrados")
+    parser.add_argument("--photos", type=int, default=5, help="fotos enviadas por sessão")
+    args = parser.parse_args()
+
+    client = FakeSupabaseClient(latency_ms=args.latency, jitter_ms=args.jitter, seed=42)
+    seed_users(client)
+    seed_visitors(client, args.visitors)
+    seed_album(client, 20)
+
+    timings = {name: [] for name in STEPS}
+    timings["lock"] = threading.Lock()
+    failures = []
+
+    def guarded(session_id):
+        try:
+            return run_session(session_id, client, args.photos, timings)
+        except Exception as e:
+            failures.append(f"sessão {session_id}: {e!r}")
+            return None
+
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        pages = [p for p in pool.map(guarded, range(args.sessions)) if p is not None]
+    wall = time.perf_counter() - start
+    # As sessões continuam vivas em `pages`: a memória atual é o custo de mantê-las
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    completed = len(pages)
+    messages = sum(p.updates for p in pages)
+    print(f"\n{completed}/{args.sessions} sessões em {wall:.2f} s "
+          f"({completed / wall:.1f} sessões/s, {args.concurrency} simultâneas, "
+          f"latência {args.latency:g} ± {args.jitter:g} ms)")
+    print(f"Idas ao servidor: {client.round_trips}  ·  mensagens (page.update): {messages} "
+          f"({messages / max(completed, 1):.1f}/sessão)")
+    reads = read_flights.executed + read_flights.shared
+    print(f"Leituras compartilhadas (single-flight): {read_flights.shared}/{reads}")
+    if completed:
+        print(f"Memória por sessão: {(current - baseline) / completed / 1024:.0f} KB  ·  "
+              f"pico total: {peak / (1024 * 1024):.1f} MB  ·  "
+              f"controles por sessão: {sum(sum(count_controls(c) for c in p.controls) for p in pages) // completed}")
+
+    header = f"{'etapa':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'máx ms':>10}"
+    print("\n" + header)
+    print("-" * len(header))
+    for name in STEPS:
+        values = timings[name]
+        print(f"{name:<22}{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}"
+              f"{percentile(values, 99):>10.1f}{max(values, default=0):>10.1f}")
+
+    if failures:
+        print(f"\n{len(failures)} falha(s):")
+        for f in failures[:10]:
+            print(f"  - {f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,319 @@
+"""
+Módulo de Métricas
+Instrumentação opcional das chamadas ao Database (latência, volume, erros)
+
+Ativação pelo .env:
+    IEQ_METRICS=1            liga a instrumentação (desligada = nenhum custo)
+    IEQ_SLOW_CALL_MS=500     limite para o log de chamadas lentas
+    IEQ_SLOW_LOG=slow_calls.log
+"""
+import flet as ft
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+from datetime import datetime
+
+METRICS_ENABLED = os.getenv("IEQ_METRICS", "").lower() in ("1", "true", "sim")
+SLOW_CALL_MS = float(os.getenv("IEQ_SLOW_CALL_MS", "500"))
+SLOW_LOG_PATH = os.getenv("IEQ_SLOW_LOG", "slow_calls.log")
+
+# Limites (ms) dos buckets do histograma exportado no formato Prometheus
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Amostras recentes mantidas por método para calcular p50/p95/p99
+RESERVOIR_SIZE = 1024
+
+# ==============================================================================
+# COLETA
+# ==============================================================================
+
+class MethodStats:
+    """Estatísticas acumuladas de um método do Database"""
+    __slots__ = ("calls", "errors", "total_ms", "max_ms", "rows", "bytes", "buckets", "samples")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.samples = deque(maxlen=RESERVOIR_SIZE)
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+def payload_size(result):
+    """Estima (linhas, bytes) do retorno de um método"""
+    if result is None or isinstance(result, bool):
+        return 0, 0
+    rows = len(result) if isinstance(result, list) else 1
+    try:
+        size = len(json.dumps(result, default=str, ensure_ascii=False).encode("utf-8"))
+    except (TypeError, ValueError):
+        size = 0
+    return rows, size
+
+
+class DatabaseMetrics:
+    """Registro de métricas por método, seguro para várias sessões simultâneas"""
+
+    def __init__(self, slow_call_ms=SLOW_CALL_MS, slow_log_path=SLOW_LOG_PATH):
+        self.slow_call_ms = slow_call_ms
+        self.slow_log_path = slow_log_path
+        self.started_at = time.time()
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # --- chamadas em andamento (para associar erros tratados dentro do método) ---
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def record_error(self, error):
+        """Marca a chamada em andamento nesta thread como falha"""
+        stack = self._stack()
+        if stack:
+            stack[-1]["error"] = error
+
+    def record(self, name, elapsed_ms, result, error=None):
+        rows, size = payload_size(result) if error is None else (0, 0)
+        bucket = next((i for i, limit in enumerate(BUCKETS_MS) if elapsed_ms <= limit), len(BUCKETS_MS))
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = MethodStats()
+            stats.calls += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.rows += rows
+            stats.bytes += size
+            stats.buckets[bucket] += 1
+            stats.samples.append(elapsed_ms)
+            if error is not None:
+                stats.errors += 1
+        if elapsed_ms >= self.slow_call_ms:
+            self._log_slow_call(name, elapsed_ms, rows, size, error)
+
+    def _log_slow_call(self, name, elapsed_ms, rows, size, error):
+        entry = {
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "method": name,
+            "ms": round(elapsed_ms, 1),
+            "rows": rows,
+            "bytes": size,
+            "error": str(error) if error is not None else None,
+        }
+        try:
+            with self._lock, open(self.slow_log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Erro ao gravar log de chamadas lentas: {e}")
+
+    def wrap(self, name, func):
+        """Envolve um método do Database medindo cada chamada"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = self._stack()
+            call = {"error": None}
+            stack.append(call)
+            start = time.perf_counter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            except Exception as e:
+                call["error"] = e
+                raise
+            finally:
+                stack.pop()
+                self.record(name, (time.perf_counter() - start) * 1000, result, call["error"])
+        wrapper.__instrumented__ = True
+        return wrapper
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self.started_at = time.time()
+
+    # --- exportação ---
+    def snapshot(self):
+        """Resumo por método, ordenado pelo tempo total gasto"""
+        with self._lock:
+            items = list(self.stats.items())
+            result = []
+            for name, s in items:
+                result.append({
+                    "method": name,
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "avg_ms": round(s.total_ms / s.calls, 2) if s.calls else 0.0,
+                    "p50_ms": round(s.percentile(50), 2),
+                    "p95_ms": round(s.percentile(95), 2),
+                    "p99_ms": round(s.percentile(99), 2),
+                    "max_ms": round(s.max_ms, 2),
+                    "total_ms": round(s.total_ms, 2),
+                    "rows": s.rows,
+                    "bytes": s.bytes,
+                })
+        return sorted(result, key=lambda r: r["total_ms"], reverse=True)
+
+    def to_json(self):
+        return json.dumps({
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "slow_call_ms": self.slow_call_ms,
+            "methods": self.snapshot(),
+        }, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Exporta no formato texto do Prometheus"""
+        lines = [
+            "# HELP ieq_db_calls_total Chamadas ao Database por método",
+            "# TYPE ieq_db_calls_total counter",
+        ]
+        with self._lock:
+            items = sorted(self.stats.items())
+            for name, s in items:
+                lines.append(f'ieq_db_calls_total{{method="{name}"}} {s.calls}')
+            lines += ["# HELP ieq_db_errors_total Chamadas com erro por método",
+                      "# TYPE ieq_db_errors_total counter"]
+            for name, s in items:
+                lines.append(f'ieq_db_errors_total{{method="{name}"}} {s.errors}')
+            lines += ["# HELP ieq_db_rows_total Linhas retornadas por método",
+                      "# TYPE ieq_db_rows_total counter"]
+            for name, s in items:
+                lines.append(f'ieq_db_rows_total{{method="{name}"}} {s.rows}')
+            lines += ["# HELP ieq_db_payload_bytes_total Bytes (estimados) retornados por método",
+                      "# TYPE ieq_db_payload_bytes_total counter"]
+            for name, s in items:
+                lines.append(f'ieq_db_payload_bytes_total{{method="{name}"}} {s.bytes}')
+            lines += ["# HELP ieq_db_call_duration_seconds Latência das chamadas ao Database",
+                      "# TYPE ieq_db_call_duration_seconds histogram"]
+            for name, s in items:
+                cumulative = 0
+                for limit, count in zip(BUCKETS_MS, s.buckets):
+                    cumulative += count
+                    lines.append(f'ieq_db_call_duration_seconds_bucket{{method="{name}",le="{limit / 1000:g}"}} {cumulative}')
+                lines.append(f'ieq_db_call_duration_seconds_bucket{{method="{name}",le="+Inf"}} {s.calls}')
+                lines.append(f'ieq_db_call_duration_seconds_sum{{method="{name}"}} {s.total_ms / 1000:.6f}')
+                lines.append(f'ieq_db_call_duration_seconds_count{{method="{name}"}} {s.calls}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = DatabaseMetrics()
+
+
+def record_db_error(error):
+    """Chamado pelo Database ao tratar uma exceção (sem custo se desligado)"""
+    if METRICS_ENABLED:
+        metrics.record_error(error)
+
+
+def instrument_database(db_class, registry=None, exclude=("table_version",)):
+    """Envolve todos os métodos públicos da classe Database (idempotente)"""
+    registry = registry or metrics
+    for name in dir(db_class):
+        if name.startswith("_") or name in exclude:
+            continue
+        attr = getattr(db_class, name)
+        if not callable(attr) or getattr(attr, "__instrumented__", False):
+            continue
+        # Métodos estáticos/de classe são mantidos como estão
+        if isinstance(db_class.__dict__.get(name), (staticmethod, classmethod)):
+            continue
+        setattr(db_class, name, registry.wrap(name, attr))
+
+# ==============================================================================
+# VIEW DE MÉTRICAS
+# ==============================================================================
+
+def metrics_view(page: ft.Page, db, show_success, show_error, readonly=False):
+    """Tela administrativa com as métricas das chamadas ao banco"""
+    if readonly:
+        return ft.Center(ft.Text("Acesso Negado"))
+
+    if not METRICS_ENABLED:
+        return ft.Container(
+            content=ft.Column([
+                ft.Icon(ft.Icons.INSIGHTS, size=64, color="grey"),
+                ft.Text("Instrumentação desligada.", size=16, color="grey"),
+                ft.Text("Defina IEQ_METRICS=1 no .env e reinicie o sistema.", size=12, color="grey")
+            ], horizontal_alignment="center", spacing=10),
+            padding=40
+        )
+
+    table_column = ft.Column([], scroll="auto", expand=True)
+    summary_text = ft.Text("", size=12, color="grey")
+
+    def refresh(e=None):
+        rows = metrics.snapshot()
+        table_column.controls = [
+            ft.DataTable(
+                columns=[ft.DataColumn(ft.Text(h)) for h in
+                         ("Método", "Chamadas", "Erros", "p50 ms", "p95 ms", "p99 ms", "Linhas", "KB")],
+                rows=[
+                    ft.DataRow(cells=[
+                        ft.DataCell(ft.Text(r["method"])),
+                        ft.DataCell(ft.Text(str(r["calls"]))),
+                        ft.DataCell(ft.Text(str(r["errors"]), color="red" if r["errors"] else None)),
+                        ft.DataCell(ft.Text(f'{r["p50_ms"]:.1f}')),
+                        ft.DataCell(ft.Text(f'{r["p95_ms"]:.1f}')),
+                        ft.DataCell(ft.Text(f'{r["p99_ms"]:.1f}',
+                                            color="orange" if r["p99_ms"] >= metrics.slow_call_ms else None)),
+                        ft.DataCell(ft.Text(str(r["rows"]))),
+                        ft.DataCell(ft.Text(f'{r["bytes"] / 1024:.1f}')),
+                    ]) for r in rows
+                ]
+            )
+        ] if rows else [ft.Text("Nenhuma chamada registrada ainda.", color="grey")]
+        summary_text.value = (f"{sum(r['calls'] for r in rows)} chamada(s) desde "
+                              f"{datetime.fromtimestamp(metrics.started_at).strftime('%d/%m/%Y %H:%M')} "
+                              f"· log de lentas (≥ {metrics.slow_call_ms:g} ms): {metrics.slow_log_path}")
+        page.update()
+
+    def export(fmt):
+        path = "metrics.prom" if fmt == "prometheus" else "metrics.json"
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(metrics.to_prometheus() if fmt == "prometheus" else metrics.to_json())
+            show_success(page, f"Métricas exportadas em {os.path.abspath(path)}")
+        except OSError as ex:
+            print(f"Erro ao exportar métricas: {ex}")
+            show_error(page, "Erro ao exportar métricas.")
+
+    def reset(e):
+        metrics.reset()
+        refresh()
+
+    refresh()
+
+    return ft.Container(
+        content=ft.Column([
+            ft.Row([
+                ft.Text("Métricas do Banco", size=20, weight="bold"),
+                ft.Row([
+                    ft.IconButton(icon=ft.Icons.REFRESH, tooltip="Atualizar", on_click=refresh),
+                    ft.IconButton(icon=ft.Icons.DATA_OBJECT, tooltip="Exportar JSON", on_click=lambda e: export("json")),
+                    ft.IconButton(icon=ft.Icons.INSIGHTS, tooltip="Exportar Prometheus", on_click=lambda e: export("prometheus")),
+                    ft.IconButton(icon=ft.Icons.RESTART_ALT, tooltip="Zerar métricas", on_click=reset),
+                ])
+            ], alignment="spaceBetween"),
+            summary_text,
+            ft.Divider(),
+            table_column
+        ], expand=True, spacing=10),
+        padding=20,
+        expand=True,
+        data={"on_show": refresh}
+    )
@@ -0,0 +1,272 @@
+"""
+Migra o banco SQLite da versão local para o Supabase.
+
+Lê cada tabela com cursores em streaming (por id), grava em lotes com
+upsert([...]) em paralelo e salva um checkpoint a cada lote concluído:
+se a execução for interrompida, basta rodar de novo para continuar.
+No final compara contagens e checksums entre origem e destino.
+
+Uso:
+    python migrate_data.py --sqlite ieq_gestao.db
+    python migrate_data.py --batch 2000 --workers 8
+    python migrate_data.py --verify-only
+    python migrate_data.py --restart          # ignora o checkpoint
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from app import Database, parse_address, address_key, ADDRESS_FIELDS, ADDRESS_KEYS
+
+DEFAULT_SQLITE = "ieq_gestao.db"
+CHECKPOINT_FILE = "migrate_checkpoint.json"
+RETRIES = 3
+
+# Tabela -> colunas do supabase_schema.sql, chave do upsert e colunas comparadas no checksum.
+# users é gravada por username: o schema já cria o admin com id próprio.
+TABLES = {
+    "users": {
+        "columns": ("username", "password", "phone", "is_admin", "permissions", "is_google_auth", "created_at"),
+        "on_conflict": "username",
+        "checksum": ("username", "password", "phone", "is_admin", "permissions", "is_google_auth"),
+    },
+    "visitors": {
+        "columns": ("id", "name", "phone", "email", "address", "date_visit", "observations", "created_at")
+                   + ADDRESS_FIELDS,
+        "on_conflict": "id",
+        "checksum": ("id", "name", "phone", "email", "address", "observations") + ADDRESS_KEYS,
+    },
+    "volunteers": {
+        "columns": ("id", "name", "phone", "email", "address", "role", "department", "hire_date",
+                    "registration_date", "observations", "active", "created_at") + ADDRESS_FIELDS,
+        "on_conflict": "id",
+        "checksum": ("id", "name", "phone", "email", "address", "role", "department", "hire_date",
+                     "observations", "active") + ADDRESS_KEYS,
+    },
+    "cells": {
+        "columns": ("id", "name", "leader_name", "host_name", "address", "meeting_day", "meeting_time",
+                    "observations", "active", "created_at") + ADDRESS_FIELDS,
+        "on_conflict": "id",
+        "checksum": ("id", "name", "leader_name", "host_name", "address", "meeting_day", "meeting_time",
+                     "observations", "active") + ADDRESS_KEYS,
+    },
+}
+BOOLEAN_COLUMNS = {"is_admin", "is_google_auth", "active"}
+
+# ==============================================================================
+# CHECKPOINT
+# ==============================================================================
+
+def load_checkpoint(path, source):
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("source") == os.path.abspath(source):
+            return state
+        print(f"Checkpoint de outra origem ({state.get('source')}): começando do zero")
+    return {"source": os.path.abspath(source), "tables": {}}
+
+
+def save_checkpoint(path, state):
+    # Grava em arquivo temporário e troca: uma interrupção nunca deixa o checkpoint pela metade
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+# ==============================================================================
+# LEITURA E CONVERSÃO
+# ==============================================================================
+
+def source_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def transform_row(table, row, available):
+    """Linha do SQLite (sqlite3.Row) -> dict no formato do Supabase"""
+    data = {}
+    for column in TABLES[table]["columns"]:
+        if column == "id" and table == "users":
+            continue
+        value = row[column] if column in available else None
+        if column in BOOLEAN_COLUMNS and value is not None:
+            value = bool(value)
+        elif column == "permissions":
+            value = json.loads(value) if isinstance(value, str) and value else (value or {})
+        data[column] = value
+    # Bancos antigos só têm o texto do endereço: separa nas colunas estruturadas
+    if "address" in data and not any(data.get(f) for f in ADDRESS_FIELDS):
+        parts = parse_address(data["address"])
+        for f in ADDRESS_FIELDS:
+            data[f] = parts[f] or None
+    # Chaves do filtro por bairro: sempre recalculadas (a origem pode não tê-las)
+    if "cidade" in data:
+        data["cidade_key"] = address_key(data["cidade"])
+        data["bairro_key"] = address_key(data["bairro"])
+    # Colunas ausentes na origem ficam com o padrão do banco (mesmas chaves em todo o lote)
+    return {k: v for k, v in data.items() if k in available or k in ADDRESS_FIELDS or k in ADDRESS_KEYS}
+
+
+def iter_batches(conn, table, after_id, batch_size):
+    """Lotes de linhas com id > after_id, lidos do cursor sem carregar a tabela"""
+    available = source_columns(conn, table)
+    cursor = conn.execute(f"SELECT * FROM {table} WHERE id > ? ORDER BY id", (after_id,))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows[-1]["id"], [transform_row(table, r, available) for r in rows]
+
+# ==============================================================================
+# MIGRAÇÃO
+# ==============================================================================
+
+def upsert_with_retry(db, table, rows):
+    on_conflict = TABLES[table]["on_conflict"]
+    for attempt in range(RETRIES):
+        if db.upsert_rows(table, rows, on_conflict=on_conflict):
+            return len(rows)
+        time.sleep(2 ** attempt)
+    raise RuntimeError(f"Falha ao gravar lote de {len(rows)} linha(s) em {table}")
+
+
+def migrate_table(db, conn, table, state, checkpoint_path, batch_size, workers):
+    """
+    Migra uma tabela com até `workers` lotes em voo.
+
+    O checkpoint só avança até o último lote concluído em sequência:
+    lotes terminados fora de ordem esperam os anteriores.
+    """
+    progress = state["tables"].setdefault(table, {"last_id": 0, "rows": 0, "done": False})
+    if progress["done"]:
+        print(f"{table}: já migrada ({progress['rows']} linha(s))")
+        return
+    total = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE id > ?", (progress["last_id"],)).fetchone()[0]
+    print(f"{table}: {total} linha(s) a migrar a partir do id {progress['last_id']}")
+
+    start = time.perf_counter()
+    pending = deque()
+
+    def complete_head():
+        last_id, future = pending.popleft()
+        progress["rows"] += future.result()
+        progress["last_id"] = last_id
+        save_checkpoint(checkpoint_path, state)
+        elapsed = time.perf_counter() - start
+        print(f"  {table}: até id {last_id} ({progress['rows']} linha(s), "
+              f"{progress['rows'] / max(elapsed, 1e-6):.0f} linhas/s)", end="\r")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for last_id, rows in iter_batches(conn, table, progress["last_id"], batch_size):
+            pending.append((last_id, pool.submit(upsert_with_retry, db, table, rows)))
+            while pending and (pending[0][1].done() or len(pending) > workers * 2):
+                complete_head()
+        while pending:
+            complete_head()
+
+    progress["done"] = True
+    save_checkpoint(checkpoint_path, state)
+    print(f"\n{table}: concluída em {time.perf_counter() - start:.1f} s")
+
+# ==============================================================================
+# VERIFICAÇÃO
+# ==============================================================================
+
+def _canonical(value):
+    if value is None or value == "":
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return str(value)
+
+
+def row_digest(row, columns):
+    text = "\x1f".join(_canonical(row.get(c)) for c in columns)
+    return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "big")
+
+
+def checksum_columns(conn, table):
+    """Colunas comparadas que existem na origem (as demais ficam com o padrão do banco)"""
+    available = source_columns(conn, table) | set(ADDRESS_KEYS)
+    return tuple(c for c in TABLES[table]["checksum"] if c in available)
+
+
+def source_checksum(conn, table, columns):
+    """(linhas, soma dos hashes): a soma não depende da ordem de leitura"""
+    count = checksum = 0
+    for _, rows in iter_batches(conn, table, 0, 5000):
+        for row in rows:
+            count += 1
+            checksum = (checksum + row_digest(row, columns)) % (1 << 64)
+    return count, checksum
+
+
+def target_checksum(db, table, columns):
+    select = ", ".join(("id",) + tuple(c for c in columns if c != "id"))
+    count = checksum = 0
+    for rows in db.iter_pages(table, select, page_size=1000):
+        for row in rows:
+            count += 1
+            checksum = (checksum + row_digest(row, columns)) % (1 << 64)
+    return count, checksum
+
+
+def verify(db, conn, tables):
+    ok = True
+    print("\nVerificação (contagem e checksum):")
+    for table in tables:
+        columns = checksum_columns(conn, table)
+        src = source_checksum(conn, table, columns)
+        dst = target_checksum(db, table, columns)
+        status = "OK" if src == dst else "DIVERGENTE"
+        ok = ok and src == dst
+        print(f"  {table:<12} origem {src[0]:>8} linha(s) {src[1]:016x}  "
+              f"destino {dst[0]:>8} linha(s) {dst[1]:016x}  {status}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migração SQLite → Supabase do IEQ Gestão")
+    parser.add_argument("--sqlite", default=DEFAULT_SQLITE, help="arquivo do banco SQLite de origem")
+    parser.add_argument("--tables", default=",".join(TABLES), help="tabelas a migrar, separadas por vírgula")
+    parser.add_argument("--batch", type=int, default=1000, help="linhas por upsert")
+    parser.add_argument("--workers", type=int, default=4, help="lotes gravados em paralelo")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="arquivo de checkpoint")
+    parser.add_argument("--restart", action="store_true", help="ignora o checkpoint e migra tudo de novo")
+    parser.add_argument("--verify-only", action="store_true", help="apenas compara origem e destino")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.sqlite):
+        raise SystemExit(f"Banco SQLite não encontrado: {args.sqlite}")
+
+    conn = sqlite3.connect(args.sqlite, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    tables = [t for t in args.tables.split(",") if t]
+    for t in [t for t in tables if t not in existing]:
+        print(f"{t}: não existe no SQLite, ignorada")
+    tables = [t for t in tables if t in existing and t in TABLES]
+
+    db = Database()
+    if not args.verify_only:
+        if args.restart and os.path.exists(args.checkpoint):
+            os.remove(args.checkpoint)
+        state = load_checkpoint(args.checkpoint, args.sqlite)
+        for table in tables:
+            migrate_table(db, conn, table, state, args.checkpoint, args.batch, args.workers)
+        print("\nAjuste as sequências de id no SQL Editor do Supabase:")
+        for table in tables:
+            if table != "users":
+                print(f"  SELECT setval('{table}_id_seq', (SELECT COALESCE(MAX(id), 1) FROM {table}));")
+
+    if not verify(db, conn, tables):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Hash de senhas
+
+argon2id (pacote argon2-cffi) e, na falta dele, scrypt da biblioteca padrão.
+Senhas antigas gravadas em texto puro continuam entrando e são convertidas
+no primeiro login (needs_rehash).
+
+O cálculo do hash é caro de propósito: roda em um pool limitado de threads
+(as duas bibliotecas liberam o GIL), para que vários logins simultâneos não
+disputem CPU e memória sem limite. Custos ajustáveis por variáveis de ambiente;
+para escolher valores para um tempo alvo:
+
+    python passwords.py --calibrate 250
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import InvalidHashError, VerificationError
+except ImportError:
+    PasswordHasher = None
+
+# Custos (padrões da recomendação OWASP para argon2id: 19 MiB, t=2, p=1)
+ARGON2_TIME_COST = int(os.getenv("IEQ_ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_KB = int(os.getenv("IEQ_ARGON2_MEMORY_KB", "19456"))
+ARGON2_PARALLELISM = int(os.getenv("IEQ_ARGON2_PARALLELISM", "1"))
+SCRYPT_LOG_N = int(os.getenv("IEQ_SCRYPT_LOG_N", "14"))
+SCRYPT_R = 8
+SCRYPT_P = 1
+# Hashes calculados ao mesmo tempo no processo
+HASH_WORKERS = int(os.getenv("IEQ_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+_argon2 = (PasswordHasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_KB,
+                          parallelism=ARGON2_PARALLELISM) if PasswordHasher else None)
+_dummy_hash = None
+
+# ==============================================================================
+# SCRYPT ($scrypt$ln=14,r=8,p=1$<salt>$<hash>)
+# ==============================================================================
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip("=")
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+def _scrypt(password, salt, log_n, r, p):
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=1 << log_n, r=r, p=p,
+                          maxmem=256 * r * (1 << log_n) + (1 << 20), dklen=32)
+
+def _scrypt_hash(password, log_n=SCRYPT_LOG_N):
+    salt = secrets.token_bytes(16)
+    digest = _scrypt(password, salt, log_n, SCRYPT_R, SCRYPT_P)
+    return f"$scrypt$ln={log_n},r={SCRYPT_R},p={SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+def _scrypt_params(stored):
+    _, _, params, salt, digest = stored.split("$")
+    values = dict(item.split("=") for item in params.split(","))
+    return int(values["ln"]), int(values["r"]), int(values["p"]), _unb64(salt), _unb64(digest)
+
+def _scrypt_verify(stored, password):
+    try:
+        log_n, r, p, salt, digest = _scrypt_params(stored)
+    except (ValueError, KeyError):
+        return False, False
+    ok = hmac.compare_digest(_scrypt(password, salt, log_n, r, p), digest)
+    # Com argon2 disponível, ou custo diferente do atual, o hash é refeito no login
+    return ok, ok and (_argon2 is not None or (log_n, r, p) != (SCRYPT_LOG_N, SCRYPT_R, SCRYPT_P))
+
+# ==============================================================================
+# API
+# ==============================================================================
+
+def _hash(password):
+    if _argon2:
+        return _argon2.hash(password)
+    return _scrypt_hash(password)
+
+def _verify(stored, password):
+    global _dummy_hash
+    if not stored:
+        # Usuário inexistente: mesmo custo de uma verificação real (não revela quem existe)
+        if _dummy_hash is None:
+            _dummy_hash = _hash(secrets.token_hex(8))
+        _verify(_dummy_hash, password)
+        return False, False
+    if stored.startswith("$argon2"):
+        if not _argon2:
+            raise RuntimeError("Senha com hash argon2: instale o pacote argon2-cffi")
+        try:
+            _argon2.verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False, False
+        return True, _argon2.check_needs_rehash(stored)
+    if stored.startswith("$scrypt$"):
+        return _scrypt_verify(stored, password)
+    # Texto puro (cadastros anteriores ao hash)
+    ok = hmac.compare_digest(stored.encode("utf-8"), password.encode("utf-8"))
+    return ok, ok
+
+def hash_password(password):
+    """Hash para gravar no banco (calculado no pool de hashing)"""
+    return _pool.submit(_hash, password).result()
+
+def verify_password(stored, password):
+    """Confere a senha no pool de hashing; retorna (confere, precisa_refazer_hash)"""
+    return _pool.submit(_verify, stored, password or "").result()
+
+# ==============================================================================
+# CALIBRAÇÃO
+# ==============================================================================
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+def calibrate(target_ms):
+    """Menor custo cujo hash leva pelo menos target_ms nesta máquina"""
+    if PasswordHasher:
+        for time_cost in range(1, 64):
+            hasher = PasswordHasher(time_cost=time_cost, memory_cost=ARGON2_MEMORY_KB, parallelism=ARGON2_PARALLELISM)
+            elapsed = _timed(lambda: hasher.hash("calibracao"))
+            if elapsed >= target_ms:
+                break
+        return {"IEQ_ARGON2_TIME_COST": time_cost, "IEQ_ARGON2_MEMORY_KB": ARGON2_MEMORY_KB}, elapsed
+    for log_n in range(12, 22):
+        elapsed = _timed(lambda: _scrypt_hash("calibracao", log_n))
+        if elapsed >= target_ms:
+            break
+    return {"IEQ_SCRYPT_LOG_N": log_n}, elapsed
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Ajuste do custo do hash de senhas")
+    parser.add_argument("--calibrate", type=float, metavar="MS", required=True, help="tempo alvo por hash (ms)")
+    args = parser.parse_args()
+    settings, elapsed = calibrate(args.calibrate)
+    print(f"{'argon2id' if PasswordHasher else 'scrypt'}: {elapsed:.0f} ms por hash. Coloque no .env:")
+    for name, value in settings.items():
+        print(f"{name}={value}")
+    print(f"Com {HASH_WORKERS} hash(es) simultâneo(s) (IEQ_HASH_WORKERS): "
+          f"~{HASH_WORKERS * 1000 / max(elapsed, 1):.0f} logins/s")
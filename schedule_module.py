@@ -0,0 +1,617 @@
+"""
+Módulo de Escalas
+Escala mensal dos ministérios (Louvor, Infantil, Mídia) gerada a partir das
+vagas de cada culto, do departamento/função dos voluntários e das datas de
+indisponibilidade. Guloso (vagas mais difíceis primeiro) + busca local para
+equilibrar a carga; só as diferenças são gravadas em rota_assignments.
+"""
+import flet as ft
+import time
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timedelta
+
+ROTA_DEPARTMENTS = ("Louvor", "Infantil", "Mídia")
+# Vagas padrão de um culto: "Departamento" ou "Departamento/Função" -> quantidade
+DEFAULT_NEEDS = {"Louvor": 5, "Infantil": 3, "Mídia": 2}
+# Limite rígido de escalas por voluntário no mês
+MAX_PER_MONTH = 4
+# Duas escalas a até REST_DAYS dias uma da outra pesam REST_PENALTY no custo
+REST_DAYS = 6
+REST_PENALTY = 3
+# Tempo máximo da busca local (o guloso sempre termina)
+SEARCH_BUDGET = 0.5
+ROTA_CHUNK = 500
+
+WEEKDAYS = ("Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom")
+
+Service = namedtuple("Service", "id name service_date service_time needs")
+RotaEntry = namedtuple("RotaEntry", "service_id position volunteer_id volunteer_name")
+# slots = vagas do mês; inserted/removed = linhas gravadas/apagadas; seconds = tempo do solver
+RotaResult = namedtuple("RotaResult", "slots filled inserted removed seconds")
+Slot = namedtuple("Slot", "service_id day position")
+
+def parse_need(position):
+    """'Louvor/Baterista' -> ('Louvor', 'baterista'); 'Louvor' -> ('Louvor', None)"""
+    department, _, role = position.partition("/")
+    return department.strip(), role.strip().casefold() or None
+
+def parse_month(text):
+    """'mm/aaaa' -> 'aaaa-mm' (None se inválido)"""
+    try:
+        return datetime.strptime(text.strip(), "%m/%Y").strftime("%Y-%m")
+    except (ValueError, AttributeError):
+        return None
+
+def month_bounds(month):
+    """'aaaa-mm' -> (primeiro dia, último dia) em 'aaaa-mm-dd'"""
+    first = date.fromisoformat(month + "-01")
+    last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return first.isoformat(), last.isoformat()
+
+# ==============================================================================
+# SOLVER
+# ==============================================================================
+
+class RotaSolver:
+    """
+    Uma vaga por (culto, posição, n). Restrições rígidas: departamento/função,
+    indisponibilidade, uma escala por dia e MAX_PER_MONTH. Custo a minimizar:
+    soma dos quadrados das cargas (equilíbrio) + REST_PENALTY por par de
+    escalas próximas do mesmo voluntário.
+    """
+
+    def __init__(self, services, volunteers, unavailable, seed=0, max_per_month=MAX_PER_MONTH):
+        """
+        services: [{'id', 'service_date', 'needs'}]; volunteers: [{'id', 'department', 'role'}]
+        unavailable: {(volunteer_id, 'aaaa-mm-dd')}
+        """
+        self.max_per_month = max_per_month
+        groups = defaultdict(list)
+        for v in volunteers:
+            groups[v.get('department'), None].append(v['id'])
+            role = (v.get('role') or '').strip().casefold()
+            if role:
+                groups[v.get('department'), role].append(v['id'])
+        # Desempate que muda de mês para mês (ninguém fica sempre no fim da fila)
+        self.rank = {v['id']: (v['id'] * 2654435761 + seed) & 0xFFFFFFFF for v in volunteers}
+        self.slots = []
+        self.candidates = []
+        self.candidate_sets = []
+        self.by_position = defaultdict(list)
+        shared = {}
+        for s in services:
+            day = date.fromisoformat(str(s['service_date'])[:10])
+            iso = day.isoformat()
+            for position, quantity in sorted((s.get('needs') or {}).items()):
+                group = groups.get(parse_need(position), ())
+                candidates = tuple(v for v in group if (v, iso) not in unavailable)
+                candidate_set = shared.setdefault(candidates, frozenset(candidates))
+                for _ in range(int(quantity or 0)):
+                    self.by_position[position].append(len(self.slots))
+                    self.slots.append(Slot(s['id'], day.toordinal(), position))
+                    self.candidates.append(candidates)
+                    self.candidate_sets.append(candidate_set)
+        self.assigned = [None] * len(self.slots)
+        self.days = defaultdict(set)
+
+    def feasible(self, vid, day):
+        days = self.days.get(vid, ())
+        return day not in days and len(days) < self.max_per_month
+
+    def close(self, vid, day, skip=None):
+        """Escalas do voluntário a até REST_DAYS dias de day (sem contar skip)"""
+        return sum(1 for d in self.days.get(vid, ()) if d != skip and abs(d - day) <= REST_DAYS)
+
+    def add_cost(self, vid, day):
+        return 2 * len(self.days.get(vid, ())) + 1 + REST_PENALTY * self.close(vid, day)
+
+    def remove_saving(self, vid, day):
+        return 2 * len(self.days[vid]) - 1 + REST_PENALTY * self.close(vid, day, skip=day)
+
+    def assign(self, index, vid):
+        self.assigned[index] = vid
+        self.days[vid].add(self.slots[index].day)
+
+    def unassign(self, index):
+        vid = self.assigned[index]
+        self.assigned[index] = None
+        self.days[vid].discard(self.slots[index].day)
+
+    def keep(self, rows):
+        """
+        Fixa as escalas já gravadas que continuam válidas; devolve as linhas que
+        não cabem mais (voluntário indisponível, vaga extinta, limite estourado)
+        """
+        free = defaultdict(list)
+        for index, slot in enumerate(self.slots):
+            free[slot.service_id, slot.position].append(index)
+        dropped = []
+        for row in sorted(rows, key=lambda r: r['id']):
+            indexes = free.get((row['service_id'], row['position']))
+            vid = row['volunteer_id']
+            if indexes and vid in self.candidate_sets[indexes[-1]] and self.feasible(vid, self.slots[indexes[-1]].day):
+                self.assign(indexes.pop(), vid)
+            else:
+                dropped.append(row)
+        return dropped
+
+    def greedy(self, indexes):
+        """Preenche as vagas com menos candidatos primeiro, sempre pelo menor custo"""
+        for index in sorted(indexes, key=lambda i: (len(self.candidates[i]), self.slots[i].day)):
+            if self.assigned[index] is not None:
+                continue
+            day = self.slots[index].day
+            best, best_key = None, None
+            for vid in self.candidates[index]:
+                days = self.days.get(vid, ())
+                # 2 * carga + 1 é o menor custo possível: pula sem calcular o descanso
+                if best_key and 2 * len(days) + 1 > best_key[0] or not self.feasible(vid, day):
+                    continue
+                key = (self.add_cost(vid, day), self.rank[vid])
+                if best_key is None or key < best_key:
+                    best, best_key = vid, key
+            if best is not None:
+                self.assign(index, best)
+
+    def improve(self, indexes, deadline, swaps=True):
+        """
+        Busca local até não haver melhora (ou acabar o tempo): troca o escalado
+        de uma vaga por outro candidato mais barato e, com swaps, permuta dois
+        voluntários da mesma posição em cultos diferentes para espaçar as escalas
+        """
+        improved = True
+        while improved:
+            improved = False
+            for count, index in enumerate(indexes):
+                if count % 64 == 0 and time.perf_counter() > deadline:
+                    return
+                vid = self.assigned[index]
+                if vid is None:
+                    continue
+                day = self.slots[index].day
+                saving = self.remove_saving(vid, day)
+                best, best_cost = None, saving
+                for other in self.candidates[index]:
+                    days = self.days.get(other, ())
+                    # 2 * carga + 1 é o menor custo possível: só olha o descanso se ainda pode ganhar
+                    if 2 * len(days) + 1 >= best_cost or other == vid or not self.feasible(other, day):
+                        continue
+                    cost = self.add_cost(other, day)
+                    if cost < best_cost:
+                        best, best_cost = other, cost
+                if best is not None:
+                    self.unassign(index)
+                    self.assign(index, best)
+                    improved = True
+                elif swaps and saving > 2 * len(self.days[vid]) - 1 and self._swap(index):
+                    improved = True
+            # Vagas que ficaram sem ninguém podem caber agora
+            if improved:
+                self.greedy([i for i in indexes if self.assigned[i] is None])
+
+    def _swap(self, index):
+        a, slot = self.assigned[index], self.slots[index]
+        current = self.close(a, slot.day, skip=slot.day)
+        # Ganho de a por dia de destino (poucos dias distintos no mês)
+        gains = {}
+        for other in self.by_position[slot.position]:
+            b, other_day = self.assigned[other], self.slots[other].day
+            if b is None or b == a or other_day == slot.day or other_day in self.days[a]:
+                continue
+            gain = gains.get(other_day)
+            if gain is None:
+                gain = gains[other_day] = self.close(a, other_day, skip=slot.day) - current
+            if (gain >= 0 or slot.day in self.days[b] or a not in self.candidate_sets[other]
+                    or b not in self.candidate_sets[index]):
+                continue
+            if gain + self.close(b, slot.day, skip=other_day) - self.close(b, other_day, skip=other_day) < 0:
+                self.unassign(index)
+                self.unassign(other)
+                self.assign(index, b)
+                self.assign(other, a)
+                return True
+        return False
+
+    def solve(self, indexes=None, budget=SEARCH_BUDGET):
+        """Resolve as vagas indicadas (todas, se None); com indexes, só elas mudam"""
+        incremental = indexes is not None
+        indexes = list(range(len(self.slots))) if indexes is None else list(indexes)
+        self.greedy(indexes)
+        self.improve(indexes, time.perf_counter() + budget, swaps=not incremental)
+
+    def result(self):
+        """Multiconjunto desejado de (culto, posição, voluntário)"""
+        return [(s.service_id, s.position, v) for s, v in zip(self.slots, self.assigned) if v is not None]
+
+# ==============================================================================
+# FUNÇÕES DE ESCALA NO DATABASE
+# ==============================================================================
+
+def add_schedule_methods_to_database(db_class):
+    """Adiciona métodos de cultos, indisponibilidade e escalas à classe Database"""
+
+    def get_services(self, month):
+        """Cultos do mês ('aaaa-mm') em ordem de data"""
+        try:
+            first, last = month_bounds(month)
+            rows = self._select('services', 'id, name, service_date, service_time, needs',
+                                filters=(('gte', 'service_date', first), ('lte', 'service_date', last)),
+                                order=(('service_date', False), ('service_time', False)))
+            return [Service(r['id'], r['name'], str(r['service_date'])[:10], r.get('service_time') or '',
+                            r.get('needs') or {}) for r in rows]
+        except Exception as e:
+            self._log_error("Erro ao listar cultos", e)
+            return []
+
+    def add_service(self, name, service_date, service_time="", needs=None):
+        try:
+            self.supabase.table('services').insert({
+                'name': name, 'service_date': service_date, 'service_time': service_time,
+                'needs': dict(DEFAULT_NEEDS if needs is None else needs),
+            }).execute()
+            self._touch('services')
+            return True
+        except Exception as e:
+            self._log_error("Erro ao adicionar culto", e)
+            return False
+
+    def delete_service(self, service_id):
+        """Remove o culto (as escalas dele saem junto)"""
+        try:
+            self.supabase.table('rota_assignments').delete().eq('service_id', service_id).execute()
+            self.supabase.table('services').delete().eq('id', service_id).execute()
+            self._touch('rota_assignments')
+            self._touch('services')
+            return True
+        except Exception as e:
+            self._log_error("Erro ao remover culto", e)
+            return False
+
+    def create_month_services(self, month, weekday=6, service_time="19:00", name="Culto de Domingo", needs=None):
+        """Cria um culto em cada dia da semana (6 = domingo) do mês que ainda não tenha; retorna quantos"""
+        try:
+            first, last = month_bounds(month)
+            existing = {(s.service_date, s.name) for s in self.get_services(month)}
+            day, end = date.fromisoformat(first), date.fromisoformat(last)
+            day += timedelta(days=(weekday - day.weekday()) % 7)
+            rows = []
+            while day <= end:
+                if (day.isoformat(), name) not in existing:
+                    rows.append({'name': name, 'service_date': day.isoformat(), 'service_time': service_time,
+                                 'needs': dict(DEFAULT_NEEDS if needs is None else needs)})
+                day += timedelta(days=7)
+            if rows:
+                self.supabase.table('services').insert(rows).execute()
+                self._touch('services')
+            return len(rows)
+        except Exception as e:
+            self._log_error("Erro ao criar cultos do mês", e)
+            return None
+
+    def set_unavailable(self, volunteer_id, day, unavailable=True):
+        """
+        Marca (ou desmarca) a indisponibilidade de um voluntário num dia e ajusta
+        a escala daquele mês de forma incremental. Retorna o RotaResult ou None.
+        """
+        try:
+            table = self.supabase.table('volunteer_unavailability')
+            if unavailable:
+                table.upsert({'volunteer_id': volunteer_id, 'unavailable_date': day},
+                             on_conflict='volunteer_id,unavailable_date', ignore_duplicates=True).execute()
+            else:
+                table.delete().eq('volunteer_id', volunteer_id).eq('unavailable_date', day).execute()
+            self._touch('volunteer_unavailability')
+        except Exception as e:
+            self._log_error("Erro ao registrar indisponibilidade", e)
+            return None
+        return self.generate_rota(day[:7], incremental=True)
+
+    def get_unavailable_days(self, volunteer_id, month):
+        try:
+            first, last = month_bounds(month)
+            rows = self._select('volunteer_unavailability', 'unavailable_date',
+                                filters=(('eq', 'volunteer_id', volunteer_id), ('gte', 'unavailable_date', first),
+                                         ('lte', 'unavailable_date', last)), order=(('unavailable_date', False),))
+            return [str(r['unavailable_date'])[:10] for r in rows]
+        except Exception as e:
+            self._log_error("Erro ao buscar indisponibilidade", e)
+            return []
+
+    def generate_rota(self, month, incremental=False):
+        """
+        Gera a escala do mês. incremental=True mantém todas as escalas ainda
+        válidas e só preenche as vagas abertas (após mudar uma indisponibilidade
+        ou as vagas de um culto); senão refaz o mês todo. Nos dois casos grava
+        só a diferença. Retorna RotaResult ou None.
+        """
+        try:
+            first, last = month_bounds(month)
+            services = self._select('services', 'id, service_date, needs',
+                                    filters=(('gte', 'service_date', first), ('lte', 'service_date', last)))
+            positions = {p for s in services for p in (s.get('needs') or {})}
+            departments = tuple(sorted({parse_need(p)[0] for p in positions}))
+            volunteers = []
+            if departments:
+                filters = [('eq', 'active', True), ('in_', 'department', departments)]
+                for rows in self.iter_pages('volunteers', 'id, role, department', filters):
+                    volunteers.extend(rows)
+            unavailable = {(r['volunteer_id'], str(r['unavailable_date'])[:10]) for r in self._select(
+                'volunteer_unavailability', 'volunteer_id, unavailable_date',
+                filters=(('gte', 'unavailable_date', first), ('lte', 'unavailable_date', last)))}
+            existing = self._rota_rows([s['id'] for s in services])
+
+            start = time.perf_counter()
+            solver = RotaSolver(services, volunteers, unavailable, seed=date.fromisoformat(first).toordinal())
+            if incremental:
+                solver.keep(existing)
+                solver.solve([i for i, v in enumerate(solver.assigned) if v is None])
+            else:
+                solver.solve()
+            seconds = time.perf_counter() - start
+
+            # Diferença entre o gravado e o desejado (mesma escala = mesma linha)
+            wanted = defaultdict(int)
+            for key in solver.result():
+                wanted[key] += 1
+            removed = []
+            for row in existing:
+                key = (row['service_id'], row['position'], row['volunteer_id'])
+                if wanted[key]:
+                    wanted[key] -= 1
+                else:
+                    removed.append(row['id'])
+            inserted = [{'service_id': s, 'position': p, 'volunteer_id': v}
+                        for (s, p, v), n in wanted.items() for _ in range(n)]
+            for chunk in range(0, len(removed), ROTA_CHUNK):
+                self.supabase.table('rota_assignments').delete().in_('id', removed[chunk:chunk + ROTA_CHUNK]).execute()
+            # Upsert na chave da vaga: duas gerações simultâneas não duplicam escalas
+            # (e a próxima incremental descarta o que sobrar numa vaga)
+            written = 0
+            for chunk in range(0, len(inserted), ROTA_CHUNK):
+                response = self.supabase.table('rota_assignments').upsert(
+                    inserted[chunk:chunk + ROTA_CHUNK], on_conflict='service_id,position,volunteer_id',
+                    ignore_duplicates=True
+                ).execute()
+                written += len(response.data or [])
+            if removed or inserted:
+                self._touch('rota_assignments')
+            return RotaResult(len(solver.slots), sum(1 for v in solver.assigned if v is not None),
+                              written, len(removed), seconds)
+        except Exception as e:
+            self._log_error("Erro ao gerar escala", e)
+            return None
+
+    def _rota_rows(self, service_ids):
+        rows = []
+        service_ids = list(service_ids)
+        for chunk in range(0, len(service_ids), ROTA_CHUNK):
+            rows += self._select('rota_assignments', 'id, service_id, position, volunteer_id',
+                                 filters=(('in_', 'service_id', tuple(service_ids[chunk:chunk + ROTA_CHUNK])),))
+        return rows
+
+    def get_rota(self, month):
+        """Escala do mês: [RotaEntry] por culto, posição e nome"""
+        try:
+            rows = self._rota_rows(s.id for s in self.get_services(month))
+            ids = tuple(sorted({r['volunteer_id'] for r in rows}))
+            names = {}
+            for chunk in range(0, len(ids), ROTA_CHUNK):
+                names.update((r['id'], r['name']) for r in self._select(
+                    'volunteers', 'id, name', filters=(('in_', 'id', ids[chunk:chunk + ROTA_CHUNK]),)))
+            entries = [RotaEntry(r['service_id'], r['position'], r['volunteer_id'], names.get(r['volunteer_id'], '?'))
+                       for r in rows]
+            return sorted(entries, key=lambda e: (e.service_id, e.position, e.volunteer_name))
+        except Exception as e:
+            self._log_error("Erro ao buscar escala", e)
+            return []
+
+    db_class.get_services = get_services
+    db_class.add_service = add_service
+    db_class.delete_service = delete_service
+    db_class.create_month_services = create_month_services
+    db_class.set_unavailable = set_unavailable
+    db_class.get_unavailable_days = get_unavailable_days
+    db_class.generate_rota = generate_rota
+    db_class._rota_rows = _rota_rows
+    db_class.get_rota = get_rota
+
+# ==============================================================================
+# INTERFACE
+# ==============================================================================
+
+def _parse_day(text):
+    """'dd/mm/aaaa' -> 'aaaa-mm-dd' (None se inválida)"""
+    try:
+        return datetime.strptime(text.strip(), "%d/%m/%Y").date().isoformat()
+    except (ValueError, AttributeError):
+        return None
+
+def _result_text(result):
+    missing = result.slots - result.filled
+    text = f"{result.filled}/{result.slots} vaga(s) preenchida(s)"
+    if missing:
+        text += f" · {missing} sem voluntário disponível"
+    return text + f" · {result.inserted} entrada(s), {result.removed} saída(s) · {result.seconds:.2f} s"
+
+def schedule_view(page, db, volunteers, show_success, show_error, show_warning, show_loading, hide_loading,
+                  on_back, readonly=False):
+    """
+    Escala do mês por culto e posição.
+    volunteers: [(id, nome)] dos voluntários dos ministérios escalados
+    """
+    month_field = ft.TextField(label="Mês (mm/aaaa)", value=date.today().strftime("%m/%Y"), width=140)
+    summary = ft.Text("", size=12, color="grey")
+    services_area = ft.Column([], scroll="auto", expand=True)
+    state = {"month": parse_month(month_field.value)}
+
+    def close(dialog):
+        dialog.open = False
+        page.update()
+
+    def service_card(service, entries):
+        day = date.fromisoformat(service.service_date)
+        lines = []
+        for position, quantity in sorted(service.needs.items()):
+            names = [e.volunteer_name for e in entries if e.position == position]
+            missing = int(quantity or 0) - len(names)
+            lines.append(ft.Text(spans=[
+                ft.TextSpan(f"{position}: ", ft.TextStyle(weight="bold")),
+                ft.TextSpan(", ".join(names) or "-"),
+                ft.TextSpan(f"  (faltam {missing})" if missing > 0 else "", ft.TextStyle(color="red")),
+            ], size=13))
+        header = [ft.Text(f"{WEEKDAYS[day.weekday()]} {day:%d/%m} {service.service_time} · {service.name}",
+                          weight="bold", expand=True)]
+        if not readonly:
+            header.append(ft.IconButton(ft.Icons.DELETE, icon_color="red", tooltip="Remover culto",
+                                        data=service, on_click=lambda e: remove_service(e.control.data)))
+        return ft.Card(ft.Container(ft.Column([ft.Row(header)] + lines, spacing=4), padding=12))
+
+    def load(e=None):
+        month = parse_month(month_field.value)
+        if not month:
+            show_warning(page, "Mês inválido (use mm/aaaa).")
+            return
+        state["month"] = month
+        services = db.get_services(month)
+        by_service = defaultdict(list)
+        for entry in db.get_rota(month):
+            by_service[entry.service_id].append(entry)
+        if services:
+            slots = sum(int(q or 0) for s in services for q in s.needs.values())
+            filled = sum(len(v) for v in by_service.values())
+            summary.value = f"{len(services)} culto(s) · {filled}/{slots} vaga(s) preenchida(s)"
+            services_area.controls = [service_card(s, by_service[s.id]) for s in services]
+        else:
+            summary.value = ""
+            services_area.controls = [ft.Container(
+                content=ft.Text("Nenhum culto cadastrado neste mês.", color="grey"), padding=40)]
+        page.update()
+
+    def generate(e=None):
+        if not state["month"]:
+            return
+        loading = show_loading(page, "Gerando escala...")
+        result = db.generate_rota(state["month"])
+        hide_loading(page, loading)
+        if result is None:
+            show_error(page, "Erro ao gerar escala.")
+            return
+        show_success(page, _result_text(result))
+        load()
+
+    def create_sundays(e=None):
+        if not state["month"]:
+            return
+        created = db.create_month_services(state["month"])
+        if created is None:
+            show_error(page, "Erro ao criar cultos.")
+            return
+        show_success(page, f"{created} culto(s) de domingo criado(s).")
+        load()
+
+    def remove_service(service):
+        if db.delete_service(service.id):
+            show_success(page, f"Culto de {date.fromisoformat(service.service_date):%d/%m} removido.")
+            load()
+        else:
+            show_error(page, "Erro ao remover culto.")
+
+    def open_new_service(e=None):
+        when = ft.TextField(label="Data", hint_text="dd/mm/aaaa", width=140)
+        at = ft.TextField(label="Horário", value="19:00", width=100)
+        name = ft.TextField(label="Nome", value="Culto")
+        quantities = {d: ft.TextField(label=d, value=str(DEFAULT_NEEDS.get(d, 0)), width=100,
+                                      keyboard_type=ft.KeyboardType.NUMBER) for d in ROTA_DEPARTMENTS}
+
+        def save(e):
+            day = _parse_day(when.value)
+            if not day or not name.value:
+                show_warning(page, "Informe data (dd/mm/aaaa) e nome.")
+                return
+            try:
+                needs = {d: int(f.value or 0) for d, f in quantities.items() if int(f.value or 0) > 0}
+            except ValueError:
+                show_warning(page, "Quantidades devem ser números.")
+                return
+            close(dialog)
+            if db.add_service(name.value.strip(), day, at.value.strip(), needs):
+                month_field.value = day[5:7] + "/" + day[:4]
+                result = db.generate_rota(day[:7], incremental=True)
+                show_success(page, "Culto adicionado" + (f" · {_result_text(result)}" if result else "."))
+                load()
+            else:
+                show_error(page, "Erro ao adicionar culto.")
+
+        dialog = ft.AlertDialog(
+            title=ft.Text("Novo culto"),
+            content=ft.Column([ft.Row([when, at]), name, ft.Text("Vagas", weight="bold"),
+                               ft.Row(list(quantities.values()), wrap=True)], tight=True, width=380),
+            actions=[ft.TextButton("Cancelar", on_click=lambda e: close(dialog)),
+                     ft.Button("Salvar", on_click=save)],
+        )
+        page.overlay.append(dialog)
+        dialog.open = True
+        page.update()
+
+    def open_unavailability(e=None):
+        person = ft.Dropdown(label="Voluntário", width=320,
+                             options=[ft.dropdown.Option(key=str(i), text=n) for i, n in volunteers])
+        when = ft.TextField(label="Data", hint_text="dd/mm/aaaa", width=140)
+        busy = ft.Switch(label="Indisponível", value=True)
+        current = ft.Text("", size=12, color="grey")
+
+        def show_current(e=None):
+            if person.value and state["month"]:
+                days = db.get_unavailable_days(int(person.value), state["month"])
+                current.value = ("Indisponível em: " + ", ".join(f"{date.fromisoformat(d):%d/%m}" for d in days)
+                                 if days else "Sem indisponibilidade neste mês.")
+                page.update()
+
+        def save(e):
+            day = _parse_day(when.value)
+            if not person.value or not day:
+                show_warning(page, "Escolha o voluntário e a data (dd/mm/aaaa).")
+                return
+            close(dialog)
+            loading = show_loading(page, "Ajustando escala...")
+            result = db.set_unavailable(int(person.value), day, bool(busy.value))
+            hide_loading(page, loading)
+            if result is None:
+                show_error(page, "Erro ao registrar indisponibilidade.")
+                return
+            show_success(page, "Escala ajustada: " + _result_text(result))
+            month_field.value = day[5:7] + "/" + day[:4]
+            load()
+
+        dialog = ft.AlertDialog(
+            title=ft.Text("Indisponibilidade"),
+            content=ft.Column([ft.Row([person, ft.IconButton(ft.Icons.SEARCH, tooltip="Ver datas do mês",
+                                                             on_click=show_current)]),
+                               current, ft.Row([when, busy])], tight=True, width=400),
+            actions=[ft.TextButton("Cancelar", on_click=lambda e: close(dialog)),
+                     ft.Button("Salvar", on_click=save)],
+        )
+        page.overlay.append(dialog)
+        dialog.open = True
+        page.update()
+
+    actions = [month_field, ft.IconButton(ft.Icons.REFRESH, on_click=load, tooltip="Abrir mês")]
+    if not readonly:
+        actions += [
+            ft.Button("Gerar escala", icon=ft.Icons.AUTO_FIX_HIGH, on_click=generate),
+            ft.OutlinedButton("Indisponibilidade", icon=ft.Icons.EVENT_BUSY, on_click=open_unavailability),
+            ft.IconButton(ft.Icons.EVENT_REPEAT, on_click=create_sundays, tooltip="Criar cultos de domingo do mês"),
+            ft.IconButton(ft.Icons.ADD, on_click=open_new_service, tooltip="Novo culto"),
+        ]
+    content = ft.Column([
+        ft.Row([
+            ft.IconButton(ft.Icons.ARROW_BACK, on_click=lambda e: on_back(), tooltip="Voltar"),
+            ft.Text("Escalas", size=20, weight="bold"),
+        ]),
+        ft.Row(actions, wrap=True),
+        summary,
+        ft.Divider(),
+        services_area
+    ], expand=True)
+    load()
+    return content
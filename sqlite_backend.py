@@ -0,0 +1,510 @@
+"""
+Backend SQLite local (instalações de um único computador, sem internet)
+
+Implementa a mesma parte da API do supabase-py usada pelo sistema, então o
+Database e os métodos da galeria funcionam sem alterações:
+    table().select/insert/update/upsert/delete
+           .eq/neq/gt/gte/lt/lte/in_/is_/ilike/order/limit/range/execute
+    storage.from_().upload/remove/download/list/get_public_url
+
+As fotos ficam em uma pasta local (uma subpasta por bucket).
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+NOW_SQL = "strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')"
+
+# Mesmas tabelas do supabase_schema.sql (BOOLEAN e JSON são convertidos na leitura)
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT,
+    phone TEXT,
+    is_admin BOOLEAN DEFAULT 0,
+    permissions JSON DEFAULT '{{}}',
+    is_google_auth BOOLEAN DEFAULT 0,
+    created_at TEXT DEFAULT ({NOW_SQL}),
+    updated_at TEXT DEFAULT ({NOW_SQL})
+);
+
+CREATE TABLE IF NOT EXISTS visitors (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    phone TEXT,
+    email TEXT,
+    address TEXT,
+    cep TEXT, logradouro TEXT, numero TEXT, bairro TEXT, cidade TEXT, uf TEXT,
+    cidade_key TEXT, bairro_key TEXT,
+    date_visit TEXT DEFAULT ({NOW_SQL}),
+    observations TEXT,
+    cell_id INTEGER REFERENCES cells(id) ON DELETE SET NULL,
+    created_at TEXT DEFAULT ({NOW_SQL}),
+    updated_at TEXT DEFAULT ({NOW_SQL})
+);
+
+CREATE TABLE IF NOT EXISTS volunteers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    phone TEXT,
+    email TEXT,
+    address TEXT,
+    cep TEXT, logradouro TEXT, numero TEXT, bairro TEXT, cidade TEXT, uf TEXT,
+    cidade_key TEXT, bairro_key TEXT,
+    role TEXT,
+    department TEXT,
+    hire_date TEXT,
+    registration_date TEXT DEFAULT ({NOW_SQL}),
+    observations TEXT,
+    active BOOLEAN DEFAULT 1,
+    created_at TEXT DEFAULT ({NOW_SQL}),
+    updated_at TEXT DEFAULT ({NOW_SQL})
+);
+
+CREATE TABLE IF NOT EXISTS cells (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    leader_name TEXT NOT NULL,
+    host_name TEXT,
+    address TEXT,
+    cep TEXT, logradouro TEXT, numero TEXT, bairro TEXT, cidade TEXT, uf TEXT,
+    cidade_key TEXT, bairro_key TEXT,
+    meeting_day TEXT,
+    meeting_time TEXT,
+    observations TEXT,
+    active BOOLEAN DEFAULT 1,
+    created_at TEXT DEFAULT ({NOW_SQL}),
+    updated_at TEXT DEFAULT ({NOW_SQL})
+);
+
+CREATE TABLE IF NOT EXISTS albums (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    event_date TEXT,
+    created_by TEXT,
+    photo_count INTEGER NOT NULL DEFAULT 0,
+    cover_path TEXT,
+    created_at TEXT DEFAULT ({NOW_SQL}),
+    updated_at TEXT DEFAULT ({NOW_SQL})
+);
+
+CREATE TABLE IF NOT EXISTS photos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    album_id INTEGER REFERENCES albums(id) ON DELETE CASCADE,
+    file_name TEXT,
+    file_path TEXT,
+    storage_path TEXT,
+    description TEXT,
+    uploaded_by TEXT,
+    file_size INTEGER,
+    created_at TEXT DEFAULT ({NOW_SQL})
+);
+
+CREATE TABLE IF NOT EXISTS visits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    visitor_id INTEGER NOT NULL REFERENCES visitors(id) ON DELETE CASCADE,
+    visited_at TEXT DEFAULT ({NOW_SQL}),
+    created_at TEXT DEFAULT ({NOW_SQL})
+);
+
+CREATE TABLE IF NOT EXISTS cell_attendance (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cell_id INTEGER NOT NULL REFERENCES cells(id) ON DELETE CASCADE,
+    meeting_date TEXT NOT NULL,
+    person_name TEXT NOT NULL,
+    is_visitor BOOLEAN DEFAULT 0,
+    idempotency_key TEXT UNIQUE NOT NULL,
+    recorded_by TEXT,
+    created_at TEXT DEFAULT ({NOW_SQL})
+);
+
+CREATE TABLE IF NOT EXISTS cell_attendance_weekly (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cell_id INTEGER NOT NULL REFERENCES cells(id) ON DELETE CASCADE,
+    week_start TEXT NOT NULL,
+    meetings INTEGER DEFAULT 0,
+    present INTEGER DEFAULT 0,
+    visitors INTEGER DEFAULT 0,
+    updated_at TEXT DEFAULT ({NOW_SQL}),
+    UNIQUE (cell_id, week_start)
+);
+
+CREATE TABLE IF NOT EXISTS services (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    service_date TEXT NOT NULL,
+    service_time TEXT,
+    needs JSON DEFAULT '{{}}',
+    created_at TEXT DEFAULT ({NOW_SQL})
+);
+
+CREATE TABLE IF NOT EXISTS volunteer_unavailability (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    volunteer_id INTEGER NOT NULL REFERENCES volunteers(id) ON DELETE CASCADE,
+    unavailable_date TEXT NOT NULL,
+    created_at TEXT DEFAULT ({NOW_SQL}),
+    UNIQUE (volunteer_id, unavailable_date)
+);
+
+CREATE TABLE IF NOT EXISTS rota_assignments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    service_id INTEGER NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+    volunteer_id INTEGER NOT NULL REFERENCES volunteers(id) ON DELETE CASCADE,
+    position TEXT NOT NULL,
+    created_at TEXT DEFAULT ({NOW_SQL}),
+    UNIQUE (service_id, position, volunteer_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+CREATE INDEX IF NOT EXISTS idx_visitors_name ON visitors(name);
+CREATE INDEX IF NOT EXISTS idx_visitors_date ON visitors(date_visit DESC);
+CREATE INDEX IF NOT EXISTS idx_visitors_cep ON visitors(cep);
+DROP INDEX IF EXISTS idx_visitors_cidade_bairro;
+CREATE INDEX IF NOT EXISTS idx_visitors_cidade_bairro_key ON visitors(cidade_key, bairro_key);
+CREATE INDEX IF NOT EXISTS idx_visitors_cell ON visitors(cell_id);
+CREATE INDEX IF NOT EXISTS idx_volunteers_name ON volunteers(name);
+CREATE INDEX IF NOT EXISTS idx_volunteers_active ON volunteers(active);
+DROP INDEX IF EXISTS idx_volunteers_cidade_bairro;
+CREATE INDEX IF NOT EXISTS idx_volunteers_cidade_bairro_key ON volunteers(cidade_key, bairro_key);
+CREATE INDEX IF NOT EXISTS idx_cells_name ON cells(name);
+CREATE INDEX IF NOT EXISTS idx_cells_active ON cells(active);
+DROP INDEX IF EXISTS idx_cells_cidade_bairro;
+CREATE INDEX IF NOT EXISTS idx_cells_cidade_bairro_key ON cells(cidade_key, bairro_key);
+CREATE INDEX IF NOT EXISTS idx_photos_album ON photos(album_id);
+CREATE INDEX IF NOT EXISTS idx_visits_visitor_date ON visits(visitor_id, visited_at);
+CREATE INDEX IF NOT EXISTS idx_cell_attendance_cell_date ON cell_attendance(cell_id, meeting_date);
+CREATE INDEX IF NOT EXISTS idx_cell_attendance_weekly_week ON cell_attendance_weekly(week_start);
+CREATE INDEX IF NOT EXISTS idx_services_date ON services(service_date);
+CREATE INDEX IF NOT EXISTS idx_volunteer_unavailability_date ON volunteer_unavailability(unavailable_date);
+
+INSERT OR IGNORE INTO users (username, password, is_admin, permissions)
+VALUES ('admin', '$scrypt$ln=14,r=8,p=1$/NNZIXipZl+/aI2CZBX/oA$ZbuDr/kOFrXnVASPjKGftNNpwfYLSBd0slw+1+IE26A', 1, '{{}}');
+"""
+
+# Colunas novas em bancos criados por versões anteriores (CREATE TABLE IF NOT EXISTS não as adiciona),
+# com o UPDATE que preenche as linhas antigas quando a coluna é criada
+_KEY_BACKFILL = "UPDATE {table} SET {column} = py_lower(trim({source})) WHERE trim({source}) <> ''"
+
+COLUMN_MIGRATIONS = (
+    ("visitors", "cell_id", "INTEGER REFERENCES cells(id) ON DELETE SET NULL", None),
+    ("albums", "photo_count", "INTEGER NOT NULL DEFAULT 0",
+     "UPDATE albums SET photo_count = (SELECT COUNT(*) FROM photos WHERE photos.album_id = albums.id)"),
+    ("albums", "cover_path", "TEXT",
+     "UPDATE albums SET cover_path = (SELECT storage_path FROM photos WHERE photos.album_id = albums.id "
+     "ORDER BY created_at DESC LIMIT 1)"),
+) + tuple(
+    (table, f"{part}_key", "TEXT", _KEY_BACKFILL.format(table=table, column=f"{part}_key", source=part))
+    for table in ("visitors", "volunteers", "cells")
+    for part in ("cidade", "bairro")
+)
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _ident(name):
+    name = name.strip()
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Nome de coluna inválido: {name!r}")
+    return f'"{name}"'
+
+
+def _param(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _lower(value):
+    # lower() do SQLite só conhece ASCII: 'JOÃO' precisa casar com 'joão'
+    return value.lower() if isinstance(value, str) else value
+
+
+class SQLiteResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class SQLiteQuery:
+    """Construtor de consultas encadeável, no estilo do postgrest-py, traduzido para SQL"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.action = 'select'
+        self.columns = '*'
+        self.payload = None
+        self.on_conflict = None
+        self.where = []
+        self.params = []
+        self.orders = []
+        self.offset = 0
+        self.max_rows = None
+        self.count = None
+
+    # --- ações ---
+    def select(self, columns='*', count=None):
+        self.action = 'select'
+        self.columns = '*' if columns.strip() == '*' else ", ".join(_ident(c) for c in columns.split(','))
+        self.count = count
+        return self
+
+    def insert(self, data):
+        self.action = 'insert'
+        self.payload = data if isinstance(data, list) else [data]
+        return self
+
+    def upsert(self, data, on_conflict='id', ignore_duplicates=False):
+        self.action = 'upsert'
+        self.payload = data if isinstance(data, list) else [data]
+        self.on_conflict = [c.strip() for c in on_conflict.split(',')]
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, data):
+        self.action = 'update'
+        self.payload = data
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    # --- filtros ---
+    def _filter(self, sql, *params):
+        self.where.append(sql)
+        self.params.extend(_param(p) for p in params)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(f"{_ident(column)} = ?", value)
+
+    def neq(self, column, value):
+        return self._filter(f"{_ident(column)} <> ?", value)
+
+    def gt(self, column, value):
+        return self._filter(f"{_ident(column)} > ?", value)
+
+    def gte(self, column, value):
+        return self._filter(f"{_ident(column)} >= ?", value)
+
+    def lt(self, column, value):
+        return self._filter(f"{_ident(column)} < ?", value)
+
+    def lte(self, column, value):
+        return self._filter(f"{_ident(column)} <= ?", value)
+
+    def in_(self, column, values):
+        values = list(values)
+        if not values:
+            return self._filter("0")
+        return self._filter(f"{_ident(column)} IN ({', '.join('?' * len(values))})", *values)
+
+    def is_(self, column, value):
+        if value in (None, 'null'):
+            return self._filter(f"{_ident(column)} IS NULL")
+        return self._filter(f"{_ident(column)} = ?", value in (True, 'true'))
+
+    def ilike(self, column, pattern):
+        return self._filter(f"py_lower({_ident(column)}) LIKE py_lower(?)", pattern)
+
+    def order(self, column, desc=False):
+        # Mesma posição dos nulos que o PostgreSQL
+        self.orders.append(f"{_ident(column)} {'DESC NULLS FIRST' if desc else 'ASC NULLS LAST'}")
+        return self
+
+    def limit(self, count):
+        self.max_rows = count
+        return self
+
+    def range(self, start, end):
+        self.offset = start
+        self.max_rows = end - start + 1
+        return self
+
+    # --- execução ---
+    def _where_sql(self):
+        return f" WHERE {' AND '.join(self.where)}" if self.where else ""
+
+    def _write_row(self, values, conflict=None, ignore_duplicates=False):
+        columns = list(values)
+        names = ", ".join(_ident(c) for c in columns)
+        sql = f"INSERT INTO {_ident(self.table)} ({names}) VALUES ({', '.join('?' * len(columns))})"
+        if conflict:
+            updates = [c for c in columns if c not in conflict and not ignore_duplicates]
+            action = (f"DO UPDATE SET {', '.join(f'{_ident(c)} = excluded.{_ident(c)}' for c in updates)}"
+                      if updates else "DO NOTHING")
+            sql += f" ON CONFLICT ({', '.join(_ident(c) for c in conflict)}) {action}"
+        return self.client.fetch(self.table, sql + " RETURNING *", [_param(values[c]) for c in columns])
+
+    def execute(self):
+        client = self.client
+        table = _ident(self.table)
+        with client.transaction():
+            if self.action == 'insert':
+                return SQLiteResponse([r for v in self.payload for r in self._write_row(v)])
+            if self.action == 'upsert':
+                return SQLiteResponse([r for v in self.payload
+                                       for r in self._write_row(v, self.on_conflict, self.ignore_duplicates)])
+            if self.action == 'update':
+                sets = [f"{_ident(c)} = ?" for c in self.payload]
+                params = [_param(v) for v in self.payload.values()]
+                if 'updated_at' in client.columns(self.table) and 'updated_at' not in self.payload:
+                    # Como o trigger update_updated_at_column do Supabase
+                    sets.append(f'"updated_at" = {NOW_SQL}')
+                sql = f"UPDATE {table} SET {', '.join(sets)}{self._where_sql()} RETURNING *"
+                return SQLiteResponse(client.fetch(self.table, sql, params + self.params))
+            if self.action == 'delete':
+                sql = f"DELETE FROM {table}{self._where_sql()} RETURNING *"
+                return SQLiteResponse(client.fetch(self.table, sql, self.params))
+
+            total = None
+            if self.count:
+                total = client.conn.execute(f"SELECT COUNT(*) FROM {table}{self._where_sql()}",
+                                            self.params).fetchone()[0]
+            sql = f"SELECT {self.columns} FROM {table}{self._where_sql()}"
+            if self.orders:
+                sql += f" ORDER BY {', '.join(self.orders)}"
+            params = list(self.params)
+            if self.max_rows is not None or self.offset:
+                sql += " LIMIT ? OFFSET ?"
+                params += [-1 if self.max_rows is None else self.max_rows, self.offset]
+            return SQLiteResponse(client.fetch(self.table, sql, params), count=total)
+
+
+class LocalBucket:
+    """Bucket de storage em uma pasta local"""
+
+    def __init__(self, root, name):
+        self.root = os.path.abspath(os.path.join(root, name))
+        self.name = name
+
+    def _path(self, path):
+        full = os.path.abspath(os.path.join(self.root, path))
+        if not full.startswith(self.root + os.sep):
+            raise ValueError(f"Caminho inválido: {path!r}")
+        return full
+
+    def upload(self, path, file, file_options=None):
+        full = self._path(path)
+        upsert = str((file_options or {}).get("upsert", "false")).lower() == "true"
+        if os.path.exists(full) and not upsert:
+            raise FileExistsError(f"O arquivo já existe: {path}")
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp = f"{full}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(file)
+        os.replace(tmp, full)
+        return {'Key': f"{self.name}/{path}"}
+
+    def remove(self, paths):
+        removed = []
+        for path in paths:
+            try:
+                os.remove(self._path(path))
+                removed.append({'name': path})
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def download(self, path):
+        with open(self._path(path), "rb") as f:
+            return f.read()
+
+    def list(self, path=None, options=None):
+        folder = self._path(path) if path else self.root
+        if not os.path.isdir(folder):
+            return []
+        return [{'name': entry.name, 'metadata': {'size': entry.stat().st_size}}
+                for entry in os.scandir(folder) if entry.is_file()]
+
+    def get_public_url(self, path):
+        # O app desktop do Flet exibe imagens a partir do caminho local
+        return self._path(path)
+
+
+class LocalStorage:
+    def __init__(self, root):
+        self.root = root
+
+    def from_(self, bucket):
+        return LocalBucket(self.root, bucket)
+
+
+class SQLiteClient:
+    """
+    Substituto do supabase.Client sobre um arquivo SQLite.
+
+    Uma conexão por processo, protegida por lock (as consultas locais levam
+    menos de um milissegundo); WAL permite leituras durante gravações.
+    """
+
+    def __init__(self, path, storage_dir):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.create_function("py_lower", 1, _lower, deterministic=True)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self._add_missing_columns()
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.RLock()
+        self._types = {}
+        self.storage = LocalStorage(storage_dir)
+
+    def _add_missing_columns(self):
+        for table, column, ddl, backfill in COLUMN_MIGRATIONS:
+            existing = {r[1] for r in self.conn.execute(f"PRAGMA table_info({_ident(table)})")}
+            if existing and column not in existing:
+                self.conn.execute(f"ALTER TABLE {_ident(table)} ADD COLUMN {_ident(column)} {ddl}")
+                if backfill:
+                    self.conn.execute(backfill)
+
+    def table(self, name):
+        return SQLiteQuery(self, name)
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _column_types(self, table):
+        types = self._types.get(table)
+        if types is None:
+            info = self.conn.execute(f"PRAGMA table_info({_ident(table)})").fetchall()
+            if not info:
+                raise sqlite3.OperationalError(f"Tabela inexistente: {table}")
+            types = self._types[table] = {row[1]: (row[2] or "").upper() for row in info}
+        return types
+
+    def columns(self, table):
+        return self._column_types(table).keys()
+
+    def fetch(self, table, sql, params):
+        """Executa e converte BOOLEAN/JSON para os mesmos tipos que o Supabase devolve"""
+        types = self._column_types(table)
+        rows = []
+        for row in self.conn.execute(sql, params).fetchall():
+            data = dict(row)
+            for column, value in data.items():
+                if value is None:
+                    continue
+                kind = types.get(column)
+                if kind == "BOOLEAN":
+                    data[column] = bool(value)
+                elif kind == "JSON" and isinstance(value, str):
+                    data[column] = json.loads(value)
+            rows.append(data)
+        return rows
@@ -94,11 +94,177 @@ CREATE TRIGGER update_volunteers_updated_at BEFORE UPDATE ON volunteers
 CREATE TRIGGER update_cells_updated_at BEFORE UPDATE ON cells
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
--- Inserir usuário admin padrão (senha: admin123)
+-- Inserir usuário admin padrão (senha: admin123, já com hash; ver passwords.py)
+-- Senhas antigas em texto puro são convertidas para hash no próximo login
 INSERT INTO users (username, password, is_admin, permissions)
-VALUES ('admin', 'admin123', TRUE, '{}')
+VALUES ('admin', '$scrypt$ln=14,r=8,p=1$/NNZIXipZl+/aI2CZBX/oA$ZbuDr/kOFrXnVASPjKGftNNpwfYLSBd0slw+1+IE26A', TRUE, '{}')
 ON CONFLICT (username) DO NOTHING;
 
+-- ============================================
+-- Migração: endereço estruturado
+-- ============================================
+-- A coluna address continua sendo gravada (texto legado).
+-- cidade_key/bairro_key guardam cidade e bairro em minúsculas ("Centro" = "centro")
+-- para o filtro por bairro, que sempre inclui a cidade.
+-- Depois de aplicar, rode: python backfill_addresses.py
+
+ALTER TABLE visitors ADD COLUMN IF NOT EXISTS cep TEXT;
+ALTER TABLE visitors ADD COLUMN IF NOT EXISTS logradouro TEXT;
+ALTER TABLE visitors ADD COLUMN IF NOT EXISTS numero TEXT;
+ALTER TABLE visitors ADD COLUMN IF NOT EXISTS bairro TEXT;
+ALTER TABLE visitors ADD COLUMN IF NOT EXISTS cidade TEXT;
+ALTER TABLE visitors ADD COLUMN IF NOT EXISTS uf TEXT;
+ALTER TABLE visitors ADD COLUMN IF NOT EXISTS cidade_key TEXT;
+ALTER TABLE visitors ADD COLUMN IF NOT EXISTS bairro_key TEXT;
+
+ALTER TABLE volunteers ADD COLUMN IF NOT EXISTS cep TEXT;
+ALTER TABLE volunteers ADD COLUMN IF NOT EXISTS logradouro TEXT;
+ALTER TABLE volunteers ADD COLUMN IF NOT EXISTS numero TEXT;
+ALTER TABLE volunteers ADD COLUMN IF NOT EXISTS bairro TEXT;
+ALTER TABLE volunteers ADD COLUMN IF NOT EXISTS cidade TEXT;
+ALTER TABLE volunteers ADD COLUMN IF NOT EXISTS uf TEXT;
+ALTER TABLE volunteers ADD COLUMN IF NOT EXISTS cidade_key TEXT;
+ALTER TABLE volunteers ADD COLUMN IF NOT EXISTS bairro_key TEXT;
+
+ALTER TABLE cells ADD COLUMN IF NOT EXISTS cep TEXT;
+ALTER TABLE cells ADD COLUMN IF NOT EXISTS logradouro TEXT;
+ALTER TABLE cells ADD COLUMN IF NOT EXISTS numero TEXT;
+ALTER TABLE cells ADD COLUMN IF NOT EXISTS bairro TEXT;
+ALTER TABLE cells ADD COLUMN IF NOT EXISTS cidade TEXT;
+ALTER TABLE cells ADD COLUMN IF NOT EXISTS uf TEXT;
+ALTER TABLE cells ADD COLUMN IF NOT EXISTS cidade_key TEXT;
+ALTER TABLE cells ADD COLUMN IF NOT EXISTS bairro_key TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_visitors_cep ON visitors(cep);
+CREATE INDEX IF NOT EXISTS idx_visitors_cidade_bairro_key ON visitors(cidade_key, bairro_key);
+CREATE INDEX IF NOT EXISTS idx_volunteers_cep ON volunteers(cep);
+CREATE INDEX IF NOT EXISTS idx_volunteers_cidade_bairro_key ON volunteers(cidade_key, bairro_key);
+CREATE INDEX IF NOT EXISTS idx_cells_cep ON cells(cep);
+CREATE INDEX IF NOT EXISTS idx_cells_cidade_bairro_key ON cells(cidade_key, bairro_key);
+
+-- ============================================
+-- Migração: retornos de visitantes
+-- ============================================
+-- A primeira visita continua em visitors.date_visit; cada retorno é uma linha
+-- nova (a tabela só recebe INSERTs, exceto na mesclagem de duplicados).
+
+CREATE TABLE IF NOT EXISTS visits (
+    id BIGSERIAL PRIMARY KEY,
+    visitor_id BIGINT NOT NULL REFERENCES visitors(id) ON DELETE CASCADE,
+    visited_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc', NOW()),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc', NOW())
+);
+
+CREATE INDEX IF NOT EXISTS idx_visits_visitor_date ON visits(visitor_id, visited_at);
+
+-- ============================================
+-- Migração: presença nas células
+-- ============================================
+-- idempotency_key (célula:data:nome) torna o reenvio de um lote inofensivo.
+-- cell_attendance_weekly é mantida pelo sistema a cada envio (só as semanas
+-- tocadas são recalculadas); os painéis leem apenas essa tabela.
+
+CREATE TABLE IF NOT EXISTS cell_attendance (
+    id BIGSERIAL PRIMARY KEY,
+    cell_id BIGINT NOT NULL REFERENCES cells(id) ON DELETE CASCADE,
+    meeting_date DATE NOT NULL,
+    person_name TEXT NOT NULL,
+    is_visitor BOOLEAN DEFAULT FALSE,
+    idempotency_key TEXT UNIQUE NOT NULL,
+    recorded_by TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc', NOW())
+);
+
+CREATE TABLE IF NOT EXISTS cell_attendance_weekly (
+    id BIGSERIAL PRIMARY KEY,
+    cell_id BIGINT NOT NULL REFERENCES cells(id) ON DELETE CASCADE,
+    week_start DATE NOT NULL,
+    meetings INTEGER DEFAULT 0,
+    present INTEGER DEFAULT 0,
+    visitors INTEGER DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc', NOW()),
+    UNIQUE (cell_id, week_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cell_attendance_cell_date ON cell_attendance(cell_id, meeting_date);
+CREATE INDEX IF NOT EXISTS idx_cell_attendance_weekly_week ON cell_attendance_weekly(week_start);
+
+-- ============================================
+-- Migração: célula de cada visitante
+-- ============================================
+-- Preenchida pelo encaminhamento para a célula mais próxima (geo_module.py)
+
+ALTER TABLE visitors ADD COLUMN IF NOT EXISTS cell_id BIGINT REFERENCES cells(id) ON DELETE SET NULL;
+CREATE INDEX IF NOT EXISTS idx_visitors_cell ON visitors(cell_id);
+
+-- ============================================
+-- Migração: escalas dos ministérios
+-- ============================================
+-- needs: vagas do culto, "Departamento" ou "Departamento/Função" -> quantidade.
+-- A escala é gerada pelo sistema (schedule_module.py); mudar uma
+-- indisponibilidade só troca as linhas afetadas em rota_assignments.
+
+CREATE TABLE IF NOT EXISTS services (
+    id BIGSERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    service_date DATE NOT NULL,
+    service_time TEXT,
+    needs JSONB DEFAULT '{}'::jsonb,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc', NOW())
+);
+
+CREATE TABLE IF NOT EXISTS volunteer_unavailability (
+    id BIGSERIAL PRIMARY KEY,
+    volunteer_id BIGINT NOT NULL REFERENCES volunteers(id) ON DELETE CASCADE,
+    unavailable_date DATE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc', NOW()),
+    UNIQUE (volunteer_id, unavailable_date)
+);
+
+CREATE TABLE IF NOT EXISTS rota_assignments (
+    id BIGSERIAL PRIMARY KEY,
+    service_id BIGINT NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+    volunteer_id BIGINT NOT NULL REFERENCES volunteers(id) ON DELETE CASCADE,
+    position TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc', NOW()),
+    UNIQUE (service_id, position, volunteer_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_services_date ON services(service_date);
+CREATE INDEX IF NOT EXISTS idx_volunteer_unavailability_date ON volunteer_unavailability(unavailable_date);
+
+-- ============================================
+-- Migração: busca por bairro sem diferença de maiúsculas
+-- ============================================
+-- Bancos criados antes de cidade_key/bairro_key: preenche as chaves das linhas
+-- existentes e remove o índice antigo (cidade, bairro), que o filtro não usa mais.
+
+UPDATE visitors SET cidade_key = NULLIF(lower(trim(cidade)), ''), bairro_key = NULLIF(lower(trim(bairro)), '')
+WHERE cidade_key IS NULL AND bairro_key IS NULL;
+UPDATE volunteers SET cidade_key = NULLIF(lower(trim(cidade)), ''), bairro_key = NULLIF(lower(trim(bairro)), '')
+WHERE cidade_key IS NULL AND bairro_key IS NULL;
+UPDATE cells SET cidade_key = NULLIF(lower(trim(cidade)), ''), bairro_key = NULLIF(lower(trim(bairro)), '')
+WHERE cidade_key IS NULL AND bairro_key IS NULL;
+
+DROP INDEX IF EXISTS idx_visitors_cidade_bairro;
+DROP INDEX IF EXISTS idx_volunteers_cidade_bairro;
+DROP INDEX IF EXISTS idx_cells_cidade_bairro;
+
+-- ============================================
+-- Migração: capa e contagem dos álbuns
+-- ============================================
+-- photo_count e cover_path (foto mais recente) são regravados pelo sistema a cada
+-- inclusão/exclusão de fotos; a lista de álbuns não consulta a tabela photos.
+
+ALTER TABLE albums ADD COLUMN IF NOT EXISTS photo_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE albums ADD COLUMN IF NOT EXISTS cover_path TEXT;
+
+UPDATE albums SET
+    photo_count = (SELECT COUNT(*) FROM photos WHERE photos.album_id = albums.id),
+    cover_path = (SELECT storage_path FROM photos WHERE photos.album_id = albums.id
+                  ORDER BY created_at DESC LIMIT 1)
+WHERE cover_path IS NULL;
+
 -- ============================================
 -- Políticas RLS (Row Level Security) - OPCIONAL
 -- ============================================
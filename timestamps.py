@@ -0,0 +1,53 @@
+"""
+Datas e horários para exibição
+
+O banco grava TIMESTAMP WITH TIME ZONE em UTC; aqui as datas são convertidas
+para o horário de Brasília somente quando uma linha é de fato exibida.
+"""
+from datetime import datetime, date, timedelta, timezone
+from functools import lru_cache
+
+try:
+    from zoneinfo import ZoneInfo
+    LOCAL_TZ = ZoneInfo("America/Sao_Paulo")
+except Exception:
+    # Sem base de fusos (ex.: Windows sem tzdata): Brasília não tem horário de verão desde 2019
+    LOCAL_TZ = timezone(timedelta(hours=-3), "BRT")
+
+
+@lru_cache(maxsize=8192)
+def parse_timestamp(value):
+    """Converte o texto ISO do banco em datetime no fuso local (None se inválido)"""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(LOCAL_TZ)
+
+
+@lru_cache(maxsize=4096)
+def _day_label(year, month, day):
+    return f"{day:02d}/{month:02d}/{year}"
+
+
+def format_datetime(value, default=""):
+    """'2025-03-02T22:05:00+00:00' -> '02/03/2025 19:05' (horário de Brasília)"""
+    dt = parse_timestamp(value)
+    if dt is None:
+        return value or default
+    return f"{_day_label(dt.year, dt.month, dt.day)} {dt.hour:02d}:{dt.minute:02d}"
+
+
+def format_date(value, default=""):
+    """Datas sem horário (ex.: event_date) -> 'dd/mm/aaaa', sem conversão de fuso"""
+    if not value:
+        return default
+    try:
+        d = value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return str(value)
+    return _day_label(d.year, d.month, d.day)
@@ -0,0 +1,48 @@
+"""
+Atualização da interface em lote
+Handlers marcados com @batched acumulam as mutações e enviam um único
+page.update() ao final (usado pelo app e pelos módulos de tela)
+"""
+import functools
+import threading
+from contextlib import contextmanager
+
+_ui_batch = threading.local()
+
+def request_update(page):
+    """Agenda page.update(): dentro de um handler @batched vira um único envio ao final"""
+    pending = getattr(_ui_batch, "pages", None)
+    if pending is None:
+        page.update()
+    else:
+        pending[id(page)] = page
+
+def flush_updates(page):
+    """Envia agora as mutações pendentes (ex.: status antes de uma chamada bloqueante)"""
+    pending = getattr(_ui_batch, "pages", None)
+    if pending is not None:
+        pending.pop(id(page), None)
+    page.update()
+
+@contextmanager
+def batch_updates():
+    """Agrupa todos os request_update() do bloco em um page.update() por página"""
+    if getattr(_ui_batch, "pages", None) is not None:
+        yield
+        return
+    _ui_batch.pages = {}
+    try:
+        yield
+    finally:
+        pages = _ui_batch.pages
+        _ui_batch.pages = None
+        for p in pages.values():
+            p.update()
+
+def batched(handler):
+    """Decorator para handlers de eventos (ver batch_updates)"""
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        with batch_updates():
+            return handler(*args, **kwargs)
+    return wrapper
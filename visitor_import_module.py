@@ -0,0 +1,384 @@
+"""
+Módulo de Importação de Visitantes
+Leitura de planilhas CSV/XLSX em streaming, normalização por coluna em lotes
+e gravação com insert([...]) em blocos, com relatório de erros por linha
+"""
+import flet as ft
+import asyncio
+import codecs
+import csv
+import os
+import re
+import unicodedata
+from collections import namedtuple
+
+# Linhas normalizadas e inseridas por vez (memória constante para qualquer tamanho de arquivo)
+BATCH_SIZE = 500
+
+# Cabeçalhos aceitos (sem acentos, espaços ou pontuação) -> campo
+COLUMN_ALIASES = {
+    "nome": "name", "nomecompleto": "name", "name": "name", "visitante": "name",
+    "telefone": "phone", "whatsapp": "phone", "celular": "phone", "fone": "phone",
+    "phone": "phone", "contato": "phone",
+    "email": "email",
+    "cep": "cep",
+    "logradouro": "logradouro", "endereco": "logradouro", "rua": "logradouro",
+    "numero": "numero", "n": "numero", "no": "numero", "num": "numero",
+    "bairro": "bairro",
+    "cidade": "cidade", "municipio": "cidade",
+    "uf": "uf", "estado": "uf",
+    "observacoes": "obs", "observacao": "obs", "obs": "obs",
+}
+FIELDS = ("name", "phone", "email", "cep", "logradouro", "numero", "bairro", "cidade", "uf", "obs")
+NAME_PARTICLES = {"da", "das", "de", "do", "dos", "e"}
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+RowError = namedtuple("RowError", "line name message")
+
+# ==============================================================================
+# LEITURA EM STREAMING
+# ==============================================================================
+
+def _detect_encoding(path):
+    """UTF-8 (com ou sem BOM) ou, se inválido, cp1252 (CSV salvo pelo Excel)"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError:
+                return "cp1252"
+    return "utf-8-sig"
+
+def iter_csv(path):
+    with open(path, newline="", encoding=_detect_encoding(path)) as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    # Números de telefone/CEP digitados como número no Excel chegam como float
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def iter_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Instale o pacote openpyxl para importar arquivos .xlsx")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield [_cell_text(c) for c in row]
+    finally:
+        workbook.close()
+
+def iter_sheet(path):
+    """Linhas da planilha como listas de texto (a primeira é o cabeçalho)"""
+    if path.lower().endswith(".xlsx"):
+        return iter_xlsx(path)
+    return iter_csv(path)
+
+# ==============================================================================
+# NORMALIZAÇÃO
+# ==============================================================================
+
+def _fold(text):
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+def map_header(header):
+    """Posição de cada campo conhecido no cabeçalho"""
+    index = {}
+    for i, title in enumerate(header):
+        field = COLUMN_ALIASES.get(_fold(title))
+        if field and field not in index:
+            index[field] = i
+    return index
+
+def normalize_name(value):
+    """Remove espaços extras; nomes todo em maiúsculas/minúsculas viram 'Maria da Silva'"""
+    name = " ".join(value.split())
+    if name and (name.isupper() or name.islower()):
+        words = name.lower().split(" ")
+        name = " ".join(w if i and w in NAME_PARTICLES else w.capitalize() for i, w in enumerate(words))
+    return name
+
+def phone_digits(value):
+    """DDD + número (10 ou 11 dígitos), sem DDI 55 nem 0 de operadora"""
+    digits = "".join(filter(str.isdigit, value or ""))
+    if len(digits) in (12, 13) and digits.startswith("55"):
+        digits = digits[2:]
+    elif len(digits) in (11, 12) and digits.startswith("0"):
+        digits = digits[1:]
+    return digits
+
+def normalize_phone(value):
+    """'+55 11 98888 7777' -> '(11) 98888-7777'; '' se vazio, None se inválido"""
+    digits = phone_digits(value)
+    if not digits:
+        return ""
+    if len(digits) == 11 and digits[2] == "9":
+        return f"({digits[:2]}) {digits[2:7]}-{digits[7:]}"
+    if len(digits) == 10:
+        return f"({digits[:2]}) {digits[2:6]}-{digits[6:]}"
+    return None
+
+def normalize_cep(value):
+    """'01310100' -> '01310-100'; '' se vazio, None se inválido"""
+    digits = "".join(filter(str.isdigit, value or ""))
+    if not digits:
+        return ""
+    if len(digits) == 7:
+        # Excel remove o zero à esquerda de CEPs digitados como número
+        digits = "0" + digits
+    if len(digits) != 8:
+        return None
+    return f"{digits[:5]}-{digits[5:]}"
+
+def normalize_email(value):
+    email = value.strip().lower()
+    if email and not EMAIL_RE.match(email):
+        return None
+    return email
+
+def _strip(value):
+    return " ".join(value.split())
+
+def normalize_batch(batch, index):
+    """
+    Normaliza um lote de (linha, valores) coluna por coluna.
+    Retorna (registros válidos, erros); cada registro guarda a linha de origem.
+    """
+    lines = [line for line, _ in batch]
+    columns = {}
+    for field in FIELDS:
+        i = index.get(field)
+        columns[field] = [row[i] if i is not None and i < len(row) else "" for _, row in batch]
+
+    names = [normalize_name(v) for v in columns["name"]]
+    phones = [normalize_phone(v) for v in columns["phone"]]
+    emails = [normalize_email(v) for v in columns["email"]]
+    ceps = [normalize_cep(v) for v in columns["cep"]]
+    ufs = [v.strip().upper() for v in columns["uf"]]
+    texts = {f: [_strip(v) for v in columns[f]] for f in ("logradouro", "numero", "bairro", "cidade")}
+    obs = [v.strip() for v in columns["obs"]]
+
+    records, errors = [], []
+    for k, line in enumerate(lines):
+        name = names[k]
+        if len(name) < 2:
+            errors.append(RowError(line, name, "Nome obrigatório"))
+        elif phones[k] is None:
+            errors.append(RowError(line, name, f"Telefone inválido: {columns['phone'][k]}"))
+        elif emails[k] is None:
+            errors.append(RowError(line, name, f"E-mail inválido: {columns['email'][k]}"))
+        elif ceps[k] is None:
+            errors.append(RowError(line, name, f"CEP inválido: {columns['cep'][k]}"))
+        elif ufs[k] and len(ufs[k]) != 2:
+            errors.append(RowError(line, name, f"UF inválida: {columns['uf'][k]}"))
+        else:
+            records.append((line, {
+                "name": name, "phone": phones[k], "email": emails[k], "obs": obs[k],
+                "address": {"cep": ceps[k], "logradouro": texts["logradouro"][k], "numero": texts["numero"][k],
+                            "bairro": texts["bairro"][k], "cidade": texts["cidade"][k], "uf": ufs[k]},
+            }))
+    return records, errors
+
+# ==============================================================================
+# IMPORTAÇÃO
+# ==============================================================================
+
+def _insert_chunk(db, records, summary):
+    """Insere o bloco inteiro; se falhar, linha a linha para apontar as rejeitadas"""
+    if not records:
+        return
+    inserted = db.add_visitors_bulk([r for _, r in records])
+    if inserted is not None:
+        summary["inserted"] += inserted
+        return
+    for line, record in records:
+        if db.add_visitors_bulk([record]):
+            summary["inserted"] += 1
+        else:
+            summary["errors"].append(RowError(line, record["name"], "Rejeitado pelo banco de dados"))
+
+def import_visitors(db, path, on_progress=None, batch_size=BATCH_SIZE):
+    """
+    Importa a planilha em `path` para a tabela visitors.
+
+    on_progress(lidas, inseridas) é chamado a cada lote.
+    Retorna {"read", "inserted", "duplicates", "errors": [RowError]}.
+    """
+    summary = {"read": 0, "inserted": 0, "duplicates": 0, "errors": []}
+    rows = iter_sheet(path)
+    header = next(rows, None)
+    index = map_header(header or [])
+    if "name" not in index:
+        raise ValueError("A planilha precisa de uma coluna 'Nome'")
+
+    # Telefones já cadastrados e os já vistos na própria planilha
+    known_phones = {phone_digits(p) for p in db.iter_visitor_phones()}
+
+    def flush(batch):
+        records, errors = normalize_batch(batch, index)
+        summary["errors"].extend(errors)
+        fresh = []
+        for line, record in records:
+            key = phone_digits(record["phone"])
+            if key and key in known_phones:
+                summary["duplicates"] += 1
+                summary["errors"].append(RowError(line, record["name"], f"Telefone já cadastrado: {record['phone']}"))
+                continue
+            if key:
+                known_phones.add(key)
+            fresh.append((line, record))
+        _insert_chunk(db, fresh, summary)
+        if on_progress:
+            on_progress(summary["read"], summary["inserted"])
+
+    batch = []
+    for line, row in enumerate(rows, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        summary["read"] += 1
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    summary["errors"].sort(key=lambda err: err.line)
+    return summary
+
+def write_error_report(path, errors):
+    """Grava o relatório de linhas rejeitadas (CSV com ';', abre direto no Excel)"""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["linha", "nome", "erro"])
+        writer.writerows(errors)
+
+# ==============================================================================
+# INTERFACE
+# ==============================================================================
+
+def visitor_import_view(page, db, show_success, show_error, show_warning, on_back):
+    """Tela de importação de visitantes por planilha"""
+    state = {"path": None, "errors": []}
+
+    file_text = ft.Text("Nenhum arquivo selecionado", size=12, color="grey")
+    progress = ft.ProgressBar(visible=False)
+    progress_text = ft.Text("", size=12, color="blue")
+    result_column = ft.Column([], spacing=5)
+    report_button = ft.OutlinedButton("Salvar relatório de erros", icon=ft.Icons.DOWNLOAD, visible=False)
+    import_button = ft.Button("Importar", icon=ft.Icons.UPLOAD_FILE, visible=False,
+                              style=ft.ButtonStyle(bgcolor="#4CAF50", color="white"))
+
+    async def pick_file(e):
+        try:
+            picker = ft.FilePicker()
+            files = await picker.pick_files(
+                allow_multiple=False,
+                allowed_extensions=["csv", "xlsx"],
+                dialog_title="Selecione a planilha de visitantes"
+            )
+            if not files:
+                return
+            file = files[0]
+            path = file.path
+            if not path:
+                # Modo web: o arquivo passa pelo servidor de upload do Flet
+                os.makedirs("uploads", exist_ok=True)
+                await picker.upload([ft.FilePickerUploadFile(name=file.name,
+                                                             upload_url=page.get_upload_url(file.name, 600))])
+                path = os.path.join("uploads", file.name)
+            state["path"] = path
+            file_text.value = file.name
+            import_button.visible = True
+            result_column.controls = []
+            report_button.visible = False
+            page.update()
+        except Exception as ex:
+            print(f"Erro ao selecionar planilha: {ex}")
+            show_error(page, "Erro ao selecionar a planilha.")
+
+    def on_progress(read, inserted):
+        progress_text.value = f"{read} linha(s) lida(s), {inserted} visitante(s) importado(s)..."
+        page.update()
+
+    async def start_import(e):
+        if not state["path"]:
+            show_warning(page, "Selecione uma planilha primeiro!")
+            return
+        import_button.disabled = True
+        progress.visible = True
+        result_column.controls = []
+        page.update()
+        try:
+            # Leitura e gravação fora do loop de eventos: a tela continua respondendo
+            summary = await asyncio.to_thread(import_visitors, db, state["path"], on_progress)
+        except Exception as ex:
+            print(f"Erro na importação: {ex}")
+            show_error(page, f"Erro na importação: {ex}")
+            summary = None
+        finally:
+            import_button.disabled = False
+            progress.visible = False
+
+        if summary:
+            errors = summary["errors"]
+            state["errors"] = errors
+            progress_text.value = ""
+            result_column.controls = [
+                ft.Text(f"{summary['inserted']} de {summary['read']} visitante(s) importado(s)", weight="bold"),
+                ft.Text(f"{summary['duplicates']} telefone(s) já cadastrado(s) · {len(errors)} linha(s) rejeitada(s)",
+                        size=12, color="grey"),
+            ] + [ft.Text(f"Linha {err.line}: {err.name or '-'} — {err.message}", size=12, color="red")
+                 for err in errors[:20]]
+            if len(errors) > 20:
+                result_column.controls.append(ft.Text(f"... e mais {len(errors) - 20} linha(s)", size=12, color="grey"))
+            report_button.visible = bool(errors)
+            if summary["inserted"]:
+                show_success(page, f"{summary['inserted']} visitante(s) importado(s)!")
+            else:
+                show_warning(page, "Nenhum visitante importado.")
+        page.update()
+
+    def save_report(e):
+        path = os.path.splitext(state["path"])[0] + "_erros.csv"
+        try:
+            write_error_report(path, state["errors"])
+            show_success(page, f"Relatório salvo em {path}")
+        except Exception as ex:
+            print(f"Erro ao salvar relatório: {ex}")
+            show_error(page, "Erro ao salvar o relatório.")
+
+    import_button.on_click = start_import
+    report_button.on_click = save_report
+
+    return ft.ListView([
+        ft.Row([
+            ft.IconButton(icon=ft.Icons.ARROW_BACK, on_click=lambda e: on_back(), tooltip="Voltar"),
+            ft.Text("Importar Visitantes", size=20, weight="bold")
+        ]),
+        ft.Divider(),
+        ft.Text("Planilha CSV ou XLSX com cabeçalho na primeira linha. Colunas reconhecidas: "
+                "Nome (obrigatória), Telefone/WhatsApp, E-mail, CEP, Logradouro, Número, Bairro, "
+                "Cidade, UF e Observações.", size=12, color="grey"),
+        ft.Row([
+            ft.OutlinedButton("Selecionar planilha", icon=ft.Icons.ATTACH_FILE, on_click=pick_file),
+            file_text
+        ]),
+        import_button,
+        progress,
+        progress_text,
+        result_column,
+        report_button,
+    ], expand=True, spacing=15, padding=20)
@@ -0,0 +1,236 @@
+"""
+Módulo de Retornos
+Visitas de retorno (tabela visits, só acrescenta) e retenção por coorte:
+mês da primeira visita x quantos voltaram em cada mês seguinte
+"""
+import flet as ft
+import threading
+import time
+from array import array
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+from timestamps import parse_timestamp
+from ui_updates import batched, request_update
+
+# Meses acompanhados depois da primeira visita (colunas M0..M6)
+RETENTION_MONTHS = 6
+# Extração completa refeita após este tempo (pega escritas de outros processos)
+EXTRACT_TTL = 3600
+EXTRACT_PAGE = 1000
+
+# Linha da tabela de coortes; by_month[k] = visitantes que voltaram k meses depois
+Cohort = namedtuple("Cohort", "month visitors returned by_month")
+
+MONTH_NAMES = ("jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez")
+
+def month_index(value):
+    """Timestamp do banco -> meses desde o ano 0 no horário de Brasília (None se inválido)"""
+    dt = parse_timestamp(value)
+    return dt.year * 12 + dt.month - 1 if dt else None
+
+def month_label(index):
+    return f"{MONTH_NAMES[index % 12]}/{index // 12}"
+
+# ==============================================================================
+# EXTRAÇÃO COLUNAR
+# ==============================================================================
+
+class VisitExtract:
+    """
+    Colunas necessárias para as coortes, em memória e atualizadas por acréscimo:
+    mês da primeira visita por visitante e (visitante, mês) de cada retorno.
+    As duas tabelas só crescem (ids crescentes); a mesclagem de visitantes
+    marca a extração para ser refeita.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.first_month = {}
+        self.visit_visitor = array("q")
+        self.visit_month = array("l")
+        self.last_visitor_id = 0
+        self.last_visit_id = 0
+        self.built_at = time.monotonic()
+
+    def refresh(self, db):
+        """Busca só as linhas novas (ou tudo, se a extração venceu)"""
+        if time.monotonic() - self.built_at > EXTRACT_TTL:
+            self.reset()
+        filters = [('gt', 'id', self.last_visitor_id)]
+        for rows in db.iter_pages('visitors', 'id, date_visit', filters, EXTRACT_PAGE):
+            for row in rows:
+                month = month_index(row['date_visit'])
+                if month is not None:
+                    self.first_month[row['id']] = month
+            self.last_visitor_id = rows[-1]['id']
+        filters = [('gt', 'id', self.last_visit_id)]
+        for rows in db.iter_pages('visits', 'id, visitor_id, visited_at', filters, EXTRACT_PAGE):
+            for row in rows:
+                month = month_index(row['visited_at'])
+                if month is not None:
+                    self.visit_visitor.append(row['visitor_id'])
+                    self.visit_month.append(month)
+            self.last_visit_id = rows[-1]['id']
+
+    def cohorts(self, months=None):
+        """Tabela de coortes (mais recente primeiro); months limita às últimas N coortes"""
+        sizes = Counter(self.first_month.values())
+        if not sizes:
+            return []
+        newest = max(max(sizes), month_index(datetime.now(timezone.utc).isoformat()))
+        oldest = newest - months + 1 if months else min(sizes)
+        first_month = self.first_month
+        returned = {}
+        by_month = Counter()
+        seen = set()
+        for visitor_id, month in zip(self.visit_visitor, self.visit_month):
+            start = first_month.get(visitor_id)
+            if start is None or start < oldest or month < start:
+                continue
+            returned.setdefault(visitor_id, start)
+            offset = month - start
+            if offset <= RETENTION_MONTHS and (visitor_id, offset) not in seen:
+                seen.add((visitor_id, offset))
+                by_month[start, offset] += 1
+        returned_by = Counter(returned.values())
+        return [
+            Cohort(month_label(m), sizes[m], returned_by[m],
+                   tuple(by_month[m, k] for k in range(RETENTION_MONTHS + 1) if m + k <= newest))
+            for m in range(newest, oldest - 1, -1) if sizes[m]
+        ]
+
+_extracts = {}
+_extracts_lock = threading.Lock()
+
+def _visit_extract(db):
+    with _extracts_lock:
+        extract = _extracts.setdefault(db.backend_key, VisitExtract())
+    return extract
+
+# ==============================================================================
+# FUNÇÕES DE RETORNOS NO DATABASE
+# ==============================================================================
+
+def add_visits_methods_to_database(db_class):
+    """Adiciona métodos de visitas de retorno e retenção à classe Database"""
+
+    def register_visit(self, visitor_id, visited_at=None):
+        """Registra o retorno de um visitante já cadastrado (um único INSERT)"""
+        try:
+            data = {'visitor_id': visitor_id}
+            if visited_at:
+                data['visited_at'] = visited_at
+            self.supabase.table('visits').insert(data).execute()
+            self._touch('visits')
+            return True
+        except Exception as e:
+            self._log_error("Erro ao registrar retorno", e)
+            return False
+
+    def get_visitor_visits(self, visitor_id):
+        """Datas de retorno de um visitante, mais recentes primeiro"""
+        try:
+            rows = self._select('visits', 'visited_at', filters=(('eq', 'visitor_id', visitor_id),),
+                                order=(('visited_at', True),))
+            return [r['visited_at'] for r in rows]
+        except Exception as e:
+            self._log_error("Erro ao buscar retornos", e)
+            return []
+
+    def _move_visits(self, from_ids, to_id, first_visits=()):
+        """
+        Mesclagem de visitantes: os retornos dos duplicados passam para o principal
+        e as primeiras visitas deles (first_visits) viram retornos
+        """
+        from_ids = list(from_ids)
+        if from_ids:
+            self.supabase.table('visits').update({'visitor_id': to_id}).in_('visitor_id', from_ids).execute()
+        rows = [{'visitor_id': to_id, 'visited_at': v} for v in first_visits if v]
+        if rows:
+            self.supabase.table('visits').insert(rows).execute()
+        self._touch('visits')
+        extract = _visit_extract(self)
+        with extract.lock:
+            extract.reset()
+
+    def get_retention_cohorts(self, months=None):
+        """Coortes por mês da primeira visita; lê só o que entrou desde a última vez"""
+        try:
+            extract = _visit_extract(self)
+            with extract.lock:
+                extract.refresh(self)
+                return extract.cohorts(months)
+        except Exception as e:
+            self._log_error("Erro ao calcular retenção", e)
+            return []
+
+    db_class.register_visit = register_visit
+    db_class.get_visitor_visits = get_visitor_visits
+    db_class._move_visits = _move_visits
+    db_class.get_retention_cohorts = get_retention_cohorts
+
+# ==============================================================================
+# INTERFACE
+# ==============================================================================
+
+def _percent(part, total):
+    return f"{part / total:.0%}" if total else "-"
+
+def retention_view(page, db, show_loading, hide_loading, on_back):
+    """Tabela de retenção: uma linha por mês de primeira visita"""
+    months = ft.Dropdown(
+        label="Período", width=160, value="12",
+        options=[ft.dropdown.Option(key=k, text=t) for k, t in (("6", "6 meses"), ("12", "12 meses"),
+                                                                ("24", "24 meses"), ("0", "Tudo"))]
+    )
+    summary = ft.Text("", size=12, color="grey")
+    table_area = ft.Column([], scroll="auto", expand=True)
+
+    def build_table(cohorts):
+        columns = [ft.DataColumn(ft.Text("Primeira visita")), ft.DataColumn(ft.Text("Visitantes"), numeric=True),
+                   ft.DataColumn(ft.Text("Voltaram"), numeric=True)]
+        columns += [ft.DataColumn(ft.Text(f"M{k}"), numeric=True) for k in range(RETENTION_MONTHS + 1)]
+        rows = []
+        for c in cohorts:
+            cells = [c.month, str(c.visitors), f"{c.returned} ({_percent(c.returned, c.visitors)})"]
+            cells += [_percent(n, c.visitors) for n in c.by_month]
+            cells += [""] * (RETENTION_MONTHS + 1 - len(c.by_month))
+            rows.append(ft.DataRow(cells=[ft.DataCell(ft.Text(v)) for v in cells]))
+        return ft.DataTable(columns=columns, rows=rows)
+
+    @batched
+    def load(e=None):
+        loading = show_loading(page, "Calculando retenção...")
+        start = time.perf_counter()
+        cohorts = db.get_retention_cohorts(int(months.value) or None)
+        hide_loading(page, loading)
+        if cohorts:
+            visitors = sum(c.visitors for c in cohorts)
+            returned = sum(c.returned for c in cohorts)
+            summary.value = (f"{visitors} visitante(s), {returned} voltaram ({_percent(returned, visitors)}) · "
+                             f"M1 = voltou no mês seguinte à primeira visita · "
+                             f"{time.perf_counter() - start:.2f} s")
+            table_area.controls = [build_table(cohorts)]
+        else:
+            summary.value = ""
+            table_area.controls = [
+                ft.Container(content=ft.Text("Nenhuma visita registrada.", color="grey"), padding=40)
+            ]
+        request_update(page)
+
+    content = ft.Column([
+        ft.Row([
+            ft.IconButton(ft.Icons.ARROW_BACK, on_click=lambda e: on_back(), tooltip="Voltar"),
+            ft.Text("Retenção de visitantes", size=20, weight="bold"),
+            months,
+            ft.IconButton(ft.Icons.REFRESH, on_click=load, tooltip="Atualizar / aplicar período"),
+        ]),
+        summary,
+        ft.Divider(),
+        table_area
+    ], expand=True)
+    load()
+    return content